@@ -7,13 +7,32 @@ Con reporting dettagliato e gestione errori
 import os
 import sys
 import time
+import signal
 import logging
+import threading
+import traceback
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple, Union
+from itertools import chain, islice
+from collections import deque
+from contextlib import nullcontext
+from functools import partial
+import argparse
 import json
 import pandas as pd
-from ddt_fatture_parser import DDTFattureParser
+from dataclasses import asdict
+from ddt_fatture_parser import (DDTFattureParser, RawPage, TableLoader, EXTRACTOR_VERSION, MODE_FULL, MODE_HEADER,
+                                DEFAULT_PARALLEL_MIN_PAGES, _init_worker, _parse_file_safely, _parse_in_worker)
+from parse_cache import ParseCache, DEFAULT_MAX_BYTES, file_digest
+from manifest import BatchManifest, ESITO_SUCCESSO, ESITO_ERRORE, file_signature
+from worker_pool import (SupervisedPool, WorkerFailure, FAILURE_MEMORY, FAILURE_TIMEOUT,
+                         iter_pool_results, iter_supervised_results)
+from export_writers import create_writer, FORMATS as EXPORT_FORMATS
+from stage_timer import summarize as summarize_stages
+from metrics import BatchMetrics, MetricsServer
+from profiling import DEFAULT_SLOW_THRESHOLD, RunProfiler, profile_call
+from memory_usage import DEFAULT_MEMORY_TOP, MEGABYTE, HeaviestFiles, MemoryMeter
 
 # Configurazione logging avanzato
 logging.basicConfig(
@@ -26,11 +45,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Modalità di parsing come appaiono in riepilogo e report
+MODE_LABELS = {MODE_FULL: "completa", MODE_HEADER: "solo intestazione"}
+# Secondi minimi tra due riscritture del file di metriche (riscritto comunque a fine run)
+METRICS_FILE_INTERVAL = 1.0
+
 
 class BatchProcessor:
     """Processore batch con funzionalità avanzate"""
     
-    def __init__(self, input_dir: str, output_dir: str):
+    def __init__(self, input_dir: str, output_dir: str, workers: int = 1,
+                 max_in_flight: int = None, use_cache: bool = True,
+                 cache_max_bytes: int = DEFAULT_MAX_BYTES,
+                 export_formats: Iterable[str] = (), export_compress: bool = False,
+                 header_only: bool = False, page_workers: int = 1,
+                 metrics_port: int = None, metrics_host: str = "127.0.0.1",
+                 metrics_file: Union[str, Path] = None, profile: bool = False,
+                 profile_threshold: float = DEFAULT_SLOW_THRESHOLD, memory: bool = False,
+                 memory_top: int = DEFAULT_MEMORY_TOP, file_timeout: float = None,
+                 memory_limit_mb: int = None, max_files_per_worker: int = None,
+                 split_documents: bool = False):
+        """
+        Args:
+            input_dir: Directory con i PDF da elaborare
+            output_dir: Directory dei risultati
+            workers: Numero di processi paralleli (1 = elaborazione seriale)
+            max_in_flight: Massimo numero di file in elaborazione contemporanea
+                (default: 2 per worker)
+            use_cache: Riusa i risultati dei PDF già elaborati (cache in output_dir/cache)
+            cache_max_bytes: Dimensione massima della cache prima dell'eviction LRU
+            export_formats: Formati dell'export cumulativo dei documenti del run
+                ('json', 'jsonl', 'csv', 'parquet'), scritto in streaming in output_dir
+            export_compress: Comprime gli export con gzip
+            header_only: Estrae solo intestazione e totale dalla prima e dall'ultima
+                pagina, senza tabelle né articoli (indicizzazione di archivi)
+            page_workers: Processi che estraggono a blocchi di pagine i PDF molto
+                lunghi, per ogni worker (1 = estrazione seriale)
+            metrics_port: Porta dell'endpoint /metrics in formato Prometheus,
+                attivo durante i run (None = nessun endpoint)
+            metrics_host: Indirizzo di ascolto dell'endpoint (default: solo locale)
+            metrics_file: File .prom per il textfile collector di node_exporter,
+                riscritto durante i run (None = nessun file)
+            profile: Profila con cProfile ogni file: profilo aggregato del run in
+                reports/, profilo completo dei file lenti accanto al loro risultato
+            profile_threshold: Secondi oltre i quali il profilo di un file viene salvato
+            memory: Misura la memoria di ogni file (picco tracemalloc e delta RSS),
+                registrata nel manifest; i file più pesanti vanno nei report
+            memory_top: Numero di file più pesanti in memoria elencati nei report
+            file_timeout: Secondi massimi di elaborazione per file: oltre, il worker
+                viene terminato e sostituito e il file va in errore (None = nessun limite)
+            memory_limit_mb: Spazio di indirizzamento massimo per worker in MB
+                (RLIMIT_AS, solo Unix): oltre, il file va in errore e il worker
+                viene sostituito (None = nessun limite)
+            max_files_per_worker: File dopo i quali un worker viene sostituito da
+                un processo nuovo, per contenere le perdite di memoria (None = mai).
+                Con uno qualsiasi di questi limiti il parsing avviene in processi
+                separati anche con workers=1
+            split_documents: Divide ogni PDF nei documenti che contiene (stampe
+                giornaliere del gestionale): un risultato in success/ e un record
+                nel manifest per documento. Non usa la cache dei documenti
+        """
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
@@ -39,20 +113,66 @@ class BatchProcessor:
         self.success_dir = self.output_dir / "success"
         self.error_dir = self.output_dir / "errors"
         self.reports_dir = self.output_dir / "reports"
+        self.cache_dir = self.output_dir / "cache"
+        # Un manifest per sessione; quello unico delle versioni precedenti viene diviso al primo avvio
+        self.manifest = BatchManifest(self.output_dir / "manifest",
+                                      legacy_path=self.output_dir / "manifest.jsonl")
+        self.session = None
+        self.run_id = None
+        self.export_formats = list(export_formats)
+        self.export_compress = export_compress
+        self.exports = []
+        
+        # Metriche Prometheus: contatori e istogrammi del processo, aggiornati a ogni file
+        self.metrics = BatchMetrics()
+        self.metrics_server = MetricsServer(self.metrics.registry, metrics_port, metrics_host) \
+            if metrics_port is not None else None
+        self.metrics_file = Path(metrics_file) if metrics_file else None
+        self._metrics_written = 0.0
+        
+        # Profilo cProfile del run corrente (solo con profile=True)
+        self.profile = profile
+        self.profile_threshold = profile_threshold
+        self.profiler = None
+        
+        # Memoria per file (solo con memory=True), in attesa di essere registrata nel manifest
+        self.memory = memory
+        self.memory_top = memory_top
+        self._memory_usage: Dict[Path, Dict[str, Any]] = {}
+        
+        # Limiti per file e riciclo dei worker: richiedono il pool supervisionato
+        self.file_timeout = file_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_files_per_worker = max_files_per_worker
+        self.supervised = any(limit is not None for limit in (file_timeout, memory_limit_mb,
+                                                               max_files_per_worker))
         
         for dir in [self.success_dir, self.error_dir, self.reports_dir]:
             dir.mkdir(exist_ok=True)
             
-        self.parser = DDTFattureParser()
+        cache = ParseCache(self.cache_dir / "parse_cache.sqlite", cache_max_bytes) if use_cache else None
+        self.parser = DDTFattureParser(cache=cache, mode=MODE_HEADER if header_only else MODE_FULL,
+                                       page_workers=page_workers, split_documents=split_documents)
+        self.workers = max(1, workers)
+        self.max_in_flight = max_in_flight or self.workers * 2
         self.stats = {
             'total_files': 0,
             'success': 0,
             'errors': 0,
+            # File elaborati nel run corrente (total_files include i run precedenti della sessione)
+            'run_files': 0,
+            'mode': self.parser.mode,
             'start_time': None,
             'end_time': None,
             'by_type': {'DDT': 0, 'FATTURA': 0},
             'by_fornitore': {},
-            'totale_importi': 0.0
+            'totale_importi': 0.0,
+            # File interrotti per limite superato ('timeout', 'memoria')
+            'by_limite': {},
+            # Percentili delle fasi di parsing e dei conteggi per documento (stage_timer.summarize)
+            'fasi': summarize_stages([]),
+            # File con il picco di memoria più alto della sessione (memory_usage.HeaviestFiles)
+            'memoria': []
         }
         
     def find_pdf_files(self) -> List[Path]:
@@ -61,110 +181,466 @@ class BatchProcessor:
         logger.info(f"Trovati {len(pdf_files)} file PDF in {self.input_dir}")
         return pdf_files
         
-    def process_batch(self, max_files: int = None) -> Dict[str, Any]:
+    def iter_pdf_files(self) -> Iterator[Path]:
+        """Itera sui file PDF della directory input senza materializzare la lista"""
+        return self.input_dir.glob("**/*.pdf")
+        
+    def process_batch(self, max_files: int = None, resume: bool = False,
+                      retry_errors: bool = False) -> Dict[str, Any]:
         """
         Processa batch di file con reporting dettagliato
         
+        I risultati vengono scritti su disco man mano che arrivano e le
+        statistiche sono aggregate in modo incrementale: la memoria usata
+        non dipende dal numero di file nella directory input.
+        
         Args:
             max_files: Numero massimo di file da processare (None = tutti)
+            resume: Prosegue l'ultima sessione del manifest, saltando i file
+                già elaborati e non modificati da allora
+            retry_errors: Con resume, rielabora anche i file terminati in errore
             
         Returns:
             Dizionario con statistiche complete
         """
         self.stats['start_time'] = datetime.now()
+        session = None
         
         # Trova file da processare
-        pdf_files = self.find_pdf_files()
+        pdf_files = self.iter_pdf_files()
         
+        if resume:
+            session = self.manifest.last_session()
+            if session:
+                done = self.manifest.completed(session)
+                logger.info(f"Ripresa sessione {session}: {len(done)} file già registrati")
+                pdf_files = (f for f in pdf_files if not _is_done(f, done, retry_errors))
+            else:
+                logger.warning("Nessuna sessione da riprendere nel manifest: nuova elaborazione")
+                
         if max_files:
-            pdf_files = pdf_files[:max_files]
+            pdf_files = islice(pdf_files, max_files)
+            
+        logger.info(f"Inizio elaborazione da {self.input_dir} con {self.workers} worker...")
+        
+        return self._run(self._iter_outcomes(pdf_files), session=session)
+        
+    def re_extract(self) -> Dict[str, Any]:
+        """
+        Riesegue solo l'estrazione dei campi sull'archivio in cache
+        
+        Usa testo e tabelle grezzi memorizzati nella cache (nessun accesso ai
+        PDF): da lanciare dopo modifiche a DocumentPatterns o alle regole di
+        estrazione. I JSON in success/ e la cache dei documenti vengono aggiornati.
+        
+        Returns:
+            Dizionario con statistiche complete
+        """
+        self.stats['start_time'] = datetime.now()
+        
+        if self.parser.cache is None:
+            raise ValueError("La ri-estrazione richiede la cache abilitata")
+        if self.parser.mode != MODE_FULL:
+            raise ValueError("La ri-estrazione si applica solo alla modalità completa")
+        if self.parser.split_documents:
+            raise ValueError("La ri-estrazione si applica a un documento per file, non a --split")
+            
+        logger.info(f"Ri-estrazione campi dalla cache {self.parser.cache.db_path}...")
+        
+        return self._run(self._iter_reextracted())
+        
+    def _run(self, outcomes: Iterable[Tuple[Path, Any, Optional[Dict], float]],
+             session: str = None) -> Dict[str, Any]:
+        """
+        Consuma i risultati del parsing e genera i report
+        
+        Ogni esito viene registrato subito nel manifest; statistiche finali,
+        report HTML ed Excel sono poi ricostruiti dal manifest della sessione.
+        
+        Args:
+            outcomes: Tuple (file, documento, info_errore, secondi) da registrare
+            session: Sessione da proseguire (None = nuova sessione)
+        """
+        self._begin_session(session)
+        try:
+            for pdf_file, documento, error_info, elapsed in outcomes:
+                self._record_outcome(pdf_file, documento, error_info, elapsed)
+        finally:
+            self._end_run()
             
-        self.stats['total_files'] = len(pdf_files)
+        return self._finish_session()
         
-        if not pdf_files:
+    def _begin_session(self, session: str = None):
+        """Apre il manifest per un nuovo run, nella sessione indicata o in una nuova"""
+        self.run_id = self.stats['start_time'].strftime('%Y%m%d_%H%M%S')
+        self.session = session or self.manifest.new_session(self.run_id)
+        self.stats['run_files'] = 0
+        self.manifest.open(self.session)
+        
+        # Export cumulativi: un documento alla volta, appena elaborato
+        suffix = '.gz' if self.export_compress else ''
+        self.exports = [
+            create_writer(self.output_dir / f"documenti_{self.run_id}.{fmt}{suffix}", fmt, self.export_compress)
+            for fmt in self.export_formats
+        ]
+        
+        if self.profile:
+            self.profiler = RunProfiler(self.profile_threshold)
+            
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+            server = self.metrics_server
+            logger.info(f"Metriche Prometheus su http://{server.host}:{server.port}/metrics")
+        self._write_metrics_file(force=True)
+        
+    def _end_run(self):
+        """Chiude manifest ed export del run corrente"""
+        self.manifest.close()
+        if self.parser.cache is not None:
+            self.parser.cache.flush()
+        for writer in self.exports:
+            writer.close()
+            logger.info(f"Export {writer.output_path.name}: {writer.count} documenti")
+        self.exports = []
+        
+        self._write_metrics_file(force=True)
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            
+        if self.profiler is not None:
+            profile_file = self.profiler.save(self.reports_dir / f"profile_{self.run_id}.prof")
+            if profile_file is not None:
+                logger.info(f"Profilo aggregato di {self.profiler.files} file salvato in: {profile_file} "
+                            f"(riepilogo in {profile_file.with_suffix('.txt').name})")
+            self.profiler = None
+            
+    def _write_metrics_file(self, force: bool = False):
+        """Riscrive il file di metriche, al massimo una volta ogni METRICS_FILE_INTERVAL secondi"""
+        if self.metrics_file is None:
+            return
+        now = time.time()
+        if force or now - self._metrics_written >= METRICS_FILE_INTERVAL:
+            self.metrics.registry.write_textfile(self.metrics_file)
+            self._metrics_written = now
+        
+    def _record_outcome(self, pdf_file: Path, documento, error_info: Optional[Dict], elapsed: float,
+                        parte: Optional[Tuple[int, int]] = None):
+        """
+        Salva il risultato di un file, aggiorna le statistiche e lo registra nel manifest
+        
+        Args:
+            documento: Documento estratto, o con --split la lista dei documenti del
+                file (registrati uno per uno, ognuno con la sua quota del tempo)
+            parte: (indice, totale) del documento nel file diviso con --split
+        """
+        if isinstance(documento, list):
+            for index, doc in enumerate(documento):
+                self._record_outcome(pdf_file, doc, None, elapsed / len(documento), (index, len(documento)))
+            return
+            
+        self.stats['total_files'] += 1
+        self.stats['run_files'] += 1
+        logger.info(f"\n[{self.stats['total_files']}] Elaborato: {pdf_file.name}")
+        
+        if error_info is None:
+            esito = ESITO_SUCCESSO
+            row = self._handle_success(pdf_file, documento, elapsed)
+            for writer in self.exports:
+                writer.write(documento)
+        else:
+            esito = ESITO_ERRORE
+            # MemoryError intercettato dal parser: stesso esito di un worker oltre il limite
+            if error_info.get('tipo') == 'MemoryError':
+                error_info.setdefault('limite', FAILURE_MEMORY)
+            row = self._handle_error(pdf_file, error_info)
+            
+        size, mtime = file_signature(pdf_file)
+        record = {
+            'path': str(pdf_file.absolute()),
+            'size': size,
+            'mtime': mtime,
+            'esito': esito,
+            'session': self.session,
+            'run': self.run_id,
+            'riga': row
+        }
+        if parte is not None:
+            record['documento'], record['documenti'] = parte
+        # Fasi del parsing: i report le aggregano anche sui run precedenti della sessione
+        if documento is not None and documento.metriche:
+            record['metriche'] = documento.metriche
+        memoria = self._memory_usage.pop(pdf_file, None)
+        if memoria is not None:
+            record['memoria'] = memoria
+        self.manifest.append(record)
+        
+        self.metrics.record(documento, error_info, elapsed)
+        self._write_metrics_file()
+        
+    def _finish_session(self) -> Dict[str, Any]:
+        """Ricostruisce statistiche finali e report dal manifest della sessione"""
+        self.stats['end_time'] = datetime.now()
+        
+        # Le statistiche finali includono i run precedenti della sessione
+        self._rebuild_stats_from_manifest()
+        
+        if not self.stats['total_files']:
             logger.warning("Nessun file PDF trovato!")
             return self.stats
             
-        logger.info(f"Inizio elaborazione di {len(pdf_files)} file...")
+        # Genera report completo
+        self._generate_report(self._iter_manifest_rows(ESITO_SUCCESSO),
+                              self._iter_manifest_rows(ESITO_ERRORE))
         
-        # Process files
-        successes = []
-        errors = []
+        # Genera file Excel riepilogativo
+        if self.stats['success']:
+            self._generate_excel_summary(self._iter_manifest_rows(ESITO_SUCCESSO))
+            
+        return self.stats
         
-        for i, pdf_file in enumerate(pdf_files, 1):
-            logger.info(f"\n[{i}/{len(pdf_files)}] Elaborazione: {pdf_file.name}")
+    def throughput(self) -> float:
+        """File elaborati al secondo nel run corrente (0 se il run non è concluso)"""
+        if not (self.stats['start_time'] and self.stats['end_time']):
+            return 0.0
+        elapsed = (self.stats['end_time'] - self.stats['start_time']).total_seconds()
+        return self.stats['run_files'] / elapsed if elapsed > 0 else 0.0
+        
+    def _iter_manifest_rows(self, esito: str) -> Iterator[Dict[str, Any]]:
+        """Righe di report della sessione corrente, lette dal manifest"""
+        for record in self.manifest.iter_latest(self.session, esito):
+            yield record['riga']
             
-            try:
-                # Parse documento
-                start = time.time()
-                documento = self.parser.parse_single_file(pdf_file)
-                elapsed = time.time() - start
-                
-                # Aggiorna statistiche
-                self.stats['success'] += 1
-                self.stats['by_type'][documento.tipo] = self.stats['by_type'].get(documento.tipo, 0) + 1
-                
-                if documento.fornitore.nome:
-                    self.stats['by_fornitore'][documento.fornitore.nome] = \
-                        self.stats['by_fornitore'].get(documento.fornitore.nome, 0) + 1
-                        
-                self.stats['totale_importi'] += documento.totale
-                
-                # Salva risultato singolo
-                output_file = self.success_dir / f"{pdf_file.stem}_parsed.json"
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(documento.__dict__, f, ensure_ascii=False, indent=2, default=str)
-                    
-                successes.append({
-                    'file': pdf_file.name,
-                    'tipo': documento.tipo,
-                    'numero': documento.numero,
-                    'data': documento.data,
-                    'cliente': documento.cliente.nome,
-                    'totale': documento.totale,
-                    'tempo_elaborazione': f"{elapsed:.2f}s"
-                })
-                
-                logger.info(f"  ✓ Successo: {documento.tipo} N.{documento.numero} - €{documento.totale:.2f}")
+    def _rebuild_stats_from_manifest(self):
+        """Ricalcola i contatori dall'ultimo esito di ogni file della sessione"""
+        self.stats.update({
+            'total_files': 0,
+            'success': 0,
+            'errors': 0,
+            'by_type': {'DDT': 0, 'FATTURA': 0},
+            'by_fornitore': {},
+            'by_limite': {},
+            'totale_importi': 0.0
+        })
+        metriche = []
+        # Solo i memory_top file più pesanti: la memoria non cresce con la sessione
+        memoria = HeaviestFiles(self.memory_top)
+        
+        for record in self.manifest.iter_latest(self.session):
+            self.stats['total_files'] += 1
+            if record.get('memoria'):
+                memoria.add(dict(record['memoria'], file=record['riga']['file'], esito=record['esito']))
                 
-            except Exception as e:
+            if record['esito'] != ESITO_SUCCESSO:
                 self.stats['errors'] += 1
+                limite = record['riga'].get('limite')
+                if limite:
+                    self.stats['by_limite'][limite] = self.stats['by_limite'].get(limite, 0) + 1
+                continue
                 
+            metriche.append(record.get('metriche'))
+            row = record['riga']
+            self.stats['success'] += 1
+            self.stats['by_type'][row['tipo']] = self.stats['by_type'].get(row['tipo'], 0) + 1
+            if row.get('fornitore'):
+                self.stats['by_fornitore'][row['fornitore']] = \
+                    self.stats['by_fornitore'].get(row['fornitore'], 0) + 1
+            self.stats['totale_importi'] += row['totale']
+            
+        self.stats['fasi'] = summarize_stages(metriche)
+        self.stats['memoria'] = memoria.items()
+        
+    def _source_table_loader(self, pdf_file: Path, digest: str) -> TableLoader:
+        """Tabelle non in cache, dal PDF originale solo se è ancora lo stesso file"""
+        def load(page_numbers: List[int]) -> Dict[int, Any]:
+            if not pdf_file.exists() or file_digest(pdf_file) != digest:
+                logger.warning(f"PDF non disponibile o modificato, tabelle non estratte: {pdf_file}")
+                return {}
+            return self.parser.table_loader(pdf_file)(page_numbers)
+        return load
+        
+    def _iter_reextracted(self) -> Iterator[Tuple[Path, Any, Optional[Dict], float]]:
+        """Applica il parser alle estrazioni grezze in cache (stesso formato di _iter_outcomes)"""
+        cache = self.parser.cache
+        
+        for digest, source, raw in cache.iter_raw(EXTRACTOR_VERSION):
+            pdf_file = Path(source)
+            start = time.time()
+            try:
+                pages = [RawPage(**page) for page in raw['pages']]
+                load_tables = self._source_table_loader(pdf_file, digest)
+                tables_before = [page.tables is not None for page in pages]
+                documento = self.parser.parse_raw_pages(pages, pdf_file, load_tables)
+                if tables_before != [page.tables is not None for page in pages]:
+                    cache.put_raw(digest, EXTRACTOR_VERSION,
+                                  {'pages': [asdict(page) for page in pages]}, source=source)
+                cache.put(digest, self.parser.version, asdict(documento))
+                yield pdf_file, documento, None, time.time() - start
+            except Exception as e:
                 error_info = {
-                    'file': pdf_file.name,
+                    'file': str(pdf_file),
                     'error': str(e),
-                    'timestamp': datetime.now().isoformat()
+                    'traceback': traceback.format_exc()
                 }
-                errors.append(error_info)
+                yield pdf_file, None, error_info, time.time() - start
                 
-                # Salva dettagli errore
-                error_file = self.error_dir / f"{pdf_file.stem}_error.txt"
-                with open(error_file, 'w', encoding='utf-8') as f:
-                    f.write(f"File: {pdf_file}\n")
-                    f.write(f"Errore: {e}\n")
-                    f.write(f"Timestamp: {datetime.now()}\n\n")
-                    f.write("Traceback:\n")
-                    import traceback
-                    f.write(traceback.format_exc())
-                    
-                logger.error(f"  ✗ Errore: {e}")
+    def _iter_outcomes(self, pdf_files: Iterable[Path]) -> Iterator[Tuple[Path, Any, Optional[Dict], float]]:
+        """
+        Esegue il parsing dei file e restituisce i risultati appena disponibili
+        
+        Con un solo worker il parsing avviene nel processo corrente; altrimenti
+        i file vengono distribuiti su un pool di processi, mantenendo al massimo
+        max_in_flight file in elaborazione contemporaneamente.
+        
+        Yields:
+            Tuple di (file, documento, info_errore, secondi_elaborazione)
+        """
+        if self.workers <= 1 and not self.supervised:
+            if self.profile or self.memory:
+                parse = partial(_instrumented_parse, partial(_parse_file_safely, self.parser),
+                                profile=self.profile, memory=self.memory)
+            else:
+                parse = partial(_timed_parse, self.parser)
+            for pdf_file in pdf_files:
+                documento, error_info, elapsed = self._unpack_result(pdf_file, parse(pdf_file))
+                yield pdf_file, documento, error_info, elapsed
+            return
+            
+        if self.supervised:
+            results = iter_supervised_results(self._worker_task(), pdf_files, self.workers,
+                                              initializer=_init_worker,
+                                              initargs=(self.parser.worker_options(),),
+                                              max_in_flight=self.max_in_flight, **self._limits())
+        else:
+            results = iter_pool_results(self._worker_task(), pdf_files, self.workers,
+                                        initializer=_init_worker,
+                                        initargs=(self.parser.worker_options(),),
+                                        ordered=False, max_in_flight=self.max_in_flight)
+        for pdf_file, result in results:
+            documento, error_info, elapsed = self._unpack_result(pdf_file, result)
+            yield pdf_file, documento, error_info, elapsed
+            
+    def _worker_task(self) -> Callable:
+        """Funzione di parsing eseguita nei worker (con profilo e memoria se richiesti)"""
+        if not (self.profile or self.memory):
+            return _timed_parse_in_worker
+        return partial(_instrumented_parse_in_worker, profile=self.profile, memory=self.memory)
+        
+    def _limits(self) -> Dict[str, Any]:
+        """Limiti per file e riciclo dei worker, come argomenti di SupervisedPool"""
+        return {
+            'timeout': self.file_timeout,
+            'memory_limit': self.memory_limit_mb * 1024 * 1024 if self.memory_limit_mb else None,
+            'max_tasks': self.max_files_per_worker,
+            'retire_if': _caught_memory_error
+        }
+        
+    def _unpack_result(self, pdf_file: Path, result: Tuple) -> Tuple[Any, Optional[Dict], float]:
+        """Esito del parsing di un file; registra il profilo e la memoria misurati"""
+        if isinstance(result, WorkerFailure):
+            # Worker terminato per un limite (o morto): il file va in errore, il worker è già sostituito
+            error_info = {
+                'file': str(pdf_file),
+                'error': result.message,
+                'traceback': result.traceback or f"{result.message}\n",
+                'tipo': result.kind
+            }
+            if result.kind in (FAILURE_TIMEOUT, FAILURE_MEMORY):
+                error_info['limite'] = result.kind
+            return None, error_info, result.elapsed
+            
+        if not (self.profile or self.memory):
+            return result
+            
+        documento, error_info, elapsed, measures = result
+        if 'profilo' in measures:
+            # Il profilo di un file lento va accanto al suo _parsed.json (o ai dettagli dell'errore)
+            target_dir = self.success_dir if error_info is None else self.error_dir
+            captured = self.profiler.add(measures['profilo'], elapsed,
+                                         target_dir / f"{pdf_file.stem}_profile.prof")
+            if captured is not None:
+                logger.info(f"  Profilo del file lento ({elapsed:.2f}s) salvato in: {captured}")
                 
-        self.stats['end_time'] = datetime.now()
+        if 'memoria' in measures:
+            memoria = measures['memoria']
+            self._memory_usage[pdf_file] = memoria
+            logger.info(f"  Memoria: picco tracemalloc {_megabytes(memoria['tracemalloc_picco'])} MB, "
+                        f"delta RSS {_megabytes(memoria['rss_delta'])} MB")
+        return documento, error_info, elapsed
         
-        # Genera report completo
-        self._generate_report(successes, errors)
+
+    def _handle_success(self, pdf_file: Path, documento, elapsed: float) -> Dict[str, Any]:
+        """Aggiorna le statistiche e salva il risultato di un file elaborato"""
+        self.stats['success'] += 1
+        self.stats['by_type'][documento.tipo] = self.stats['by_type'].get(documento.tipo, 0) + 1
         
-        # Genera file Excel riepilogativo
-        if successes:
-            self._generate_excel_summary(successes)
+        if documento.fornitore.nome:
+            self.stats['by_fornitore'][documento.fornitore.nome] = \
+                self.stats['by_fornitore'].get(documento.fornitore.nome, 0) + 1
+                
+        self.stats['totale_importi'] += documento.totale
+        
+        # Salva risultato singolo (con --split uno per documento, dalle sue pagine)
+        stem = f"{pdf_file.stem}_pag{documento.pagine}" if documento.pagine else pdf_file.stem
+        output_file = self.success_dir / f"{stem}_parsed.json"
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(documento.__dict__, f, ensure_ascii=False, indent=2, default=str)
             
-        return self.stats
+        logger.info(f"  ✓ Successo: {documento.tipo} N.{documento.numero} - €{documento.totale:.2f}")
+        
+        row = {
+            'file': pdf_file.name,
+            'tipo': documento.tipo,
+            'numero': documento.numero,
+            'data': documento.data,
+            'cliente': documento.cliente.nome,
+            'fornitore': documento.fornitore.nome,
+            'totale': documento.totale,
+            'tempo_elaborazione': f"{elapsed:.2f}s"
+        }
+        if documento.pagine:
+            row['pagine'] = documento.pagine
+        return row
+        
+    def _handle_error(self, pdf_file: Path, error_info: Dict[str, str]) -> Dict[str, Any]:
+        """Aggiorna le statistiche e salva i dettagli di un file fallito"""
+        self.stats['errors'] += 1
+        timestamp = datetime.now()
+        
+        # Salva dettagli errore
+        error_file = self.error_dir / f"{pdf_file.stem}_error.txt"
+        with open(error_file, 'w', encoding='utf-8') as f:
+            f.write(f"File: {pdf_file}\n")
+            f.write(f"Errore: {error_info['error']}\n")
+            if error_info.get('limite'):
+                f.write(f"Limite superato: {error_info['limite']}\n")
+            f.write(f"Timestamp: {timestamp}\n\n")
+            f.write("Traceback:\n")
+            f.write(error_info['traceback'])
+            
+        logger.error(f"  ✗ Errore: {error_info['error']}")
+        
+        row = {
+            'file': pdf_file.name,
+            'error': error_info['error'],
+            'timestamp': timestamp.isoformat()
+        }
+        if error_info.get('limite'):
+            row['limite'] = error_info['limite']
+        return row
         
-    def _generate_report(self, successes: List[Dict], errors: List[Dict]):
-        """Genera report dettagliato in formato HTML"""
+    def _generate_report(self, successes: Iterable[Dict], errors: Iterable[Dict]):
+        """Genera report dettagliato in formato HTML, scritto riga per riga"""
         elapsed = (self.stats['end_time'] - self.stats['start_time']).total_seconds()
+        report_file = self.reports_dir / f"report_{self.stats['start_time'].strftime('%Y%m%d_%H%M%S')}.html"
+        
+        with open(report_file, 'w', encoding='utf-8') as f:
+            self._write_report(f, elapsed, successes, errors)
+            
+        logger.info(f"\nReport HTML salvato in: {report_file}")
         
-        html_content = f"""
+    def _write_report(self, f, elapsed: float, successes: Iterable[Dict], errors: Iterable[Dict]):
+        """Scrive il contenuto del report HTML sul file aperto"""
+        f.write(f"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -188,6 +664,8 @@ class BatchProcessor:
         <h2>Statistiche Generali</h2>
         <p><strong>Data elaborazione:</strong> {self.stats['start_time'].strftime('%Y-%m-%d %H:%M:%S')}</p>
         <p><strong>Tempo totale:</strong> {elapsed:.2f} secondi</p>
+        <p><strong>Modalità:</strong> {MODE_LABELS[self.stats['mode']]}</p>
+        <p><strong>Throughput:</strong> {self.throughput():.2f} file/s</p>
         <p><strong>File totali:</strong> {self.stats['total_files']}</p>
         <p class="success"><strong>Successi:</strong> {self.stats['success']}</p>
         <p class="error"><strong>Errori:</strong> {self.stats['errors']}</p>
@@ -200,17 +678,17 @@ class BatchProcessor:
             <th>Tipo</th>
             <th>Quantità</th>
         </tr>
-"""
+""")
         
         for tipo, count in self.stats['by_type'].items():
-            html_content += f"""
+            f.write(f"""
         <tr>
             <td>{tipo}</td>
             <td>{count}</td>
         </tr>
-"""
+""")
             
-        html_content += """
+        f.write("""
     </table>
     
     <h2>Riepilogo per Fornitore</h2>
@@ -219,17 +697,21 @@ class BatchProcessor:
             <th>Fornitore</th>
             <th>Documenti</th>
         </tr>
-"""
+""")
         
         for fornitore, count in sorted(self.stats['by_fornitore'].items()):
-            html_content += f"""
+            f.write(f"""
         <tr>
             <td>{fornitore}</td>
             <td>{count}</td>
         </tr>
-"""
+""")
             
-        html_content += """
+        self._write_stage_tables(f)
+        if self.stats['memoria']:
+            self._write_memory_table(f)
+            
+        f.write("""
     </table>
     
     <h2>Documenti Elaborati con Successo</h2>
@@ -243,12 +725,12 @@ class BatchProcessor:
             <th>Totale</th>
             <th>Tempo</th>
         </tr>
-"""
+""")
         
         for doc in successes:
-            html_content += f"""
+            f.write(f"""
         <tr>
-            <td>{doc['file']}</td>
+            <td>{doc['file']}{' (pag. ' + doc['pagine'] + ')' if doc.get('pagine') else ''}</td>
             <td>{doc['tipo']}</td>
             <td>{doc['numero']}</td>
             <td>{doc['data']}</td>
@@ -256,10 +738,12 @@ class BatchProcessor:
             <td>€{doc['totale']:.2f}</td>
             <td>{doc['tempo_elaborazione']}</td>
         </tr>
-"""
+""")
             
-        if errors:
-            html_content += """
+        errors = iter(errors)
+        first_error = next(errors, None)
+        if first_error is not None:
+            f.write("""
     </table>
     
     <h2>Errori di Elaborazione</h2>
@@ -267,35 +751,113 @@ class BatchProcessor:
         <tr>
             <th>File</th>
             <th>Errore</th>
+            <th>Limite</th>
             <th>Timestamp</th>
         </tr>
-"""
+""")
             
-            for err in errors:
-                html_content += f"""
+            for err in chain([first_error], errors):
+                f.write(f"""
         <tr>
             <td>{err['file']}</td>
             <td>{err['error']}</td>
+            <td>{err.get('limite', '')}</td>
             <td>{err['timestamp']}</td>
         </tr>
-"""
+""")
                 
-        html_content += """
+        f.write("""
     </table>
 </body>
 </html>
-"""
+""")
         
-        # Salva report HTML
-        report_file = self.reports_dir / f"report_{self.stats['start_time'].strftime('%Y%m%d_%H%M%S')}.html"
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+    def _write_stage_tables(self, f):
+        """Scrive nel report HTML i percentili delle fasi di parsing e delle dimensioni dei documenti"""
+        f.write("""
+    </table>
+    
+    <h2>Tempi per Fase</h2>
+    <table>
+        <tr>
+            <th>Fase</th>
+            <th>File</th>
+            <th>p50 (ms)</th>
+            <th>p95 (ms)</th>
+            <th>Max (ms)</th>
+            <th>Totale (s)</th>
+        </tr>
+""")
+        
+        for fase, valori in self.stats['fasi']['tempi'].items():
+            f.write(f"""
+        <tr>
+            <td>{fase}</td>
+            <td>{valori['file']}</td>
+            <td>{valori['p50'] * 1000:.1f}</td>
+            <td>{valori['p95'] * 1000:.1f}</td>
+            <td>{valori['max'] * 1000:.1f}</td>
+            <td>{valori['totale']:.2f}</td>
+        </tr>
+""")
             
-        logger.info(f"\nReport HTML salvato in: {report_file}")
+        f.write("""
+    </table>
+    
+    <h2>Dimensioni Documenti</h2>
+    <table>
+        <tr>
+            <th>Misura</th>
+            <th>File</th>
+            <th>p50</th>
+            <th>p95</th>
+            <th>Max</th>
+            <th>Totale</th>
+        </tr>
+""")
+        
+        for misura, valori in self.stats['fasi']['conteggi'].items():
+            f.write(f"""
+        <tr>
+            <td>{misura}</td>
+            <td>{valori['file']}</td>
+            <td>{valori['p50']}</td>
+            <td>{valori['p95']}</td>
+            <td>{valori['max']}</td>
+            <td>{valori['totale']}</td>
+        </tr>
+""")
+        
+    def _write_memory_table(self, f):
+        """Scrive nel report HTML i file con il picco di memoria più alto"""
+        f.write("""
+    </table>
+    
+    <h2>File con Più Memoria</h2>
+    <table>
+        <tr>
+            <th>File</th>
+            <th>Esito</th>
+            <th>Picco tracemalloc (MB)</th>
+            <th>Delta RSS (MB)</th>
+            <th>RSS picco (MB)</th>
+        </tr>
+""")
         
-    def _generate_excel_summary(self, successes: List[Dict]):
+        for misura in self.stats['memoria']:
+            f.write(f"""
+        <tr>
+            <td>{misura['file']}</td>
+            <td>{misura['esito']}</td>
+            <td>{_megabytes(misura['tracemalloc_picco'])}</td>
+            <td>{_megabytes(misura['rss_delta'])}</td>
+            <td>{_megabytes(misura['rss_picco'])}</td>
+        </tr>
+""")
+        
+    def _generate_excel_summary(self, successes: Iterable[Dict]):
         """Genera riepilogo Excel"""
-        df = pd.DataFrame(successes)
+        df = pd.DataFrame(list(successes))
         
         # Aggiungi colonne calcolate
         if 'data' in df.columns:
@@ -319,9 +881,37 @@ class BatchProcessor:
                 {'Metrica': 'Successi', 'Valore': self.stats['success']},
                 {'Metrica': 'Errori', 'Valore': self.stats['errors']},
                 {'Metrica': 'Importo Totale', 'Valore': f"€{self.stats['totale_importi']:,.2f}"},
+                {'Metrica': 'Modalità', 'Valore': MODE_LABELS[self.stats['mode']]},
+                {'Metrica': 'Throughput (file/s)', 'Valore': round(self.throughput(), 2)},
             ])
             stats_df.to_excel(writer, sheet_name='Statistiche', index=False)
             
+            # Fogli fasi e dimensioni: percentili per documento
+            fasi_df = pd.DataFrame([
+                {'Fase': fase, 'File': valori['file'], 'p50 (ms)': round(valori['p50'] * 1000, 1),
+                 'p95 (ms)': round(valori['p95'] * 1000, 1), 'Max (ms)': round(valori['max'] * 1000, 1),
+                 'Totale (s)': round(valori['totale'], 2)}
+                for fase, valori in self.stats['fasi']['tempi'].items()
+            ], columns=['Fase', 'File', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Totale (s)'])
+            fasi_df.to_excel(writer, sheet_name='Fasi', index=False)
+            
+            dimensioni_df = pd.DataFrame([
+                {'Misura': misura, 'File': valori['file'], 'p50': valori['p50'], 'p95': valori['p95'],
+                 'Max': valori['max'], 'Totale': valori['totale']}
+                for misura, valori in self.stats['fasi']['conteggi'].items()
+            ], columns=['Misura', 'File', 'p50', 'p95', 'Max', 'Totale'])
+            dimensioni_df.to_excel(writer, sheet_name='Dimensioni', index=False)
+            
+            if self.stats['memoria']:
+                memoria_df = pd.DataFrame([
+                    {'File': misura['file'], 'Esito': misura['esito'],
+                     'Picco tracemalloc (MB)': _megabytes(misura['tracemalloc_picco']),
+                     'Delta RSS (MB)': _megabytes(misura['rss_delta']),
+                     'RSS picco (MB)': _megabytes(misura['rss_picco'])}
+                    for misura in self.stats['memoria']
+                ])
+                memoria_df.to_excel(writer, sheet_name='Memoria', index=False)
+            
         logger.info(f"Riepilogo Excel salvato in: {excel_file}")
         
     def print_summary(self):
@@ -329,9 +919,14 @@ class BatchProcessor:
         print("\n" + "="*60)
         print("RIEPILOGO ELABORAZIONE BATCH")
         print("="*60)
+        # In modalità demone la sessione può chiudersi senza file elaborati
+        total = max(self.stats['total_files'], 1)
         print(f"File totali:     {self.stats['total_files']}")
-        print(f"Successi:        {self.stats['success']} ({self.stats['success']/self.stats['total_files']*100:.1f}%)")
-        print(f"Errori:          {self.stats['errors']} ({self.stats['errors']/self.stats['total_files']*100:.1f}%)")
+        print(f"Successi:        {self.stats['success']} ({self.stats['success']/total*100:.1f}%)")
+        print(f"Errori:          {self.stats['errors']} ({self.stats['errors']/total*100:.1f}%)")
+        if self.stats['by_limite']:
+            limiti = ", ".join(f"{limite} {count}" for limite, count in sorted(self.stats['by_limite'].items()))
+            print(f"Oltre i limiti:  {limiti}")
         print(f"Importo totale:  €{self.stats['totale_importi']:,.2f}")
         
         if self.stats['end_time'] and self.stats['start_time']:
@@ -339,6 +934,7 @@ class BatchProcessor:
             print(f"Tempo totale:    {elapsed:.2f} secondi")
             if self.stats['total_files'] > 0:
                 print(f"Tempo medio:     {elapsed/self.stats['total_files']:.2f} sec/file")
+            print(f"Throughput:      {self.throughput():.2f} file/s (modalità {MODE_LABELS[self.stats['mode']]})")
                 
         print("\nPer tipo documento:")
         for tipo, count in self.stats['by_type'].items():
@@ -352,30 +948,466 @@ class BatchProcessor:
         print("="*60)
 
 
+class RollingStats:
+    """Statistiche di elaborazione su una finestra temporale mobile"""
+    
+    def __init__(self, window: float = 300.0):
+        """
+        Args:
+            window: Ampiezza della finestra in secondi
+        """
+        self.window = window
+        self.events = deque()
+        
+    def add(self, success: bool, elapsed: float, now: float = None):
+        """Registra l'esito di un file"""
+        now = now if now is not None else time.time()
+        self.events.append((now, success, elapsed))
+        self._trim(now)
+        
+    def _trim(self, now: float):
+        """Scarta gli eventi fuori dalla finestra"""
+        while self.events and self.events[0][0] < now - self.window:
+            self.events.popleft()
+            
+    def summary(self, now: float = None) -> Dict[str, Any]:
+        """Riepilogo della finestra corrente"""
+        now = now if now is not None else time.time()
+        self._trim(now)
+        
+        files = len(self.events)
+        errors = sum(1 for _, success, _ in self.events if not success)
+        return {
+            'finestra_secondi': self.window,
+            'file': files,
+            'errori': errors,
+            'file_al_minuto': files * 60.0 / self.window,
+            'tempo_medio': sum(e for _, _, e in self.events) / files if files else 0.0
+        }
+
+
+class WatchDaemon:
+    """
+    Modalità demone: sorveglia la directory input ed elabora i nuovi PDF
+    
+    Il pool di worker resta attivo per tutta la durata del demone, quindi il
+    costo di avvio si paga una sola volta; è supervisionato, quindi applica i
+    limiti per file del processore e ne ricicla i worker. Un file viene elaborato solo quando
+    dimensione e mtime sono stabili da almeno `debounce` secondi (scanner ed
+    export ERP potrebbero starlo ancora scrivendo). La sessione del manifest
+    viene proseguita, quindi al riavvio i file già elaborati non si ripetono.
+    """
+    
+    def __init__(self, processor: BatchProcessor, poll_interval: float = 5.0,
+                 debounce: float = 10.0, stats_interval: float = 60.0,
+                 stats_window: float = 300.0):
+        """
+        Args:
+            processor: Processore batch da usare per salvataggio e report
+            poll_interval: Secondi tra due scansioni della directory input
+            debounce: Secondi di stabilità richiesti prima di elaborare un file
+            stats_interval: Secondi tra due log delle statistiche
+            stats_window: Ampiezza in secondi della finestra delle statistiche mobili
+        """
+        self.processor = processor
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.stats_interval = stats_interval
+        self.rolling = RollingStats(stats_window)
+        self.stats_file = processor.reports_dir / "daemon_stats.json"
+        
+        self._done = {}        # percorso -> (dimensione, mtime) già elaborati
+        self._candidates = {}  # percorso -> (dimensione, mtime) all'ultima scansione
+        self._queue = deque()  # file pronti, in attesa di un worker
+        self._pending = set()  # file in elaborazione
+        self._stopping = False
+        self._wake = threading.Event()
+        self._previous_handlers = {}
+        
+    def stop(self, *_):
+        """Richiede l'arresto: i file già in elaborazione vengono completati"""
+        if not self._stopping:
+            logger.info("Richiesta di arresto ricevuta")
+        self._stopping = True
+        self._wake.set()
+        
+    def run(self) -> Dict[str, Any]:
+        """
+        Esegue il demone fino a stop() (o SIGTERM / Ctrl+C)
+        
+        Returns:
+            Statistiche della sessione, ricostruite dal manifest
+        """
+        processor = self.processor
+        processor.stats['start_time'] = datetime.now()
+        
+        session = processor.manifest.last_session()
+        if session:
+            completed = processor.manifest.completed(session)
+            self._done = {path: (size, mtime) for path, (size, mtime, _) in completed.items()}
+            logger.info(f"Ripresa sessione {session}: {len(self._done)} file già registrati")
+            
+        processor._begin_session(session)
+        self._install_signal_handlers()
+        logger.info(f"Demone avviato su {processor.input_dir} con {processor.workers} worker "
+                    f"(scansione ogni {self.poll_interval}s, debounce {self.debounce}s)")
+        
+        try:
+            with SupervisedPool(processor._worker_task(), processor.workers, initializer=_init_worker,
+                                initargs=(processor.parser.worker_options(),),
+                                **processor._limits()) as pool:
+                next_scan = 0.0
+                next_stats = time.time() + self.stats_interval
+                
+                while not self._stopping:
+                    now = time.time()
+                    if now >= next_scan:
+                        self._scan(now)
+                        next_scan = now + self.poll_interval
+                        
+                    self._submit(pool)
+                    self._collect(pool, timeout=min(next_scan, next_stats) - time.time())
+                    
+                    if time.time() >= next_stats:
+                        self._log_stats()
+                        next_stats = time.time() + self.stats_interval
+                        
+                # Arresto ordinato: i file in coda restano per il prossimo avvio
+                logger.info(f"Arresto: attesa di {len(self._pending)} file in elaborazione...")
+                while self._pending:
+                    self._collect(pool, timeout=1.0)
+        finally:
+            processor._end_run()
+            self._restore_signal_handlers()
+            
+        self._log_stats()
+        return processor._finish_session()
+        
+    def _scan(self, now: float):
+        """Accoda i file nuovi o modificati la cui scrittura risulta completata"""
+        in_progress = self._pending | set(self._queue)
+        seen = {}
+        
+        for pdf_file in self.processor.iter_pdf_files():
+            path = str(pdf_file.absolute())
+            signature = file_signature(pdf_file)
+            if signature[0] is None or self._done.get(path) == signature or pdf_file in in_progress:
+                continue
+                
+            seen[path] = signature
+            # Stabile tra due scansioni e non modificato da almeno `debounce` secondi
+            if self._candidates.get(path) == signature and now - signature[1] >= self.debounce:
+                self._queue.append(pdf_file)
+                del seen[path]
+                
+        # I file spariti tra due scansioni vengono dimenticati
+        self._candidates = seen
+        
+    def _submit(self, pool: SupervisedPool):
+        """Invia i file in coda ai worker, senza superare max_in_flight"""
+        while self._queue and len(self._pending) < self.processor.max_in_flight:
+            pdf_file = self._queue.popleft()
+            pool.submit(pdf_file)
+            self._pending.add(pdf_file)
+            
+    def _collect(self, pool: SupervisedPool, timeout: float):
+        """Registra i file completati, attendendo al massimo `timeout` secondi"""
+        # Timeout breve: il demone resta reattivo ai segnali di arresto
+        timeout = max(0.0, min(timeout, 1.0))
+        
+        if not self._pending:
+            self._wake.wait(timeout)
+            return
+            
+        for pdf_file, result in pool.collect(timeout):
+            self._pending.discard(pdf_file)
+            documento, error_info, elapsed = self.processor._unpack_result(pdf_file, result)
+            
+            self.processor._record_outcome(pdf_file, documento, error_info, elapsed)
+            self._done[str(pdf_file.absolute())] = file_signature(pdf_file)
+            self.rolling.add(error_info is None, elapsed)
+            
+    def _log_stats(self):
+        """Registra le statistiche mobili nel log e in reports/daemon_stats.json"""
+        stats = self.processor.stats
+        window = self.rolling.summary()
+        
+        logger.info(f"Statistiche ultimi {window['finestra_secondi']:.0f}s: "
+                    f"{window['file']} file, {window['errori']} errori, "
+                    f"{window['file_al_minuto']:.1f} file/min, "
+                    f"{window['tempo_medio']:.2f}s medi | totale: {stats['success']} successi, "
+                    f"{stats['errors']} errori | in coda: {len(self._queue)}, "
+                    f"in elaborazione: {len(self._pending)}")
+        
+        snapshot = {
+            'timestamp': datetime.now().isoformat(),
+            'sessione': self.processor.session,
+            'totale': {
+                'file': stats['total_files'],
+                'successi': stats['success'],
+                'errori': stats['errors'],
+                'per_tipo': stats['by_type'],
+                'importo': stats['totale_importi']
+            },
+            'finestra': window,
+            'in_coda': len(self._queue),
+            'in_elaborazione': len(self._pending)
+        }
+        
+        # Scrittura atomica: chi legge il file non vede mai un JSON parziale
+        tmp_file = self.stats_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.stats_file)
+        
+    def _install_signal_handlers(self):
+        """SIGTERM e Ctrl+C avviano un arresto ordinato"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._previous_handlers[signum] = signal.signal(signum, self.stop)
+            
+    def _restore_signal_handlers(self):
+        """Ripristina i gestori di segnale precedenti"""
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_handlers = {}
+
+
+def _timed_parse(parser: DDTFattureParser, pdf_file: Path) -> Tuple[Any, Optional[Dict], float]:
+    """Parsifica un file misurando il tempo di elaborazione"""
+    start = time.time()
+    documento, error_info = _parse_file_safely(parser, pdf_file)
+    return documento, error_info, time.time() - start
+
+
+def _timed_parse_in_worker(pdf_file: Union[str, Path]) -> Tuple[Any, Optional[Dict], float]:
+    """Come _timed_parse, ma con il parser del processo worker"""
+    start = time.time()
+    documento, error_info = _parse_in_worker(pdf_file)
+    return documento, error_info, time.time() - start
+
+
+def _instrumented_parse(parse: Callable, pdf_file: Union[str, Path], profile: bool = False,
+                        memory: bool = False) -> Tuple[Any, Optional[Dict], float, Dict]:
+    """
+    Come _timed_parse, con le misure richieste sul parsing del file
+    
+    Args:
+        parse: Funzione che parsifica pdf_file e restituisce (documento, info_errore)
+        pdf_file: File da parsificare
+        profile: Profila il parsing con cProfile
+        memory: Misura picco tracemalloc e delta RSS del parsing
+        
+    Returns:
+        Tuple di (documento, info_errore, secondi_elaborazione, misure), con misure
+        'profilo' (dizionario pstats) e 'memoria' (MemoryMeter.as_dict) se richieste
+    """
+    measures = {}
+    meter = MemoryMeter() if memory else nullcontext()
+    start = time.time()
+    with meter:
+        if profile:
+            (documento, error_info), measures['profilo'] = profile_call(parse, pdf_file)
+        else:
+            documento, error_info = parse(pdf_file)
+    elapsed = time.time() - start
+    if memory:
+        measures['memoria'] = meter.as_dict()
+    return documento, error_info, elapsed, measures
+
+
+def _instrumented_parse_in_worker(pdf_file: Union[str, Path], profile: bool = False,
+                                  memory: bool = False) -> Tuple[Any, Optional[Dict], float, Dict]:
+    """Come _instrumented_parse, ma con il parser del processo worker"""
+    return _instrumented_parse(_parse_in_worker, pdf_file, profile, memory)
+
+
+def _caught_memory_error(result: Tuple) -> bool:
+    """True se il parser del worker ha intercettato un MemoryError: il worker va sostituito"""
+    error_info = result[1]
+    return error_info is not None and error_info.get('tipo') == 'MemoryError'
+
+
+def _megabytes(value: Optional[int]) -> str:
+    """Byte in MB con un decimale, 'n/d' se la misura non è disponibile"""
+    return f"{value / MEGABYTE:.1f}" if value is not None else "n/d"
+
+
+def _is_done(pdf_file: Path, done: Dict[str, Tuple], retry_errors: bool) -> bool:
+    """Verifica se il manifest registra già il file, con la stessa dimensione e mtime"""
+    record = done.get(str(pdf_file.absolute()))
+    if record is None:
+        return False
+    size, mtime, esito = record
+    if (size, mtime) != file_signature(pdf_file):
+        return False
+    return esito == ESITO_SUCCESSO or not retry_errors
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser che esce con codice 1 (il codice 2 indica 'tutti falliti')"""
+    
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        print(f"Errore: {message}", file=sys.stderr)
+        sys.exit(1)
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    """Definisce gli argomenti da riga di comando"""
+    arg_parser = _ArgumentParser(
+        description="Elaborazione batch di DDT e Fatture PDF",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Esempio:\n"
+               "  python batch_processor.py ./pdf_input ./risultati\n"
+               "  python batch_processor.py ./pdf_input ./risultati 10\n"
+               "  python batch_processor.py ./pdf_input ./risultati --workers 8\n"
+               "  python batch_processor.py ./pdf_input ./risultati --watch --workers 4\n"
+               "  python batch_processor.py ./pdf_input ./risultati --export jsonl,csv --export-gzip\n"
+               "  python batch_processor.py ./pdf_input ./risultati --header-only --export csv\n"
+               "  python batch_processor.py ./pdf_input ./risultati --workers 2 --page-workers 4\n"
+               "  python batch_processor.py ./stampe_giornaliere ./risultati --split --page-workers 4\n"
+               "  python batch_processor.py ./pdf_input ./risultati --watch --metrics-port 9108\n"
+               "  python batch_processor.py ./pdf_input ./risultati --profile --profile-threshold 2\n"
+               "  python batch_processor.py ./pdf_input ./risultati --memory --memory-top 20\n"
+               "  python batch_processor.py ./pdf_input ./risultati --file-timeout 120 --memory-limit-mb 2048\n"
+               "\nGestione cache:\n"
+               "  python parse_cache.py ./risultati/cache/parse_cache.sqlite stats\n"
+               "  python parse_cache.py ./risultati/cache/parse_cache.sqlite invalidate"
+    )
+    arg_parser.add_argument('input_dir', help="Directory con i PDF da elaborare")
+    arg_parser.add_argument('output_dir', help="Directory dei risultati")
+    arg_parser.add_argument('max_files', nargs='?', type=int, default=None,
+                            help="Numero massimo di file da processare")
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help="Processi paralleli per il parsing (default: 1)")
+    arg_parser.add_argument('--page-workers', type=int, default=1,
+                            help="Processi che estraggono a blocchi di pagine i PDF molto lunghi "
+                                 f"(da {DEFAULT_PARALLEL_MIN_PAGES} pagine), per ogni worker (default: 1)")
+    arg_parser.add_argument('--max-in-flight', type=int, default=None,
+                            help="File in elaborazione contemporanea (default: 2 per worker)")
+    arg_parser.add_argument('--resume', action='store_true',
+                            help="Riprende l'ultima elaborazione dal manifest, saltando i file già elaborati")
+    arg_parser.add_argument('--retry-errors', action='store_true',
+                            help="Con --resume, rielabora anche i file terminati in errore")
+    arg_parser.add_argument('--re-extract', action='store_true',
+                            help="Riesegue solo l'estrazione dei campi sul testo/tabelle in cache, "
+                                 "senza rileggere i PDF (dopo modifiche ai pattern)")
+    arg_parser.add_argument('--watch', action='store_true',
+                            help="Modalità demone: sorveglia input_dir ed elabora i nuovi PDF "
+                                 "finché non riceve SIGTERM o Ctrl+C")
+    arg_parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help="Con --watch, secondi tra due scansioni (default: %(default)s)")
+    arg_parser.add_argument('--debounce', type=float, default=10.0,
+                            help="Con --watch, secondi di stabilità richiesti prima di elaborare "
+                                 "un file (default: %(default)s)")
+    arg_parser.add_argument('--stats-interval', type=float, default=60.0,
+                            help="Con --watch, secondi tra due log delle statistiche (default: %(default)s)")
+    arg_parser.add_argument('--export', default='',
+                            help="Export cumulativo dei documenti, formati separati da virgola "
+                                 "(json, jsonl, csv, parquet), scritto in streaming in output_dir")
+    arg_parser.add_argument('--export-gzip', action='store_true',
+                            help="Comprime gli export con gzip")
+    arg_parser.add_argument('--header-only', action='store_true',
+                            help="Estrae solo tipo, numero, data, cliente e totale dalla prima e "
+                                 "dall'ultima pagina, senza tabelle né articoli (indicizzazione archivi)")
+    arg_parser.add_argument('--split', action='store_true',
+                            help="Divide ogni PDF nei documenti che contiene (es. stampa giornaliera dei "
+                                 "DDT): un risultato e un record nel manifest per documento")
+    arg_parser.add_argument('--metrics-port', type=int, default=None,
+                            help="Espone le metriche in formato Prometheus su http://HOST:PORTA/metrics "
+                                 "durante l'elaborazione")
+    arg_parser.add_argument('--metrics-host', default="127.0.0.1",
+                            help="Indirizzo di ascolto di --metrics-port (default: %(default)s)")
+    arg_parser.add_argument('--metrics-file', default=None,
+                            help="Scrive le metriche in formato Prometheus in questo file .prom "
+                                 "(textfile collector di node_exporter)")
+    arg_parser.add_argument('--profile', action='store_true',
+                            help="Profila il parsing con cProfile: profilo aggregato del run in reports/ "
+                                 "e profilo completo dei file lenti accanto al loro _parsed.json")
+    arg_parser.add_argument('--profile-threshold', type=float, default=DEFAULT_SLOW_THRESHOLD,
+                            help="Con --profile, secondi oltre i quali il profilo di un file viene "
+                                 "salvato (default: %(default)s)")
+    arg_parser.add_argument('--memory', action='store_true',
+                            help="Misura la memoria di ogni file (picco tracemalloc e delta RSS) e "
+                                 "la registra nel manifest; i file più pesanti vanno nei report")
+    arg_parser.add_argument('--memory-top', type=int, default=DEFAULT_MEMORY_TOP,
+                            help="Con --memory, numero di file più pesanti elencati nei report "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument('--file-timeout', type=float, default=None,
+                            help="Secondi massimi di elaborazione per file: oltre, il worker viene "
+                                 "terminato e sostituito e il file va in errore come timeout")
+    arg_parser.add_argument('--memory-limit-mb', type=int, default=None,
+                            help="Spazio di indirizzamento massimo per worker in MB (RLIMIT_AS, "
+                                 "solo Unix): oltre, il file va in errore come memoria")
+    arg_parser.add_argument('--max-files-per-worker', type=int, default=None,
+                            help="Sostituisce ogni worker con un processo nuovo dopo N file")
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help="Non usare la cache dei PDF già elaborati")
+    arg_parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                            help="Dimensione massima della cache in MB (default: %(default)s)")
+    return arg_parser
+
+
 def main():
     """Funzione principale"""
-    if len(sys.argv) < 3:
-        print("Uso: python batch_processor.py <input_dir> <output_dir> [max_files]")
-        print("\nEsempio:")
-        print("  python batch_processor.py ./pdf_input ./risultati")
-        print("  python batch_processor.py ./pdf_input ./risultati 10")
-        sys.exit(1)
-        
-    input_dir = sys.argv[1]
-    output_dir = sys.argv[2]
-    max_files = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    args = _build_arg_parser().parse_args()
+    
+    input_dir = args.input_dir
+    output_dir = args.output_dir
+    max_files = args.max_files
     
     # Verifica directory input
     if not os.path.exists(input_dir):
         print(f"Errore: Directory input '{input_dir}' non trovata!")
         sys.exit(1)
         
+    if args.re_extract and args.no_cache:
+        print("Errore: --re-extract richiede la cache (incompatibile con --no-cache)")
+        sys.exit(1)
+        
+    if args.re_extract and args.header_only:
+        print("Errore: --re-extract si applica solo alla modalità completa (incompatibile con --header-only)")
+        sys.exit(1)
+        
+    if args.split and (args.header_only or args.re_extract):
+        print("Errore: --split divide i documenti completi (incompatibile con --header-only e --re-extract)")
+        sys.exit(1)
+        
+    export_formats = [fmt.strip() for fmt in args.export.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in export_formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        print(f"Errore: formati di export non supportati: {', '.join(unknown)} "
+              f"(disponibili: {', '.join(EXPORT_FORMATS)})")
+        sys.exit(1)
+        
     # Crea processore
-    processor = BatchProcessor(input_dir, output_dir)
+    processor = BatchProcessor(input_dir, output_dir, workers=args.workers,
+                               max_in_flight=args.max_in_flight,
+                               use_cache=not args.no_cache,
+                               cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                               export_formats=export_formats, export_compress=args.export_gzip,
+                               header_only=args.header_only, page_workers=args.page_workers,
+                               metrics_port=args.metrics_port, metrics_host=args.metrics_host,
+                               metrics_file=args.metrics_file, profile=args.profile,
+                               profile_threshold=args.profile_threshold, memory=args.memory,
+                               memory_top=args.memory_top, file_timeout=args.file_timeout,
+                               memory_limit_mb=args.memory_limit_mb,
+                               max_files_per_worker=args.max_files_per_worker,
+                               split_documents=args.split)
     
     # Processa batch
     try:
-        stats = processor.process_batch(max_files)
+        if args.watch:
+            daemon = WatchDaemon(processor, poll_interval=args.poll_interval,
+                                 debounce=args.debounce, stats_interval=args.stats_interval)
+            stats = daemon.run()
+        elif args.re_extract:
+            stats = processor.re_extract()
+        else:
+            stats = processor.process_batch(max_files, resume=args.resume,
+                                            retry_errors=args.retry_errors)
         processor.print_summary()
         
         # Exit code basato su successo/errori
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark dell'estrazione dei campi a pattern
+Confronta le cascate re.search per campo con FieldScanner sullo stesso testo normalizzato
+"""
+
+import sys
+import timeit
+import logging
+from ddt_fatture_parser import DDTFattureParser
+
+# Pagina tipo di un DDT (testo come restituito da pdfplumber)
+PAGINA = """
+ALFIERI SPECIALITA' ALIMENTARI S.P.A.
+C.so G. Marconi, 15 - 12050 MAGLIANO ALFIERI (CN)
+DOCUMENTO DI TRASPORTO
+N. 275071 Data 28/05/2025
+Cliente: 0000123 SUPERMERCATO ESEMPIO SRL
+Via Roma, 1 - 10100 TORINO TO
+P.IVA 04064060041
+Agente: 507 SAFFIRIO FLAVIO
+Vettore: S.A.F.I.M. S.P.A
+Codice Art. Descrizione U.M. Q.t Prezzo Sconto% Importo IVA
+060041 AGNOLOTTI BRASATO CARNE LC 250 G PZ 120 1,9000 15,00 193,80 10
+070017 PASTA SFOGLIA ROTONDA 230 GR PZ 48 2,1000 10,00 90,72 10
+200527 GNOCCHI PATATE RETT. S/GLUT 400 PZ 24 1,8500 8,00 40,85 10
+Totale documento €: 325,37 Numero colli: 92 Peso lordo kg: 181,5
+"""
+
+
+def estrai_cascata(parser: DDTFattureParser, text: str) -> tuple:
+    """Estrazione campo per campo, una re.search per pattern (comportamento precedente)"""
+    return (
+        parser._identify_document_type(text),
+        parser._extract_field(text, parser.patterns.NUMERO_DOCUMENTO, "numero"),
+        parser._extract_date(text),
+        parser._extract_fornitore(text),
+        parser._extract_agente(text),
+        parser._extract_field(text, parser.patterns.VETTORE, "vettore"),
+        parser._extract_decimal(text, parser.patterns.TOTALE, "totale")
+    )
+
+
+def estrai_scanner(parser: DDTFattureParser, text: str) -> tuple:
+    """Estrazione con FieldScanner, come in parse_raw_pages"""
+    fields = parser.scanner.scan(text)
+    return (
+        parser._identify_document_type(text, fields),
+        parser._field_value(fields, 'numero', "numero"),
+        parser._extract_date(text, fields),
+        parser._extract_fornitore(text, fields),
+        parser._extract_agente(text, fields),
+        parser._field_value(fields, 'vettore', "vettore"),
+        parser._extract_decimal(text, parser.patterns.TOTALE, "totale", fields)
+    )
+
+
+def main():
+    """Esegue il benchmark su documenti di 1, 10 e 50 pagine"""
+    # I warning per campi mancanti falserebbero i tempi
+    logging.disable(logging.WARNING)
+    parser = DDTFattureParser()
+    
+    print(f"{'Pagine':>6} {'Caratteri':>10} {'Cascata (ms)':>13} {'Scanner (ms)':>13} {'Speedup':>8}")
+    for pagine in (1, 10, 50):
+        text = parser._normalize_text(PAGINA * pagine)
+        
+        if estrai_cascata(parser, text) != estrai_scanner(parser, text):
+            print(f"❌ Risultati diversi su {pagine} pagine")
+            return 1
+        
+        number = max(20, 2000 // pagine)
+        cascata = min(timeit.repeat(lambda: estrai_cascata(parser, text), number=number, repeat=5)) / number
+        scanner = min(timeit.repeat(lambda: estrai_scanner(parser, text), number=number, repeat=5)) / number
+        print(f"{pagine:>6} {len(text):>10} {cascata * 1000:>13.3f} {scanner * 1000:>13.3f} "
+              f"{cascata / scanner:>7.1f}x")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
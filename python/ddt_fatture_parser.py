@@ -7,14 +7,26 @@ Supporta formati multipli e gestione errori avanzata
 import re
 import logging
 import json
+import hashlib
 import traceback
+import multiprocessing.util
 from datetime import datetime
+from itertools import chain
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Union
+from typing import Any, Callable, Dict, List, Tuple, Optional, Union, Iterable, Iterator
 import pdfplumber
-import pandas as pd
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from decimal import Decimal, InvalidOperation
+from parse_cache import ParseCache, file_digest, DEFAULT_MAX_BYTES
+from worker_pool import iter_pool_results
+from export_writers import create_writer
+from field_scanner import FieldScanner, DEFAULT_FLAGS as FIELD_FLAGS
+from text_view import TextView, as_view
+from page_layout import PageLayout
+from supplier_layouts import DocumentFingerprint, LayoutRegistry, SupplierLayout, default_registry, header_complete
+from document_splitter import DocumentSplitter, PageMarker
+from stage_timer import StageTimer
 
 # Configurazione logging
 logging.basicConfig(
@@ -23,6 +35,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Versione della logica di estrazione: incrementare quando cambia il parsing
+# (invalida automaticamente i risultati in cache)
+PARSER_VERSION = "1.3"
+
+# Versione dell'estrazione grezza pdfplumber (testo e tabelle per pagina):
+# incrementare solo quando cambia il modo in cui si legge il PDF
+EXTRACTOR_VERSION = "1.0"
+
+# Sezioni delimitate da parole chiave: la regex gira solo nella finestra
+# tra l'ancora e il terminatore, localizzati in TextView
+CLIENTE_SECTION = re.compile(
+    r'cliente\s*[:.]?\s*(.+?)(?:luogo|indirizzo|via|p\.iva)',
+    re.IGNORECASE | re.DOTALL
+)
+CLIENTE_TERMINATORS = ('luogo', 'indirizzo', 'via', 'p.iva')
+ARTICOLI_SECTION = re.compile(
+    r'(codice\s+descrizione.+?)(totale|trasporto|note)',
+    re.IGNORECASE | re.DOTALL
+)
+ARTICOLI_HEADER = re.compile(r'codice\s+descrizione', re.IGNORECASE)
+ARTICOLI_TERMINATORS = ('totale', 'trasporto', 'note')
+
+# Livello che ha prodotto gli articoli (Documento.estrazione_articoli)
+ESTRAZIONE_TESTO = "testo"
+ESTRAZIONE_TABELLE = "tabelle"
+# Pagine che possono contenere una tabella articoli: intestazioni di colonna
+# riconosciute da _extract_articoli_from_tables come descrizione
+ARTICOLI_PAGE_HEADER = re.compile(r'desc|articolo', re.IGNORECASE)
+# Analisi di pagina tenute in memoria per le tabelle: le altre pagine liberano subito i caratteri
+MAX_RETAINED_LAYOUTS = 4
+# Scarto ammesso per articolo tra somma degli importi e totale (arrotondamenti)
+TOLLERANZA_IMPORTO = 0.01
+# Modalità di parsing: documento completo o sola intestazione (tipo, numero,
+# data, cliente, totale) dalla prima e dall'ultima pagina, senza tabelle né articoli
+MODE_FULL = "full"
+MODE_HEADER = "header"
+MODES = (MODE_FULL, MODE_HEADER)
+# Pagine estratte da ogni worker in un blocco (PDF con più documenti o molto lunghi)
+DEFAULT_CHUNK_PAGES = 16
+# Pagine da cui un documento viene estratto a blocchi in parallelo (con page_workers > 1)
+DEFAULT_PARALLEL_MIN_PAGES = 2 * DEFAULT_CHUNK_PAGES
+# Numero di pagina nell'intestazione (testo normalizzato), es. "pag. 1" o "pagina: 2"
+PAGINA = re.compile(r'\bpag(?:ina)?\.?\s*[:.]?\s*(\d+)')
+# CAP, città e provincia in coda all'indirizzo estratto da un layout fornitore
+CAP_CITTA = re.compile(r'\s(\d{5})\s*-?\s*(.+?)\s+([A-Z]{2})\b')
+
 
 @dataclass
 class Fornitore:
@@ -80,6 +138,13 @@ class Documento:
     numero_colli: int = 0
     peso_lordo: float = 0.0
     file_origine: str = ""
+    estrazione_articoli: str = ""
+    # Layout fornitore riconosciuto ("" = parser generico)
+    layout: str = ""
+    # Pagine del PDF di origine (es. "3-5"), solo per PDF con più documenti
+    pagine: str = ""
+    # Durate delle fasi e conteggi di parse_single_file (StageTimer.as_dict), escluse dal confronto
+    metriche: Dict[str, Any] = field(default_factory=dict, compare=False)
     
     def __post_init__(self):
         if self.fornitore is None:
@@ -90,6 +155,31 @@ class Documento:
             self.agente = Agente()
         if self.articoli is None:
             self.articoli = []
+            
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Documento':
+        """Ricostruisce un documento da un dizionario prodotto da asdict()"""
+        data = dict(data)
+        data['fornitore'] = Fornitore(**data.get('fornitore') or {})
+        data['cliente'] = Cliente(**data.get('cliente') or {})
+        data['agente'] = Agente(**data.get('agente') or {})
+        data['articoli'] = [Articolo(**art) for art in data.get('articoli') or []]
+        return cls(**data)
+
+
+@dataclass
+class RawPage:
+    """Testo e tabelle estratti da una pagina PDF, prima dell'analisi dei campi"""
+    text: str = ""
+    # None = tabelle non ancora estratte (si estraggono solo se servono)
+    tables: Optional[List[List[List[str]]]] = None
+    # Formato pagina in punti (0 = sconosciuto, es. estrazioni in cache precedenti)
+    width: float = 0.0
+    height: float = 0.0
+
+
+# Estrae le tabelle delle pagine indicate: numero pagina -> tabelle
+TableLoader = Callable[[List[int]], Dict[int, List[List[List[str]]]]]
 
 
 class DocumentPatterns:
@@ -163,90 +253,652 @@ class DocumentPatterns:
     ]
 
 
+def parser_version(layouts: Optional[LayoutRegistry] = None) -> str:
+    """
+    Versione effettiva del parser: PARSER_VERSION più un'impronta dei pattern
+    
+    Qualsiasi modifica a DocumentPatterns o ai layout fornitore registrati
+    cambia la versione, quindi i risultati in cache prodotti con i pattern
+    precedenti non vengono riusati.
+    
+    Args:
+        layouts: Registro dei layout fornitore (None = quello predefinito)
+    """
+    patterns = {name: value for name, value in vars(DocumentPatterns).items() if name.isupper()}
+    patterns['LAYOUTS'] = [layout.name for layout in (layouts or default_registry()).layouts]
+    fingerprint = hashlib.sha256(json.dumps(patterns, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"{PARSER_VERSION}-{fingerprint[:12]}"
+
+
+def field_rules(patterns: DocumentPatterns) -> Dict[str, Tuple[List[str], int]]:
+    """
+    Campi estratti con FieldScanner: nome -> (pattern in ordine di priorità, flag)
+    
+    Flag e ordine riproducono le cascate di _identify_document_type,
+    _extract_field e _extract_agente.
+    """
+    return {
+        'tipo': ([pattern for tipo_patterns in patterns.TIPO_DOCUMENTO.values()
+                  for pattern in tipo_patterns], 0),
+        'numero': (patterns.NUMERO_DOCUMENTO, FIELD_FLAGS),
+        'data': (patterns.DATA, FIELD_FLAGS),
+        'piva': (patterns.PARTITA_IVA, FIELD_FLAGS),
+        'agente': (patterns.AGENTE, re.IGNORECASE),
+        'vettore': (patterns.VETTORE, FIELD_FLAGS),
+        'totale': (patterns.TOTALE, FIELD_FLAGS)
+    }
+
+
 class DDTFattureParser:
     """Parser principale per DDT e Fatture"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[ParseCache] = None, layouts: Optional[LayoutRegistry] = None,
+                 mode: str = MODE_FULL, page_workers: int = 1,
+                 parallel_min_pages: int = DEFAULT_PARALLEL_MIN_PAGES,
+                 chunk_pages: int = DEFAULT_CHUNK_PAGES, split_documents: bool = False):
+        """
+        Args:
+            cache: Cache persistente dei risultati (None = nessuna cache)
+            layouts: Layout fornitore con estrattore dedicato (None = quelli predefiniti)
+            mode: Modalità predefinita di parse_single_file (MODE_FULL o MODE_HEADER)
+            page_workers: Processi che estraggono a blocchi le pagine dei documenti
+                lunghi (1 = estrazione seriale)
+            parallel_min_pages: Pagine da cui un documento viene estratto in parallelo
+            chunk_pages: Pagine per blocco inviato a un worker
+            split_documents: process_multiple_files, iter_parse e i worker batch
+                dividono ogni PDF nei documenti che contiene (iter_documents)
+        """
+        if mode not in MODES:
+            raise ValueError(f"Modalità non supportata: {mode} (disponibili: {', '.join(MODES)})")
+        if split_documents and mode != MODE_FULL:
+            raise ValueError("La divisione in documenti richiede la modalità completa")
+        self.mode = mode
+        self.split_documents = split_documents
+        self.page_workers = max(1, page_workers)
+        self.parallel_min_pages = parallel_min_pages
+        self.chunk_pages = max(1, chunk_pages)
+        # Fasi del documento in elaborazione (nuovo timer per ogni parse_single_file)
+        self.timer = StageTimer()
         self.patterns = DocumentPatterns()
+        self.scanner = FieldScanner(field_rules(self.patterns))
+        # Tipo documento corrispondente a ogni pattern del campo 'tipo'
+        self._tipo_by_rank = [tipo for tipo, tipo_patterns in self.patterns.TIPO_DOCUMENTO.items()
+                              for _ in tipo_patterns]
         self.current_file = None
+        self.cache = cache
+        self.layouts = layouts if layouts is not None else default_registry()
+        self.version = parser_version(self.layouts)
         
-    def parse_single_file(self, file_path: Union[str, Path]) -> Documento:
+    def parse_single_file(self, file_path: Union[str, Path], mode: Optional[str] = None) -> Documento:
         """
         Parsifica un singolo file PDF
         
         Args:
             file_path: Percorso del file PDF
+            mode: MODE_FULL (documento completo) o MODE_HEADER (solo prima e
+                ultima pagina, senza tabelle né articoli); None = self.mode
             
         Returns:
             Documento: Oggetto documento con i dati estratti
         """
         file_path = Path(file_path)
         self.current_file = file_path.name
+        mode = mode or self.mode
+        if mode not in MODES:
+            raise ValueError(f"Modalità non supportata: {mode} (disponibili: {', '.join(MODES)})")
         
         logger.info(f"Inizio parsing file: {file_path}")
+        timer = self.timer = StageTimer()
         
-        documento = Documento(file_origine=str(file_path))
+        # Sola intestazione: risultato parziale, non passa dalla cache
+        if mode == MODE_HEADER:
+            try:
+                documento = self._parse_header_pages(file_path)
+            except Exception as e:
+                logger.error(f"Errore critico nel parsing di {file_path}: {e}")
+                logger.error(traceback.format_exc())
+                raise
+            documento.metriche = timer.as_dict()
+            logger.info(f"Intestazione estratta con successo: {file_path}")
+            return documento
+        
+        # Il contenuto già elaborato viene servito dalla cache senza aprire il PDF
+        digest = None
+        if self.cache is not None:
+            with timer.stage("cache"):
+                digest = file_digest(file_path)
+                cached = self.cache.get(digest, self.version)
+            if cached is not None:
+                documento = Documento.from_dict(cached)
+                documento.file_origine = str(file_path)
+                documento.metriche = timer.as_dict()
+                logger.info(f"Documento recuperato dalla cache: {file_path}")
+                return documento
         
         try:
-            with pdfplumber.open(file_path) as pdf:
-                # Estrai tutto il testo
-                full_text = ""
-                tables_data = []
-                
-                for page_num, page in enumerate(pdf.pages):
-                    try:
-                        # Estrai testo
-                        page_text = page.extract_text() or ""
-                        full_text += page_text + "\n"
-                        
-                        # Estrai tabelle
-                        tables = page.extract_tables()
-                        if tables:
-                            tables_data.extend(tables)
-                            
-                    except Exception as e:
-                        logger.error(f"Errore estrazione pagina {page_num + 1}: {e}")
-                
-                # Normalizza il testo
-                full_text = self._normalize_text(full_text)
-                
-                # Identifica tipo documento
-                documento.tipo = self._identify_document_type(full_text)
-                logger.info(f"Tipo documento identificato: {documento.tipo}")
-                
-                # Estrai dati base
-                documento.numero = self._extract_field(full_text, self.patterns.NUMERO_DOCUMENTO, "numero")
-                documento.data = self._extract_date(full_text)
-                
-                # Estrai dati fornitore
-                documento.fornitore = self._extract_fornitore(full_text)
-                
-                # Estrai dati cliente
-                documento.cliente = self._extract_cliente(full_text)
-                
-                # Estrai agente e vettore
-                documento.agente = self._extract_agente(full_text)
-                documento.vettore = self._extract_field(full_text, self.patterns.VETTORE, "vettore")
-                
-                # Estrai articoli
-                documento.articoli = self._extract_articoli(full_text, tables_data)
-                
-                # Estrai totali
-                documento.totale = self._extract_decimal(full_text, self.patterns.TOTALE, "totale")
-                
-                # Calcola totali se non presenti
-                if not documento.totale and documento.articoli:
-                    documento.totale = sum(art.importo for art in documento.articoli)
-                
-                logger.info(f"Parsing completato con successo: {file_path}")
+            # Livello 1: testo grezzo (la parte costosa); le tabelle solo se servono
+            pages = None
+            if digest is not None:
+                with timer.stage("cache"):
+                    cached_raw = self.cache.get_raw(digest, EXTRACTOR_VERSION)
+                if cached_raw is not None:
+                    pages = [RawPage(**page) for page in cached_raw['pages']]
+                    logger.info(f"Estrazione grezza recuperata dalla cache: {file_path}")
+            
+            # Livello 2: estrazione dei campi con i pattern
+            if pages is None:
+                tables_before = None
+                with timer.stage("apertura"):
+                    pdf = pdfplumber.open(file_path)
+                    page_count = len(pdf.pages)
+                with pdf:
+                    with timer.stage("testo"):
+                        if self._parallel_pages(page_count):
+                            # Documento lungo: blocchi di pagine estratti dai worker e ricomposti in ordine
+                            pages = list(self._iter_raw_pages(file_path, self.page_workers,
+                                                              self.chunk_pages, page_count))
+                            load_tables = self.chunked_table_loader(file_path)
+                        else:
+                            pages, layouts = self._extract_raw_pages(pdf)
+                            load_tables = self.table_loader(file_path, pdf, layouts)
+                    documento = self.parse_raw_pages(pages, file_path, load_tables)
+            else:
+                tables_before = [page.tables is not None for page in pages]
+                load_tables = (self.chunked_table_loader(file_path) if self._parallel_pages(len(pages))
+                               else self.table_loader(file_path))
+                documento = self.parse_raw_pages(pages, file_path, load_tables)
+            logger.info(f"Parsing completato con successo: {file_path}")
+            
+            # Estrazione nuova o tabelle aggiunte: aggiorna la cache grezza
+            if digest is not None and tables_before != [page.tables is not None for page in pages]:
+                with timer.stage("cache"):
+                    self.cache.put_raw(digest, EXTRACTOR_VERSION,
+                                       {'pages': [asdict(page) for page in pages]},
+                                       source=str(file_path))
                 
         except Exception as e:
             logger.error(f"Errore critico nel parsing di {file_path}: {e}")
             logger.error(traceback.format_exc())
             raise
             
+        timer.count("pagine", len(pages))
+        timer.count("caratteri", sum(len(page.text) for page in pages))
+        documento.metriche = timer.as_dict()
+        if digest is not None:
+            with timer.stage("cache"):
+                self.cache.put(digest, self.version, asdict(documento))
+            
+        return documento
+    
+    def _extract_raw_pages(self, pdf) -> Tuple[List[RawPage], Dict[int, PageLayout]]:
+        """
+        Estrae il testo di ogni pagina con pdfplumber (le tabelle su richiesta)
+        
+        L'analisi resta in memoria solo per le prime MAX_RETAINED_LAYOUTS pagine
+        che possono contenere una tabella articoli. Le altre pagine liberano
+        subito caratteri e oggetti in cache, invece di tenerli fino alla chiusura
+        del PDF: la memoria di picco non cresce con il numero di pagine.
+        
+        Returns:
+            Tuple di (pagine, analisi delle pagine da riusare per le tabelle)
+        """
+        pages = []
+        layouts = {}
+        
+        for page_num, page in enumerate(pdf.pages):
+            raw_page, layout = self._extract_raw_page(page)
+            if (layout is not None and len(layouts) < MAX_RETAINED_LAYOUTS
+                    and ARTICOLI_PAGE_HEADER.search(raw_page.text)):
+                layouts[page_num] = layout
+            else:
+                page.close()
+            pages.append(raw_page)
+                
+        return pages, layouts
+    
+    def _extract_raw_page(self, page) -> Tuple[RawPage, Optional[PageLayout]]:
+        """Testo e formato di una pagina; l'analisi è None se l'estrazione è fallita"""
+        raw_page = RawPage(width=float(page.width), height=float(page.height))
+        try:
+            layout = PageLayout(page)
+            raw_page.text = layout.extract_text() or ""
+        except Exception as e:
+            logger.error(f"Errore estrazione pagina {page.page_number}: {e}")
+            layout = None
+        return raw_page, layout
+    
+    def table_loader(self, file_path: Union[str, Path], pdf=None,
+                     layouts: Optional[Dict[int, PageLayout]] = None) -> TableLoader:
+        """
+        Funzione che estrae le tabelle delle pagine richieste
+        
+        Args:
+            file_path: Percorso del file PDF
+            pdf: PDF già aperto da riusare (None = aperto alla prima richiesta)
+            layouts: Analisi delle pagine già calcolate per il testo
+            
+        Returns:
+            Funzione numeri di pagina -> {numero pagina: tabelle}
+        """
+        def load(page_numbers: List[int]) -> Dict[int, List[List[List[str]]]]:
+            with self.timer.stage("tabelle"):
+                if pdf is not None:
+                    return self._extract_page_tables(pdf, page_numbers, layouts)
+                with pdfplumber.open(file_path) as opened:
+                    return self._extract_page_tables(opened, page_numbers)
+        return load
+    
+    def chunked_table_loader(self, file_path: Union[str, Path]) -> TableLoader:
+        """
+        Come table_loader, ma le pagine richieste vengono divise in blocchi
+        estratti in parallelo da page_workers processi, che aprono ciascuno il PDF
+        """
+        def load(page_numbers: List[int]) -> Dict[int, List[List[List[str]]]]:
+            chunks = ((str(file_path), page_numbers[start:start + self.chunk_pages])
+                      for start in range(0, len(page_numbers), self.chunk_pages))
+            tables = {}
+            with self.timer.stage("tabelle"):
+                for _, chunk_tables in self._iter_chunk_results(_extract_tables_in_worker, chunks,
+                                                                self.page_workers):
+                    tables.update(chunk_tables)
+            return tables
+        return load
+    
+    def _parallel_pages(self, page_count: int) -> bool:
+        """True se un documento di page_count pagine va estratto a blocchi in parallelo"""
+        return self.page_workers > 1 and page_count >= self.parallel_min_pages
+    
+    def _offset_table_loader(self, load_tables: TableLoader, first_page: int) -> TableLoader:
+        """Loader con numeri di pagina relativi a un documento che inizia a first_page"""
+        def load(page_numbers: List[int]) -> Dict[int, List[List[List[str]]]]:
+            tables = load_tables([first_page + page_num for page_num in page_numbers])
+            return {page_num - first_page: page_tables for page_num, page_tables in tables.items()}
+        return load
+    
+    def _extract_page_tables(self, pdf, page_numbers: List[int],
+                             layouts: Optional[Dict[int, PageLayout]] = None) -> Dict[int, List[List[List[str]]]]:
+        """Estrae le tabelle delle sole pagine indicate, dalle parole già raggruppate per il testo"""
+        layouts = layouts or {}
+        tables = {}
+        for page_num in page_numbers:
+            try:
+                # Estratte le tabelle, l'analisi della pagina non serve più
+                layout = layouts.pop(page_num, None) or PageLayout(pdf.pages[page_num])
+                tables[page_num] = layout.extract_tables() or []
+                pdf.pages[page_num].close()
+            except Exception as e:
+                logger.error(f"Errore estrazione tabelle pagina {page_num + 1}: {e}")
+                tables[page_num] = []
+        return tables
+    
+    def parse_raw_pages(self, pages: List[RawPage], file_path: Union[str, Path],
+                        load_tables: Optional[TableLoader] = None, header_only: bool = False) -> Documento:
+        """
+        Estrae i campi del documento dal testo e dalle tabelle già estratti
+        
+        Non accede al PDF: può essere rieseguito sull'estrazione grezza in cache
+        quando cambiano DocumentPatterns o le regole di estrazione. Le tabelle
+        mancanti vengono chieste a load_tables solo se gli articoli estratti dal
+        testo non tornano con il totale; le pagine vengono aggiornate sul posto.
+        
+        I documenti di un layout fornitore registrato, riconosciuto dall'impronta
+        della prima pagina, passano dal suo estrattore dedicato invece che dalla
+        cascata di pattern generica.
+        
+        Args:
+            pages: Testo e tabelle per pagina
+            file_path: Percorso del file PDF di origine
+            load_tables: Estrazione delle tabelle non ancora presenti (None = solo quelle in pages)
+            header_only: Estrae solo i campi dell'intestazione e il totale, senza articoli
+            
+        Returns:
+            Documento: Oggetto documento con i dati estratti
+        """
+        layout = None
+        if pages:
+            fingerprint = DocumentFingerprint.from_page(pages[0].text, pages[0].width, pages[0].height)
+            layout = self.layouts.match(fingerprint)
+        if layout is not None:
+            documento = self._parse_with_layout(layout, pages, file_path, load_tables, header_only)
+            if documento is not None:
+                return documento
+            logger.info(f"Intestazione {layout.name} non trovata, uso il parser generico")
+        
+        documento = Documento(file_origine=str(file_path))
+        
+        full_text = "\n".join(page.text for page in pages) + "\n" if pages else ""
+        
+        # Normalizza il testo
+        with self.timer.stage("normalizzazione"):
+            full_text = self._normalize_text(full_text)
+        
+        with self.timer.stage("campi"):
+            # Minuscolo, righe e parole chiave calcolati una volta per tutti gli estrattori
+            view = TextView(full_text)
+            self._extract_fields(documento, full_text, view, layout)
+        if header_only:
+            return documento
+        
+        # Estrai articoli (testo, poi tabelle se non tornano con il totale)
+        with self.timer.stage("articoli"):
+            documento.articoli, documento.estrazione_articoli = self._extract_articoli(
+                view, pages, documento.totale, load_tables
+            )
+        
+        # Calcola totali se non presenti
+        if not documento.totale and documento.articoli:
+            documento.totale = sum(art.importo for art in documento.articoli)
+            
         return documento
     
+    def _extract_fields(self, documento: Documento, full_text: str, view: TextView,
+                        layout: Optional[SupplierLayout] = None) -> None:
+        """Compila intestazione e totale dal testo normalizzato con la cascata di pattern generica"""
+        # Cerca tutti i campi a pattern con lo scanner (pattern già compilati)
+        fields = self.scanner.scan(full_text)
+        
+        # Identifica tipo documento
+        documento.tipo = self._identify_document_type(full_text, fields)
+        logger.info(f"Tipo documento identificato: {documento.tipo}")
+        
+        # Estrai dati base
+        documento.numero = self._field_value(fields, 'numero', "numero")
+        documento.data = self._extract_date(full_text, fields)
+        
+        # Estrai dati fornitore (fissi se il layout è stato riconosciuto)
+        if layout is not None:
+            documento.fornitore = Fornitore(**layout.fornitore)
+        else:
+            documento.fornitore = self._extract_fornitore(view, fields)
+        
+        # Estrai dati cliente
+        documento.cliente = self._extract_cliente(view)
+        
+        # Estrai agente e vettore
+        documento.agente = self._extract_agente(full_text, fields)
+        documento.vettore = self._field_value(fields, 'vettore', "vettore")
+        
+        # Estrai totali
+        documento.totale = self._extract_decimal(full_text, self.patterns.TOTALE, "totale", fields)
+    
+    def _parse_with_layout(self, layout: SupplierLayout, pages: List[RawPage], file_path: Union[str, Path],
+                           load_tables: Optional[TableLoader] = None,
+                           header_only: bool = False) -> Optional[Documento]:
+        """
+        Estrae il documento con l'estrattore dedicato di un layout fornitore
+        
+        Gli articoli del layout sono accettati se tornano con il totale;
+        altrimenti si usano i livelli di _extract_articoli sul testo normalizzato.
+        
+        Returns:
+            Documento, oppure None se il layout non trova la sua intestazione
+        """
+        lines = "\n".join(page.text for page in pages).split('\n')
+        with self.timer.stage("campi"):
+            data = layout.extract(lines)
+        if data is None:
+            return None
+        logger.info(f"Layout fornitore riconosciuto: {layout.name}")
+        
+        documento = self._layout_documento(layout, data, file_path)
+        if header_only:
+            return documento
+        
+        articoli = [
+            Articolo(
+                codice=row['codice'],
+                descrizione=row['descrizione'],
+                unita_misura=row['unita_misura'],
+                quantita=self._parse_number(row['quantita']),
+                prezzo_unitario=self._parse_number(row['prezzo_unitario']),
+                sconto=self._parse_number(row['sconto']),
+                importo=self._parse_number(row['importo']),
+                iva=self._parse_number(row['iva'])
+            )
+            for row in data.get('articoli', [])
+        ]
+        if self._articoli_match_totale(articoli, documento.totale):
+            documento.articoli, documento.estrazione_articoli = articoli, ESTRAZIONE_TESTO
+        else:
+            with self.timer.stage("normalizzazione"):
+                view = TextView(self._normalize_text("\n".join(lines) + "\n"))
+            with self.timer.stage("articoli"):
+                documento.articoli, documento.estrazione_articoli = self._extract_articoli(
+                    view, pages, documento.totale, load_tables
+                )
+        
+        if not documento.totale and documento.articoli:
+            documento.totale = sum(art.importo for art in documento.articoli)
+            
+        return documento
+    
+    def parse_header(self, file_path: Union[str, Path]) -> Optional[Documento]:
+        """
+        Estrae intestazione e totale di un documento di layout noto dalle sole regioni
+        
+        Il testo completo serve solo per l'impronta della prima pagina; poi si
+        ritagliano le aree dichiarate dal layout (intestazione sulla prima
+        pagina, totali sull'ultima). Le pagine intermedie non vengono lette e
+        le tabelle non vengono estratte.
+        
+        Args:
+            file_path: Percorso del file PDF
+            
+        Returns:
+            Documento senza articoli, oppure None se il layout non è riconosciuto,
+            non dichiara regioni o non trova la sua intestazione
+        """
+        file_path = Path(file_path)
+        
+        with pdfplumber.open(file_path) as pdf:
+            if not pdf.pages:
+                return None
+            return self._parse_regions(pdf, file_path, pdf.pages[0].extract_text() or "")
+    
+    def _parse_regions(self, pdf, file_path: Path, first_text: str) -> Optional[Documento]:
+        """Intestazione dalle regioni del layout riconosciuto dal testo della prima pagina (vedi parse_header)"""
+        first_page = pdf.pages[0]
+        layout = self.layouts.match(DocumentFingerprint.from_page(first_text, first_page.width, first_page.height))
+        if layout is None or not layout.regions:
+            return None
+        data = layout.extract_regions(layout.read_regions(pdf))
+        if not header_complete(data):
+            # Aree che non contengono l'intestazione: la legge il layout dal testo delle pagine
+            return None
+        logger.info(f"Intestazione {layout.name} estratta dalle regioni: {file_path}")
+        return self._layout_documento(layout, data, file_path)
+    
+    def _parse_header_pages(self, file_path: Path) -> Documento:
+        """
+        Modalità MODE_HEADER: intestazione e totale dalla prima e dall'ultima pagina
+        
+        I layout con regioni leggono solo le proprie aree; gli altri documenti
+        passano al parser generico sul testo della prima e dell'ultima pagina.
+        Le tabelle non vengono mai estratte.
+        """
+        pages = []
+        with self.timer.stage("apertura"):
+            pdf = pdfplumber.open(file_path)
+            page_numbers = sorted({0, len(pdf.pages) - 1}) if pdf.pages else []
+        with pdf:
+            for page_num in page_numbers:
+                page = pdf.pages[page_num]
+                raw_page = RawPage(width=float(page.width), height=float(page.height))
+                with self.timer.stage("testo"):
+                    try:
+                        raw_page.text = page.extract_text() or ""
+                    except Exception as e:
+                        logger.error(f"Errore estrazione pagina {page_num + 1}: {e}")
+                pages.append(raw_page)
+                self.timer.count("pagine", 1)
+                self.timer.count("caratteri", len(raw_page.text))
+                
+                # Dopo la prima pagina: se il layout ha regioni l'ultima non va letta intera
+                if page_num == 0:
+                    with self.timer.stage("regioni"):
+                        documento = self._parse_regions(pdf, file_path, raw_page.text)
+                    if documento is not None:
+                        return documento
+                        
+        return self.parse_raw_pages(pages, file_path, header_only=True)
+    
+    def _layout_documento(self, layout: SupplierLayout, data: Dict, file_path: Union[str, Path]) -> Documento:
+        """Documento (senza articoli) dai campi estratti da un layout fornitore"""
+        return Documento(
+            tipo=data.get('tipo', ''),
+            numero=data.get('numero', ''),
+            data=data.get('data', ''),
+            fornitore=Fornitore(**layout.fornitore),
+            cliente=self._layout_cliente(data),
+            agente=Agente(codice=data.get('agente_codice', ''), nome=data.get('agente_nome', '')),
+            vettore=data.get('vettore', ''),
+            totale=self._parse_number(data.get('totale', 0)),
+            file_origine=str(file_path),
+            layout=layout.name
+        )
+    
+    def _layout_cliente(self, data: Dict) -> Cliente:
+        """Cliente dai campi estratti da un layout fornitore"""
+        cliente = Cliente(
+            nome=data.get('cliente', ''),
+            codice=data.get('codice_cliente', ''),
+            piva=data.get('piva_cliente', '')
+        )
+        
+        indirizzo = data.get('indirizzo_cliente', '')
+        cap_match = CAP_CITTA.search(indirizzo)
+        if cap_match:
+            cliente.indirizzo = indirizzo[:cap_match.start()].strip()
+            cliente.cap, cliente.citta, cliente.provincia = (group.strip() for group in cap_match.groups())
+        else:
+            cliente.indirizzo = indirizzo
+        return cliente
+    
+    def iter_documents(self, file_path: Union[str, Path], workers: int = 1,
+                       chunk_pages: Optional[int] = None) -> Iterator[Documento]:
+        """
+        Parsifica un PDF che contiene più documenti, uno dopo l'altro
+        
+        DocumentSplitter individua i confini pagina per pagina (nuova
+        intestazione con un altro numero, marcatore "pagina 1") e ogni documento
+        viene restituito appena la pagina successiva ne apre un altro. Con più
+        worker ogni processo riceve un blocco di chunk_pages pagine, lo estrae e
+        parsifica i documenti che contiene (_iter_chunk_documents). Non usa la
+        cache, che memorizza un documento per file.
+        
+        Args:
+            file_path: Percorso del file PDF
+            workers: Processi che estraggono e parsificano i blocchi di pagine (1 = seriale)
+            chunk_pages: Pagine per blocco inviato a un worker (None = self.chunk_pages)
+            
+        Yields:
+            Un Documento per ogni documento logico, nell'ordine del PDF
+        """
+        file_path = Path(file_path)
+        self.current_file = file_path.name
+        logger.info(f"Inizio parsing documenti multipli: {file_path}")
+        
+        chunk_pages = chunk_pages or self.chunk_pages
+        page_count = 0
+        if workers > 1:
+            with pdfplumber.open(file_path) as pdf:
+                page_count = len(pdf.pages)
+        # Un PDF di un solo blocco non ha nulla da dividere tra i worker
+        if page_count > chunk_pages:
+            documents = self._iter_chunk_documents(file_path, page_count, workers, chunk_pages)
+        else:
+            splitter = DocumentSplitter(self._page_marker)
+            documents = ((first_page, pages, None) for first_page, pages
+                         in splitter.split(self._iter_raw_pages(file_path, 1, chunk_pages)))
+        
+        load_tables = self.table_loader(file_path)
+        for first_page, pages, documento in documents:
+            if documento is None:
+                documento = self.parse_raw_pages(pages, file_path,
+                                                 self._offset_table_loader(load_tables, first_page))
+            documento.pagine = f"{first_page + 1}-{first_page + len(pages)}"
+            logger.info(f"Documento {documento.numero} estratto dalle pagine {documento.pagine}")
+            yield documento
+    
+    def parse_documents(self, file_path: Union[str, Path], workers: int = 1,
+                        chunk_pages: Optional[int] = None) -> List[Documento]:
+        """Come iter_documents, ma restituisce la lista dei documenti"""
+        return list(self.iter_documents(file_path, workers, chunk_pages))
+    
+    def _iter_chunk_documents(self, file_path: Path, page_count: int, workers: int,
+                              chunk_pages: int) -> Iterator[Tuple[int, List[RawPage], Optional[Documento]]]:
+        """
+        Documenti del PDF parsificati dai worker, un blocco di pagine per worker
+        
+        Un worker non conosce il documento del blocco precedente: i confini
+        definitivi vengono ricalcolati qui, in ordine, dagli indizi di pagina
+        restituiti con i documenti. Un documento che coincide con uno del blocco
+        arriva già parsificato; uno a cavallo di due blocchi viene restituito
+        con le sole pagine, già estratte, da parsificare nel processo corrente.
+        
+        Yields:
+            Tuple di (indice della prima pagina, pagine, documento o None)
+        """
+        chunks = ((str(file_path), start, min(start + chunk_pages, page_count))
+                  for start in range(0, page_count, chunk_pages))
+        results = self._iter_chunk_results(_parse_documents_in_worker, chunks, workers)
+        
+        # Pagine in ordine, ognuna con i suoi indizi e il documento del blocco a cui appartiene
+        pages = ((page, marker, parsed) for _, chunk_documents in results for parsed in chunk_documents
+                 for page, marker in zip(parsed[2], parsed[1]))
+        for first_page, items in DocumentSplitter(itemgetter(1)).split(pages):
+            parsed = items[0][2]
+            if parsed[0] == first_page and len(parsed[2]) == len(items):
+                yield first_page, parsed[2], parsed[3]
+            else:
+                yield first_page, [page for page, _, _ in items], None
+    
+    def _iter_raw_pages(self, file_path: Path, workers: int, chunk_pages: int,
+                        page_count: Optional[int] = None) -> Iterator[RawPage]:
+        """Pagine del PDF in ordine; con più worker estratte a blocchi in parallelo"""
+        if workers <= 1:
+            with pdfplumber.open(file_path) as pdf:
+                for page in pdf.pages:
+                    raw_page = self._extract_raw_page(page)[0]
+                    page.close()
+                    yield raw_page
+            return
+            
+        if page_count is None:
+            with pdfplumber.open(file_path) as pdf:
+                page_count = len(pdf.pages)
+        chunks = ((str(file_path), start, min(start + chunk_pages, page_count))
+                  for start in range(0, page_count, chunk_pages))
+        # I blocchi tornano nell'ordine del PDF: chi li legge può procedere in streaming
+        results = self._iter_chunk_results(_extract_pages_in_worker, chunks, workers)
+        yield from chain.from_iterable(pages for _, pages in results)
+    
+    def _iter_chunk_results(self, func: Callable, chunks: Iterable, workers: int) -> Iterator[Tuple]:
+        """Blocchi di pagine elaborati da un pool di worker, nell'ordine di input"""
+        # I worker dei blocchi estraggono soltanto: non servono cache né altri blocchi in parallelo
+        options = dict(self.worker_options(), cache_path=None, page_workers=1)
+        return iter_pool_results(func, chunks, workers, initializer=_init_worker,
+                                 initargs=(options,), ordered=True)
+    
+    def _page_marker(self, page: RawPage) -> PageMarker:
+        """Indizi di inizio documento di una pagina, per DocumentSplitter"""
+        layout = self.layouts.match(DocumentFingerprint.from_page(page.text, page.width, page.height))
+        if layout is not None:
+            found = layout.page_marker(page.text.split('\n'))
+            if found is not None:
+                return PageMarker(numero=found[0], pagina=found[1], intestazione=True)
+        
+        # Pattern generici: il numero conta solo su una pagina con il tipo documento
+        text = self._normalize_text(page.text)
+        fields = self.scanner.scan(text)
+        marker = PageMarker(intestazione=bool(fields['tipo']))
+        if marker.intestazione:
+            marker.numero = self._field_value(fields, 'numero', "numero")
+        pagina = PAGINA.search(text)
+        if pagina:
+            marker.pagina = int(pagina.group(1))
+        return marker
+    
     def _normalize_text(self, text: str) -> str:
         """Normalizza il testo per facilitare il parsing"""
         # Converti a lowercase per matching case-insensitive
@@ -263,9 +915,18 @@ class DDTFattureParser:
         
         return text_lower
     
-    def _identify_document_type(self, text: str) -> str:
-        """Identifica il tipo di documento"""
-        text_lower = text.lower()
+    def _identify_document_type(self, text: Union[str, TextView], fields: Optional[Dict] = None) -> str:
+        """
+        Identifica il tipo di documento
+        
+        Args:
+            fields: Risultato di FieldScanner.scan sul testo (None = cerca nel testo)
+        """
+        if fields is not None:
+            found = fields['tipo']
+            return self._tipo_by_rank[found[0]] if found else "DDT"
+            
+        text_lower = text.lower if isinstance(text, TextView) else text.lower()
         
         for doc_type, patterns in self.patterns.TIPO_DOCUMENTO.items():
             for pattern in patterns:
@@ -287,9 +948,23 @@ class DDTFattureParser:
         logger.warning(f"Campo '{field_name}' non trovato")
         return ""
     
-    def _extract_date(self, text: str) -> str:
+    def _field_value(self, fields: Dict, name: str, field_name: str) -> str:
+        """Valore (primo gruppo) di un campo trovato da FieldScanner, come _extract_field"""
+        found = fields[name]
+        if found:
+            value = found[1].group(1).strip()
+            logger.debug(f"Campo '{field_name}' trovato: {value}")
+            return value
+            
+        logger.warning(f"Campo '{field_name}' non trovato")
+        return ""
+    
+    def _extract_date(self, text: str, fields: Optional[Dict] = None) -> str:
         """Estrae e normalizza la data"""
-        date_str = self._extract_field(text, self.patterns.DATA, "data")
+        if fields is not None:
+            date_str = self._field_value(fields, 'data', "data")
+        else:
+            date_str = self._extract_field(text, self.patterns.DATA, "data")
         
         if date_str:
             # Prova a normalizzare la data
@@ -319,9 +994,18 @@ class DDTFattureParser:
                 
         return ""
     
-    def _extract_decimal(self, text: str, patterns: List[str], field_name: str) -> float:
-        """Estrae un valore decimale"""
-        value_str = self._extract_field(text, patterns, field_name)
+    def _extract_decimal(self, text: str, patterns: List[str], field_name: str,
+                         fields: Optional[Dict] = None) -> float:
+        """
+        Estrae un valore decimale
+        
+        Args:
+            fields: Risultato di FieldScanner.scan, se contiene il campo field_name
+        """
+        if fields is not None:
+            value_str = self._field_value(fields, field_name, field_name)
+        else:
+            value_str = self._extract_field(text, patterns, field_name)
         
         if value_str:
             # Normalizza il numero (virgola -> punto)
@@ -336,58 +1020,50 @@ class DDTFattureParser:
                 
         return 0.0
     
-    def _extract_fornitore(self, text: str) -> Fornitore:
+    def _extract_fornitore(self, text: Union[str, TextView], fields: Optional[Dict] = None) -> Fornitore:
         """Estrae i dati del fornitore"""
         fornitore = Fornitore()
+        view = as_view(text)
+        text = view.text
         
-        # Per Alfieri, cerca pattern specifici
-        if "alfieri" in text:
-            fornitore.nome = "ALFIERI SPECIALITA' ALIMENTARI S.P.A."
-            fornitore.piva = "03247720042"
-            
-            # Cerca indirizzo Alfieri
-            addr_match = re.search(
-                r'(c\.so\s+g\.\s*marconi.+?12050\s+magliano\s+alfieri.+?cn)',
-                text,
-                re.IGNORECASE | re.DOTALL
-            )
-            if addr_match:
-                addr_parts = addr_match.group(1).strip().split()
-                # Ricostruisci indirizzo pulito
-                fornitore.indirizzo = " ".join(addr_parts)
-                
+        # Pattern generico (i fornitori noti passano dai layout registrati)
+        # Cerca prima riga con P.IVA per identificare il fornitore
+        if fields is not None:
+            piva = self._field_value(fields, 'piva', "p.iva fornitore")
         else:
-            # Pattern generico per altri fornitori
-            # Cerca prima riga con P.IVA per identificare il fornitore
             piva = self._extract_field(text, self.patterns.PARTITA_IVA, "p.iva fornitore")
-            if piva:
-                fornitore.piva = piva
-                
-                # Cerca nome prima della P.IVA
-                piva_index = text.lower().find(piva.lower())
-                if piva_index > 0:
-                    before_piva = text[:piva_index]
-                    lines = before_piva.strip().split('\n')
-                    
-                    # Il nome è probabilmente nelle ultime righe prima della P.IVA
-                    for line in reversed(lines[-5:]):
-                        line = line.strip()
-                        if line and len(line) > 10 and not re.match(r'^[\d\s\-/]+$', line):
-                            fornitore.nome = line
-                            break
-                            
+        if piva:
+            fornitore.piva = piva
+            
+            # Cerca nome prima della P.IVA
+            piva_index = view.find(piva)
+            if piva_index > 0:
+                # Il nome è probabilmente nelle ultime righe prima della P.IVA
+                for line in reversed(view.lines_before(piva_index, 5)):
+                    line = line.strip()
+                    if line and len(line) > 10 and not re.match(r'^[\d\s\-/]+$', line):
+                        fornitore.nome = line
+                        break
+                        
         return fornitore
     
-    def _extract_cliente(self, text: str) -> Cliente:
+    def _extract_cliente(self, text: Union[str, TextView]) -> Cliente:
         """Estrae i dati del cliente"""
         cliente = Cliente()
+        view = as_view(text)
+        text = view.text
         
-        # Cerca sezione cliente
-        cliente_match = re.search(
-            r'cliente\s*[:.]?\s*(.+?)(?:luogo|indirizzo|via|p\.iva)',
-            text,
-            re.IGNORECASE | re.DOTALL
-        )
+        # Cerca sezione cliente: con le ancore indicizzate, solo tra la prima
+        # occorrenza di "cliente" e il terminatore che la chiude
+        if view.case_stable:
+            cliente_match = None
+            start = view.first('cliente')
+            if start >= 0:
+                end = view.section_window(start + len('cliente'), CLIENTE_TERMINATORS)
+                if end is not None:
+                    cliente_match = CLIENTE_SECTION.match(text, start, end)
+        else:
+            cliente_match = CLIENTE_SECTION.search(text)
         
         if cliente_match:
             cliente_text = cliente_match.group(1).strip()
@@ -426,27 +1102,38 @@ class DDTFattureParser:
                         break
         
         # Cerca P.IVA cliente
-        # Escludi P.IVA del fornitore già trovata
-        text_after_cliente = text
+        # Escludi le P.IVA dei fornitori registrati
+        start = 0
         if cliente.nome:
-            nome_index = text.lower().find(cliente.nome.lower())
+            nome_index = view.find(cliente.nome)
             if nome_index > 0:
-                text_after_cliente = text[nome_index:]
+                start = nome_index
                 
-        piva_matches = re.finditer(r'p\.?\s*iva\s*[:.]?\s*(\d{11})', text_after_cliente, re.IGNORECASE)
+        # Senza "iva" nel resto del testo non c'è nessuna P.IVA da cercare
+        if view.case_stable and not view.has('iva', start):
+            return cliente
+            
+        supplier_pivas = self.layouts.supplier_pivas
+        piva_matches = re.compile(r'p\.?\s*iva\s*[:.]?\s*(\d{11})', re.IGNORECASE).finditer(text, start)
         for match in piva_matches:
             piva = match.group(1)
-            # Escludi P.IVA Alfieri
-            if piva != "03247720042":
+            if piva not in supplier_pivas:
                 cliente.piva = piva
                 break
                 
         return cliente
     
-    def _extract_agente(self, text: str) -> Agente:
+    def _extract_agente(self, text: str, fields: Optional[Dict] = None) -> Agente:
         """Estrae i dati dell'agente"""
         agente = Agente()
         
+        if fields is not None:
+            if fields['agente']:
+                match = fields['agente'][1]
+                agente.codice = match.group(1).strip()
+                agente.nome = match.group(2).strip()
+            return agente
+            
         for pattern in self.patterns.AGENTE:
             match = re.search(pattern, text, re.IGNORECASE)
             if match:
@@ -456,19 +1143,46 @@ class DDTFattureParser:
                 
         return agente
     
-    def _extract_articoli(self, text: str, tables_data: List[List[List[str]]]) -> List[Articolo]:
-        """Estrae gli articoli dal documento"""
-        articoli = []
+    def _extract_articoli(self, text: Union[str, TextView], pages: List[RawPage], totale: float,
+                          load_tables: Optional[TableLoader] = None) -> Tuple[List[Articolo], str]:
+        """
+        Estrae gli articoli dal documento, dal livello più economico al più costoso
+        
+        Gli articoli trovati nel testo sono accettati se la somma degli importi
+        corrisponde al totale; altrimenti si passa alle tabelle, estratte solo
+        per le pagine con un'intestazione articoli.
+        
+        Returns:
+            Tuple di (articoli, livello usato: ESTRAZIONE_TESTO o ESTRAZIONE_TABELLE)
+        """
+        # Primo livello: pattern sul testo
+        articoli = self._extract_articoli_from_text(text)
+        if self._articoli_match_totale(articoli, totale):
+            return articoli, ESTRAZIONE_TESTO
         
-        # Prima prova con le tabelle estratte
+        # Secondo livello: tabelle delle sole pagine con intestazione articoli
+        header_pages = [page_num for page_num, page in enumerate(pages)
+                        if ARTICOLI_PAGE_HEADER.search(page.text)]
+        missing = [page_num for page_num in header_pages if pages[page_num].tables is None]
+        if missing and load_tables is not None:
+            logger.debug(f"Articoli dal testo non verificati, estrazione tabelle pagine {missing}")
+            for page_num, tables in load_tables(missing).items():
+                pages[page_num].tables = tables
+        
+        tables_data = [table for page_num in header_pages for table in pages[page_num].tables or []]
         if tables_data:
-            articoli = self._extract_articoli_from_tables(tables_data)
-            
-        # Se non ci sono tabelle o l'estrazione fallisce, prova con pattern
-        if not articoli:
-            articoli = self._extract_articoli_from_text(text)
+            articoli_tabelle = self._extract_articoli_from_tables(tables_data)
+            if articoli_tabelle:
+                return articoli_tabelle, ESTRAZIONE_TABELLE
             
-        return articoli
+        return articoli, ESTRAZIONE_TESTO
+    
+    def _articoli_match_totale(self, articoli: List[Articolo], totale: float) -> bool:
+        """True se la somma degli importi corrisponde al totale del documento"""
+        if not articoli or not totale:
+            return False
+        somma = sum(articolo.importo for articolo in articoli)
+        return abs(somma - totale) <= TOLLERANZA_IMPORTO * len(articoli)
     
     def _extract_articoli_from_tables(self, tables: List[List[List[str]]]) -> List[Articolo]:
         """Estrae articoli dalle tabelle"""
@@ -549,7 +1263,7 @@ class DDTFattureParser:
                     
         return articoli
     
-    def _extract_articoli_from_text(self, text: str) -> List[Articolo]:
+    def _extract_articoli_from_text(self, text: Union[str, TextView]) -> List[Articolo]:
         """Estrae articoli dal testo con pattern"""
         articoli = []
         
@@ -563,15 +1277,12 @@ class DDTFattureParser:
             r'([\d.,]+)\s+'  # Prezzo
             r'([\d.,]+)\s+'  # Sconto
             r'([\d.,]+)\s+'  # Importo
-            r'(\d+)'  # IVA
+            r'(\d+)',  # IVA
+            re.IGNORECASE  # Il testo normalizzato è minuscolo
         )
         
         # Cerca sezione articoli
-        articoli_section = re.search(
-            r'(codice\s+descrizione.+?)(totale|trasporto|note)',
-            text,
-            re.IGNORECASE | re.DOTALL
-        )
+        articoli_section = self._find_articoli_section(as_view(text))
         
         if articoli_section:
             section_text = articoli_section.group(1)
@@ -594,6 +1305,28 @@ class DDTFattureParser:
                     
         return articoli
     
+    def _find_articoli_section(self, view: TextView) -> Optional[re.Match]:
+        """
+        Cerca la sezione articoli (intestazione "codice descrizione" fino a totale/trasporto/note)
+        
+        Su testo normalizzato la regex parte solo dalle occorrenze indicizzate
+        di "codice" e si ferma al terminatore: stesso match della ricerca sul
+        testo intero, senza scandire né fare backtracking su tutto il documento.
+        """
+        if not view.case_stable:
+            return ARTICOLI_SECTION.search(view.text)
+        
+        for start in view.anchors['codice']:
+            header = ARTICOLI_HEADER.match(view.text, start)
+            if not header:
+                continue
+            end = view.section_window(header.end(), ARTICOLI_TERMINATORS)
+            if end is None:
+                # Nessun terminatore dopo questa intestazione, né dopo le successive
+                return None
+            return ARTICOLI_SECTION.match(view.text, start, end)
+        return None
+    
     def _parse_number(self, value: Union[str, float, int]) -> float:
         """Converte un valore in numero float"""
         if isinstance(value, (int, float)):
@@ -641,12 +1374,14 @@ class DDTFattureParser:
         check = (10 - (total % 10)) % 10
         return check == int(piva[10])
     
-    def process_multiple_files(self, file_paths: List[Union[str, Path]]) -> Tuple[List[Documento], List[Dict]]:
+    def process_multiple_files(self, file_paths: List[Union[str, Path]],
+                               workers: int = 1) -> Tuple[List[Documento], List[Dict]]:
         """
         Processa multipli file PDF
         
         Args:
             file_paths: Lista di percorsi file
+            workers: Numero di processi paralleli (1 = elaborazione seriale)
             
         Returns:
             Tuple di (documenti_successo, errori)
@@ -657,99 +1392,228 @@ class DDTFattureParser:
         total_files = len(file_paths)
         logger.info(f"Inizio elaborazione di {total_files} file")
         
-        for i, file_path in enumerate(file_paths, 1):
-            file_path = Path(file_path)
-            logger.info(f"Elaborazione file {i}/{total_files}: {file_path.name}")
-            
-            try:
-                # Crea un nuovo parser per ogni file per evitare contaminazione stato
-                documento = self.parse_single_file(file_path)
-                results.append(documento)
-                logger.info(f"✓ File {i}/{total_files} elaborato con successo")
-                
-            except Exception as e:
-                error_info = {
-                    'file': str(file_path),
-                    'error': str(e),
-                    'traceback': traceback.format_exc()
-                }
-                errors.append(error_info)
-                logger.error(f"✗ Errore file {i}/{total_files}: {e}")
+        # I risultati arrivano nello stesso ordine dei file in input
+        outcomes = self.iter_parse(file_paths, workers=min(workers, total_files))
+        # Con split_documents gli esiti sono per documento: il totale dei file non fa da riferimento
+        unit = "documento" if self.split_documents else "file"
+        for i, (file_path, outcome) in enumerate(outcomes, 1):
+            progress = f"{i}" if self.split_documents else f"{i}/{total_files}"
+            if isinstance(outcome, Documento):
+                results.append(outcome)
+                logger.info(f"✓ {unit.capitalize()} {progress} elaborato con successo")
+            else:
+                errors.append(outcome)
+                logger.error(f"✗ Errore {unit} {progress}: {outcome['error']}")
                 
         logger.info(f"Elaborazione completata: {len(results)} successi, {len(errors)} errori")
         return results, errors
     
-    def save_results(self, documenti: List[Documento], output_path: Union[str, Path], 
-                    format: str = 'json') -> None:
+    def iter_parse(self, file_paths: Iterable[Union[str, Path]], workers: int = 1,
+                   ordered: bool = True,
+                   max_in_flight: Optional[int] = None) -> Iterator[Tuple[Path, Union[Documento, Dict]]]:
+        """
+        Parsifica i file restituendo ogni risultato appena disponibile
+        
+        A differenza di process_multiple_files non accumula documenti ed errori:
+        chi consuma il generatore può esportarli e scartarli uno alla volta.
+        
+        Args:
+            file_paths: Percorsi dei file, anche un generatore (letto in modo lazy)
+            workers: Numero di processi paralleli (1 = elaborazione seriale)
+            ordered: Con più worker, False restituisce i risultati appena pronti
+                invece che nell'ordine di input
+            max_in_flight: File in elaborazione contemporanea (default: 2 per worker)
+            
+        Yields:
+            Tuple di (percorso, Documento) oppure (percorso, info_errore) con le
+            chiavi 'file', 'error' e 'traceback'; con split_documents una tupla
+            per ogni documento del file
+        """
+        if workers <= 1:
+            for file_path in file_paths:
+                yield from _file_outcomes(Path(file_path), *_parse_file_safely(self, file_path))
+            return
+            
+        logger.info(f"Elaborazione parallela con {workers} processi")
+        results = iter_pool_results(_parse_in_worker, (Path(p) for p in file_paths), workers,
+                                    initializer=_init_worker, initargs=(self.worker_options(),),
+                                    ordered=ordered, max_in_flight=max_in_flight)
+        for file_path, (documento, error_info) in results:
+            yield from _file_outcomes(file_path, documento, error_info)
+    
+    def worker_options(self) -> Dict:
+        """Opzioni per ricreare un parser equivalente in un processo worker"""
+        options = {}
+        if self.cache is not None:
+            options['cache_path'] = str(self.cache.db_path)
+            options['cache_max_bytes'] = self.cache.max_bytes
+        # I layout sono oggetti semplici: passano al worker per pickle
+        options['layouts'] = self.layouts
+        options['mode'] = self.mode
+        options['page_workers'] = self.page_workers
+        options['parallel_min_pages'] = self.parallel_min_pages
+        options['chunk_pages'] = self.chunk_pages
+        options['split_documents'] = self.split_documents
+        return options
+    
+    def save_results(self, documenti: Iterable[Documento], output_path: Union[str, Path], 
+                    format: str = 'json', compress: bool = False) -> int:
         """
-        Salva i risultati in file
+        Salva i risultati in file, scrivendo un documento alla volta
+        
+        Accetta anche un generatore (es. da iter_parse): la memoria usata
+        non dipende dal numero di documenti.
         
         Args:
-            documenti: Lista documenti da salvare
+            documenti: Documenti da salvare (lista o iterabile)
             output_path: Percorso file output
-            format: Formato output ('json' o 'csv')
+            format: Formato output ('json', 'jsonl', 'csv' o 'parquet')
+            compress: Comprime l'output con gzip (implicito se il file termina in .gz)
+            
+        Returns:
+            Numero di documenti scritti
         """
         output_path = Path(output_path)
         
-        if format == 'json':
-            # Converti in dizionari
-            data = [asdict(doc) for doc in documenti]
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-                
-        elif format == 'csv':
-            # Crea DataFrame per export CSV
-            records = []
-            
+        with create_writer(output_path, format, compress) as writer:
             for doc in documenti:
-                # Record base documento
-                base_record = {
-                    'tipo': doc.tipo,
-                    'numero': doc.numero,
-                    'data': doc.data,
-                    'fornitore_nome': doc.fornitore.nome,
-                    'fornitore_piva': doc.fornitore.piva,
-                    'cliente_nome': doc.cliente.nome,
-                    'cliente_piva': doc.cliente.piva,
-                    'totale': doc.totale,
-                    'file_origine': doc.file_origine
-                }
+                writer.write(doc)
                 
-                # Se ci sono articoli, crea un record per articolo
-                if doc.articoli:
-                    for art in doc.articoli:
-                        record = base_record.copy()
-                        record.update({
-                            'articolo_codice': art.codice,
-                            'articolo_descrizione': art.descrizione,
-                            'articolo_quantita': art.quantita,
-                            'articolo_prezzo': art.prezzo_unitario,
-                            'articolo_importo': art.importo
-                        })
-                        records.append(record)
-                else:
-                    records.append(base_record)
-                    
-            df = pd.DataFrame(records)
-            df.to_csv(output_path, index=False, encoding='utf-8-sig')
-            
-        logger.info(f"Risultati salvati in: {output_path}")
+        logger.info(f"Risultati salvati in: {output_path} ({writer.count} documenti)")
+        return writer.count
+
+
+# Parser del processo worker, creato una sola volta da _init_worker
+_worker_parser: Optional[DDTFattureParser] = None
+
+
+def _init_worker(options: Optional[Dict] = None) -> None:
+    """
+    Inizializza il parser del processo worker (una volta per processo)
+    
+    Args:
+        options: Opzioni prodotte da DDTFattureParser.worker_options()
+    """
+    global _worker_parser
+    options = options or {}
+    
+    # Ogni processo apre la propria connessione alla cache
+    cache = None
+    if options.get('cache_path'):
+        cache = ParseCache(options['cache_path'], options.get('cache_max_bytes', DEFAULT_MAX_BYTES))
+        # All'uscita del worker si scrivono gli ultimi accessi ancora in sospeso
+        multiprocessing.util.Finalize(cache, cache.close, exitpriority=10)
+        
+    _worker_parser = DDTFattureParser(cache=cache, layouts=options.get('layouts'),
+                                      mode=options.get('mode', MODE_FULL),
+                                      page_workers=options.get('page_workers', 1),
+                                      parallel_min_pages=options.get('parallel_min_pages',
+                                                                     DEFAULT_PARALLEL_MIN_PAGES),
+                                      chunk_pages=options.get('chunk_pages', DEFAULT_CHUNK_PAGES),
+                                      split_documents=options.get('split_documents', False))
+
+
+def _parse_in_worker(file_path: Union[str, Path]) -> Tuple[Union[Documento, List[Documento], None], Optional[Dict]]:
+    """Parsifica un file nel processo worker"""
+    return _parse_file_safely(_worker_parser, file_path)
+
+
+def _extract_pages_in_worker(chunk: Tuple[str, int, int]) -> List[RawPage]:
+    """Estrae le pagine [inizio, fine) di un PDF nel processo worker, aprendo il file"""
+    file_path, start, end = chunk
+    with pdfplumber.open(file_path, pages=list(range(start + 1, end + 1))) as pdf:
+        return _worker_parser._extract_raw_pages(pdf)[0]
+
+
+def _parse_documents_in_worker(
+        chunk: Tuple[str, int, int]) -> List[Tuple[int, List[PageMarker], List[RawPage], Documento]]:
+    """
+    Estrae le pagine [inizio, fine) di un PDF e parsifica i documenti che contengono, nel processo worker
+    
+    Returns:
+        Per ogni documento del blocco: (indice nel PDF della prima pagina,
+        indizi di ogni pagina, pagine con le tabelle caricate, documento)
+    """
+    file_path, start, end = chunk
+    parser = _worker_parser
+    documents = []
+    with pdfplumber.open(file_path, pages=list(range(start + 1, end + 1))) as pdf:
+        pages, layouts = parser._extract_raw_pages(pdf)
+        # Tabelle dal PDF già aperto: gli indici delle pagine sono relativi al blocco
+        load_tables = parser.table_loader(file_path, pdf, layouts)
+        marked = [(page, parser._page_marker(page)) for page in pages]
+        for first_page, items in DocumentSplitter(itemgetter(1)).split(marked):
+            document_pages = [page for page, _ in items]
+            documento = parser.parse_raw_pages(document_pages, file_path,
+                                               parser._offset_table_loader(load_tables, first_page))
+            documents.append((start + first_page, [marker for _, marker in items], document_pages, documento))
+    return documents
+
+
+def _extract_tables_in_worker(chunk: Tuple[str, List[int]]) -> Dict[int, List[List[List[str]]]]:
+    """Estrae le tabelle delle pagine indicate (indici nel PDF) nel processo worker"""
+    file_path, page_numbers = chunk
+    with pdfplumber.open(file_path, pages=[page_num + 1 for page_num in page_numbers]) as pdf:
+        tables = _worker_parser._extract_page_tables(pdf, list(range(len(page_numbers))))
+    return {page_numbers[index]: page_tables for index, page_tables in tables.items()}
+
+
+def _parse_file_safely(parser: DDTFattureParser,
+                       file_path: Union[str, Path]) -> Tuple[Union[Documento, List[Documento], None], Optional[Dict]]:
+    """
+    Parsifica un file senza propagare eccezioni
+    
+    Returns:
+        Tuple di (documento, None) in caso di successo o (None, info_errore);
+        con split_documents il documento è la lista dei documenti del file
+    """
+    file_path = Path(file_path)
+    logger.info(f"Elaborazione file: {file_path.name}")
+    
+    try:
+        if parser.split_documents:
+            documenti = parser.parse_documents(file_path, parser.page_workers)
+            if not documenti:
+                raise ValueError(f"Nessuna pagina nel PDF: {file_path}")
+            return documenti, None
+        return parser.parse_single_file(file_path), None
+    except Exception as e:
+        # Il traceback va formattato qui: non sopravvive al passaggio tra processi
+        return None, {
+            'file': str(file_path),
+            'error': str(e),
+            'traceback': traceback.format_exc(),
+            'tipo': type(e).__name__
+        }
+
+
+def _file_outcomes(file_path: Path, documento: Union[Documento, List[Documento], None],
+                   error_info: Optional[Dict]) -> Iterator[Tuple[Path, Union[Documento, Dict]]]:
+    """Esiti di iter_parse per un file: l'errore, il documento o ciascuno dei documenti"""
+    if error_info is not None:
+        yield file_path, error_info
+    elif isinstance(documento, list):
+        for doc in documento:
+            yield file_path, doc
+    else:
+        yield file_path, documento
 
 
 def main():
     """Esempio di utilizzo"""
     import sys
     
-    if len(sys.argv) < 2:
-        print("Uso: python ddt_fatture_parser.py <file1.pdf> [file2.pdf] ...")
+    # --split: un documento per ogni DDT/fattura contenuto nei PDF (es. stampe giornaliere)
+    split = '--split' in sys.argv[1:]
+    file_paths = [arg for arg in sys.argv[1:] if arg != '--split']
+    if not file_paths:
+        print("Uso: python ddt_fatture_parser.py [--split] <file1.pdf> [file2.pdf] ...")
         sys.exit(1)
         
     # Crea parser
-    parser = DDTFattureParser()
+    parser = DDTFattureParser(split_documents=split)
     
     # Processa file
-    file_paths = sys.argv[1:]
     results, errors = parser.process_multiple_files(file_paths)
     
     # Stampa sommario
@@ -8,8 +8,12 @@ import logging
 import json
 import traceback
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Union
 import pdfplumber
+from text_view import TextView, as_view
+from page_layout import PageLayout
+from supplier_layouts import (DocumentFingerprint, FIRST_PAGE, HEADER_FIELDS, LayoutRegistry, default_registry,
+                              header_complete, normalize_date)
 from datetime import datetime
 from decimal import Decimal
 
@@ -24,8 +28,10 @@ logger = logging.getLogger(__name__)
 class DDTParser:
     """Parser specifico per DDT Alfieri e altri formati"""
     
-    def __init__(self, debug=True):
+    def __init__(self, debug=True, layouts: Optional[LayoutRegistry] = None):
         self.debug = debug
+        # Layout fornitore con intestazione dedicata (es. Alfieri, tutto su una riga)
+        self.layouts = layouts if layouts is not None else default_registry()
         self.patterns = {
             # Pattern multipli per numero documento
             'numero': [
@@ -84,35 +90,50 @@ class DDTParser:
             with pdfplumber.open(pdf_path) as pdf:
                 # Analizza prima pagina
                 page = pdf.pages[0]
+                # Parole calcolate una volta: servono sia al testo sia alle tabelle
+                layout = PageLayout(page)
                 
                 # IMPORTANTE: Estrai il TESTO COMPLETO, non solo il layout
-                full_text = page.extract_text()
+                full_text = layout.extract_text()
                 if not full_text:
                     raise ValueError("Nessun testo estratto dal PDF")
                 
                 self.debug_print(f"Testo estratto: {len(full_text)} caratteri")
                 
+                # Minuscolo, righe e parole chiave calcolati una volta per tutte le strategie
+                view = TextView(full_text)
+                
                 # Debug: mostra prime righe del testo reale
-                lines = full_text.split('\n')
+                lines = view.lines
                 self.debug_print("=== PRIME 20 RIGHE DEL TESTO REALE ===")
                 for i, line in enumerate(lines[:20]):
                     self.debug_print(f"Riga {i+1}: {line}")
                 
                 # Identifica tipo documento
-                doc_type = self._identify_document_type(full_text)
+                doc_type = self._identify_document_type(view)
                 result['data']['tipo'] = doc_type
                 
-                # STRATEGIA 1: Cerca pattern DDT Alfieri (tutto su una riga)
-                alfieri_data = self._extract_alfieri_format(lines)
-                if alfieri_data:
-                    result['data'].update(alfieri_data)
-                    self.debug_print("✅ Formato Alfieri riconosciuto e parsato")
+                # STRATEGIA 1: Layout fornitore riconosciuto dall'impronta della pagina
+                fingerprint = DocumentFingerprint.from_page(full_text, page.width, page.height)
+                supplier_layout = self.layouts.match(fingerprint)
+                header = None
+                if supplier_layout and supplier_layout.regions:
+                    # Aree fisse della prima pagina: colonne affiancate non si mescolano
+                    header = supplier_layout.extract_regions(
+                        supplier_layout.read_regions(pdf, pages=(FIRST_PAGE,))
+                    )
+                if supplier_layout and not header_complete(header):
+                    # Senza regioni, o con aree che non contengono l'intestazione: testo della pagina
+                    header = supplier_layout.extract(lines)
+                if header:
+                    result['data'].update({key: header[key] for key in HEADER_FIELDS if key in header})
+                    self.debug_print(f"✅ Layout {supplier_layout.name} riconosciuto e parsato")
                 else:
                     # STRATEGIA 2: Estrazione standard campo per campo
-                    result['data'].update(self._extract_standard_format(full_text, lines))
+                    result['data'].update(self._extract_standard_format(view))
                 
                 # Estrai articoli dalle tabelle
-                tables = page.extract_tables()
+                tables = layout.extract_tables()
                 if tables:
                     self.debug_print(f"Trovate {len(tables)} tabelle")
                     articoli = self._extract_articles_from_tables(tables)
@@ -137,64 +158,19 @@ class DDTParser:
             
         return result
     
-    def _identify_document_type(self, text: str) -> str:
+    def _identify_document_type(self, text: Union[str, TextView]) -> str:
         """Identifica se è DDT o Fattura"""
-        text_lower = text.lower()
+        text_lower = as_view(text).lower
         if any(marker in text_lower for marker in ['d.d.t.', 'documento di trasporto', 'ddt n']):
             return 'DDT'
         elif any(marker in text_lower for marker in ['fattura', 'invoice', 'ft n']):
             return 'FATTURA'
         return 'SCONOSCIUTO'
     
-    def _extract_alfieri_format(self, lines: List[str]) -> Optional[Dict[str, Any]]:
-        """
-        Estrae dati dal formato Alfieri dove tutto è su una riga
-        Es: "5023 3/06/25 1 20322 DONAC S.R.L."
-        """
-        # Pattern: numero(4) data(gg/mm/aa) pag(1-2) codcliente(5) nome cliente
-        pattern = re.compile(r'^(\d{4})\s+(\d{1,2}/\d{2}/\d{2})\s+(\d+)\s+(\d{5})\s+(.+?)$')
-        
-        for i, line in enumerate(lines):
-            match = pattern.match(line.strip())
-            if match:
-                self.debug_print(f"🎯 PATTERN ALFIERI TROVATO alla riga {i+1}: {line}")
-                
-                data = {
-                    'numero': match.group(1),
-                    'data': self._normalize_date(match.group(2)),
-                    'pagina': match.group(3),
-                    'codice_cliente': match.group(4),
-                    'cliente': match.group(5).strip()
-                }
-                
-                # Cerca indirizzo nelle righe successive
-                if i + 1 < len(lines):
-                    for j in range(i + 1, min(i + 10, len(lines))):
-                        next_line = lines[j].strip()
-                        # Cerca pattern indirizzo
-                        if re.match(r'^(VIA|V\.LE|VIALE|CORSO|P\.ZA|PIAZZA)', next_line, re.IGNORECASE):
-                            data['indirizzo_cliente'] = next_line
-                            # Cerca CAP e città
-                            if j + 1 < len(lines):
-                                cap_line = lines[j + 1].strip()
-                                if re.match(r'^\d{5}', cap_line):
-                                    data['indirizzo_cliente'] += ' ' + cap_line
-                            break
-                
-                # Cerca P.IVA cliente
-                for j in range(i, min(i + 15, len(lines))):
-                    piva_match = re.search(r'P\.?\s*IVA\s*[:.]?\s*(\d{11})', lines[j])
-                    if piva_match and piva_match.group(1) != '03247720042':  # Escludi P.IVA Alfieri
-                        data['piva_cliente'] = piva_match.group(1)
-                        break
-                
-                return data
-        
-        return None
-    
-    def _extract_standard_format(self, full_text: str, lines: List[str]) -> Dict[str, Any]:
+    def _extract_standard_format(self, view: TextView) -> Dict[str, Any]:
         """Estrazione standard campo per campo"""
         data = {}
+        full_text = view.text
         
         # Estrai numero
         for pattern in self.patterns['numero']:
@@ -228,12 +204,13 @@ class DDTParser:
                 self.debug_print(f"Codice cliente trovato: {data['codice_cliente']}")
                 break
         
-        # Estrai P.IVA (escludendo quella di Alfieri)
+        # Estrai P.IVA (escludendo quelle dei fornitori registrati)
+        supplier_pivas = self.layouts.supplier_pivas
         for pattern in self.patterns['piva']:
             matches = re.finditer(pattern, full_text, re.MULTILINE | re.IGNORECASE)
             for match in matches:
                 piva = match.group(1)
-                if piva != '03247720042':  # Escludi P.IVA Alfieri
+                if piva not in supplier_pivas:
                     data['piva_cliente'] = piva
                     self.debug_print(f"P.IVA cliente trovata: {piva}")
                     break
@@ -241,11 +218,10 @@ class DDTParser:
                 break
         
         # Cerca indirizzo cliente
-        cliente_idx = full_text.lower().find('cliente')
+        cliente_idx = view.first('cliente')
         if cliente_idx >= 0:
             # Estrai le prossime righe dopo "Cliente"
-            text_after = full_text[cliente_idx:cliente_idx + 500]
-            lines_after = text_after.split('\n')
+            lines_after = view.lines_between(cliente_idx, cliente_idx + 500)
             
             for i, line in enumerate(lines_after[1:6]):  # Analizza righe 2-6
                 line = line.strip()
@@ -315,26 +291,7 @@ class DDTParser:
     
     def _normalize_date(self, date_str: str) -> str:
         """Normalizza data in formato gg/mm/aaaa"""
-        date_str = date_str.strip()
-        
-        # Gestisci anno a 2 cifre
-        parts = date_str.split('/')
-        if len(parts) == 3:
-            day = parts[0].zfill(2)
-            month = parts[1].zfill(2)
-            year = parts[2]
-            
-            if len(year) == 2:
-                # Assumi 20xx per anni < 50, 19xx altrimenti
-                year_int = int(year)
-                if year_int < 50:
-                    year = '20' + year
-                else:
-                    year = '19' + year
-            
-            return f"{day}/{month}/{year}"
-        
-        return date_str
+        return normalize_date(date_str)
     
     def _parse_number(self, value: str) -> float:
         """Converte stringa in numero gestendo formati italiani"""
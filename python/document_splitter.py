@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Divisione di un PDF con più documenti (es. stampa giornaliera dei DDT dal gestionale)
+I confini si riconoscono pagina per pagina: nuova intestazione con un altro numero o marcatore "pagina 1"
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class PageMarker:
+    """Indizi di inizio documento trovati in una pagina"""
+    # Numero del documento nell'intestazione della pagina ("" = nessuno)
+    numero: str = ""
+    # Numero di pagina del documento (es. il campo "Pag." dell'intestazione Alfieri)
+    pagina: Optional[int] = None
+    # True se la pagina ha un'intestazione di documento (tipo, numero): solo
+    # allora un numero diverso indica un nuovo documento
+    intestazione: bool = False
+
+
+class DocumentSplitter:
+    """
+    Raggruppa le pagine di un PDF nei documenti logici che contiene
+    
+    Le pagine vengono lette in streaming: un documento viene restituito appena
+    la pagina successiva ne apre un altro, senza attendere la fine del PDF.
+    Una pagina apre un nuovo documento se è marcata come pagina 1 oppure se ha
+    un'intestazione con un numero diverso da quello del documento corrente;
+    le pagine senza indizi proseguono il documento corrente.
+    """
+    
+    def __init__(self, page_marker: Callable[[Any], PageMarker]):
+        """
+        Args:
+            page_marker: Funzione pagina -> indizi di inizio documento
+        """
+        self.page_marker = page_marker
+    
+    def starts_document(self, marker: PageMarker, numero: str) -> bool:
+        """True se la pagina con questi indizi apre un documento diverso da quello con numero"""
+        if marker.pagina == 1:
+            return True
+        return marker.intestazione and bool(marker.numero and numero) and marker.numero != numero
+    
+    def split(self, pages: Iterable[Any]) -> Iterator[Tuple[int, List[Any]]]:
+        """
+        Divide la sequenza di pagine in documenti
+        
+        Args:
+            pages: Pagine nell'ordine del PDF, anche un generatore
+        
+        Yields:
+            Tuple di (indice della prima pagina, pagine del documento)
+        """
+        start, current, numero = 0, [], ""
+        
+        for index, page in enumerate(pages):
+            marker = self.page_marker(page)
+            if current and self.starts_document(marker, numero):
+                yield start, current
+                start, current, numero = index, [], ""
+            
+            current.append(page)
+            if not numero and marker.intestazione:
+                numero = marker.numero
+        
+        if current:
+            yield start, current
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Writer in streaming per l'export dei documenti (JSON, JSON Lines, CSV, Parquet)
+Ogni documento viene scritto appena ricevuto: la memoria non cresce con il numero di documenti
+"""
+
+import csv
+import gzip
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, TextIO, Union
+
+# Colonne dell'export CSV: una riga per articolo, con i dati del documento ripetuti
+CSV_COLUMNS_DOCUMENTO = [
+    'tipo', 'numero', 'data', 'fornitore_nome', 'fornitore_piva',
+    'cliente_nome', 'cliente_piva', 'totale', 'file_origine'
+]
+CSV_COLUMNS_ARTICOLO = [
+    'articolo_codice', 'articolo_descrizione', 'articolo_quantita',
+    'articolo_prezzo', 'articolo_importo'
+]
+
+# Colonne dell'export Parquet: (nome, tipo) per la tabella documenti e la tabella articoli.
+# Le colonne fornitore/cliente sono a dizionario: pochi valori distinti ripetuti su molte righe
+PARQUET_DOCUMENTI = [
+    ('documento_id', 'int64'), ('tipo', 'string'), ('numero', 'string'), ('data', 'date32'),
+    ('fornitore_nome', 'string'), ('fornitore_piva', 'string'), ('fornitore_citta', 'string'),
+    ('cliente_nome', 'string'), ('cliente_codice', 'string'), ('cliente_piva', 'string'),
+    ('cliente_citta', 'string'), ('agente_codice', 'string'), ('agente_nome', 'string'),
+    ('vettore', 'string'), ('totale', 'float64'), ('totale_imponibile', 'float64'),
+    ('totale_iva', 'float64'), ('numero_colli', 'int64'), ('peso_lordo', 'float64'),
+    ('numero_articoli', 'int32'), ('file_origine', 'string')
+]
+PARQUET_ARTICOLI = [
+    ('documento_id', 'int64'), ('riga', 'int32'), ('codice', 'string'), ('descrizione', 'string'),
+    ('unita_misura', 'string'), ('quantita', 'float64'), ('prezzo_unitario', 'float64'),
+    ('sconto', 'float64'), ('importo', 'float64'), ('iva', 'float64')
+]
+PARQUET_DICTIONARY_COLUMNS = [
+    'tipo', 'fornitore_nome', 'fornitore_piva', 'fornitore_citta',
+    'cliente_nome', 'cliente_codice', 'cliente_piva', 'cliente_citta'
+]
+
+# Documenti per row group Parquet (e quindi massimo numero di righe in memoria)
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Formati supportati da create_writer
+FORMATS = ('json', 'jsonl', 'csv', 'parquet')
+
+
+def open_output(output_path: Union[str, Path], compress: bool = False,
+                encoding: str = 'utf-8') -> TextIO:
+    """Apre il file di output in scrittura testo, compresso gzip se richiesto o se termina in .gz"""
+    output_path = Path(output_path)
+    if compress or output_path.suffix == '.gz':
+        return gzip.open(output_path, 'wt', encoding=encoding, newline='')
+    return open(output_path, 'w', encoding=encoding, newline='')
+
+
+class DocumentWriter(ABC):
+    """Base dei writer in streaming: context manager con write() per documento"""
+    
+    encoding = 'utf-8'
+    
+    def __init__(self, output_path: Union[str, Path], compress: bool = False):
+        self.output_path = Path(output_path)
+        self.count = 0
+        self._file = open_output(self.output_path, compress, self.encoding)
+    
+    def write(self, documento) -> None:
+        """Scrive un documento"""
+        self._write(documento)
+        self.count += 1
+    
+    @abstractmethod
+    def _write(self, documento) -> None:
+        """Scrive un documento nel formato del writer"""
+    
+    def close(self) -> None:
+        """Completa e chiude il file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JsonArrayWriter(DocumentWriter):
+    """Array JSON indentato, identico a json.dump(..., indent=2) ma scritto un documento alla volta"""
+    
+    def __init__(self, output_path: Union[str, Path], compress: bool = False):
+        super().__init__(output_path, compress)
+        self._file.write("[")
+    
+    def _write(self, documento) -> None:
+        text = json.dumps(asdict(documento), ensure_ascii=False, indent=2)
+        separator = "," if self.count else ""
+        self._file.write(separator + "\n  " + text.replace("\n", "\n  "))
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.write("\n]" if self.count else "]")
+        super().close()
+
+
+class JsonLinesWriter(DocumentWriter):
+    """JSON Lines: un documento completo per riga"""
+    
+    def _write(self, documento) -> None:
+        self._file.write(json.dumps(asdict(documento), ensure_ascii=False) + "\n")
+
+
+class CsvWriter(DocumentWriter):
+    """CSV con una riga per articolo (o una riga per documento senza articoli)"""
+    
+    # BOM per l'apertura corretta in Excel, come l'export pandas precedente
+    encoding = 'utf-8-sig'
+    
+    def __init__(self, output_path: Union[str, Path], compress: bool = False):
+        super().__init__(output_path, compress)
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_COLUMNS_DOCUMENTO + CSV_COLUMNS_ARTICOLO)
+        self._writer.writeheader()
+    
+    def _write(self, documento) -> None:
+        for record in iter_csv_records(documento):
+            self._writer.writerow(record)
+
+
+class ParquetWriter:
+    """
+    Export Parquet su due tabelle tipizzate: <nome>_documenti.parquet e <nome>_articoli.parquet
+    
+    Gli articoli sono collegati al documento tramite documento_id (progressivo
+    nell'export). Le righe vengono accumulate per colonna e scritte a blocchi
+    di row_group_size documenti, quindi la memoria resta limitata.
+    """
+    
+    def __init__(self, output_path: Union[str, Path], compress: bool = False,
+                 row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        """
+        Args:
+            output_path: Percorso base; il suffisso .parquet viene sostituito dal nome tabella
+            compress: Compressione gzip invece di snappy (file più piccoli, scrittura più lenta)
+            row_group_size: Documenti per row group
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("L'export Parquet richiede pyarrow: pip install pyarrow")
+        
+        self._pa = pa
+        self.output_path = Path(output_path)
+        self.count = 0
+        self.row_group_size = row_group_size
+        
+        stem = self.output_path.name
+        for suffix in ('.gz', '.parquet'):
+            stem = stem[:-len(suffix)] if stem.endswith(suffix) else stem
+        self.documenti_path = self.output_path.with_name(f"{stem}_documenti.parquet")
+        self.articoli_path = self.output_path.with_name(f"{stem}_articoli.parquet")
+        
+        compression = 'gzip' if compress else 'snappy'
+        self._schemas = {}
+        self._writers = {}
+        self._columns = {}
+        for name, columns, path in (('documenti', PARQUET_DOCUMENTI, self.documenti_path),
+                                    ('articoli', PARQUET_ARTICOLI, self.articoli_path)):
+            schema = pa.schema([(column, getattr(pa, type_name)()) for column, type_name in columns])
+            dictionary = [column for column, _ in columns if column in PARQUET_DICTIONARY_COLUMNS]
+            self._schemas[name] = schema
+            self._writers[name] = pq.ParquetWriter(str(path), schema, compression=compression,
+                                                   use_dictionary=dictionary or False)
+            self._columns[name] = {column: [] for column, _ in columns}
+    
+    def write(self, documento) -> None:
+        """Accoda un documento e i suoi articoli, scrivendo un row group quando il blocco è pieno"""
+        documento_id = self.count
+        self._append('documenti', {
+            'documento_id': documento_id,
+            'tipo': documento.tipo,
+            'numero': documento.numero,
+            'data': _parse_date(documento.data),
+            'fornitore_nome': documento.fornitore.nome,
+            'fornitore_piva': documento.fornitore.piva,
+            'fornitore_citta': documento.fornitore.citta,
+            'cliente_nome': documento.cliente.nome,
+            'cliente_codice': documento.cliente.codice,
+            'cliente_piva': documento.cliente.piva,
+            'cliente_citta': documento.cliente.citta,
+            'agente_codice': documento.agente.codice,
+            'agente_nome': documento.agente.nome,
+            'vettore': documento.vettore,
+            'totale': documento.totale,
+            'totale_imponibile': documento.totale_imponibile,
+            'totale_iva': documento.totale_iva,
+            'numero_colli': documento.numero_colli,
+            'peso_lordo': documento.peso_lordo,
+            'numero_articoli': len(documento.articoli),
+            'file_origine': documento.file_origine
+        })
+        for riga, art in enumerate(documento.articoli, 1):
+            self._append('articoli', {
+                'documento_id': documento_id,
+                'riga': riga,
+                'codice': art.codice,
+                'descrizione': art.descrizione,
+                'unita_misura': art.unita_misura,
+                'quantita': art.quantita,
+                'prezzo_unitario': art.prezzo_unitario,
+                'sconto': art.sconto,
+                'importo': art.importo,
+                'iva': art.iva
+            })
+        self.count += 1
+        
+        if self.count % self.row_group_size == 0:
+            self._flush()
+    
+    def _append(self, name: str, record: Dict[str, Any]) -> None:
+        columns = self._columns[name]
+        for column, values in columns.items():
+            values.append(record[column])
+    
+    def _flush(self) -> None:
+        """Scrive le righe accumulate come nuovo row group"""
+        for name, columns in self._columns.items():
+            if not columns['documento_id']:
+                continue
+            table = self._pa.Table.from_pydict(columns, schema=self._schemas[name])
+            self._writers[name].write_table(table)
+            for values in columns.values():
+                values.clear()
+    
+    def close(self) -> None:
+        """Scrive l'ultimo row group e chiude i file"""
+        if not self._writers:
+            return
+        self._flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _parse_date(data: str):
+    """Data GG/MM/AAAA del documento come date (None se assente o non valida)"""
+    try:
+        return datetime.strptime(data, '%d/%m/%Y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_csv_records(documento) -> Iterator[Dict[str, Any]]:
+    """Righe CSV di un documento, un articolo alla volta"""
+    base_record = {
+        'tipo': documento.tipo,
+        'numero': documento.numero,
+        'data': documento.data,
+        'fornitore_nome': documento.fornitore.nome,
+        'fornitore_piva': documento.fornitore.piva,
+        'cliente_nome': documento.cliente.nome,
+        'cliente_piva': documento.cliente.piva,
+        'totale': documento.totale,
+        'file_origine': documento.file_origine
+    }
+    
+    if not documento.articoli:
+        yield base_record
+        return
+    
+    for art in documento.articoli:
+        record = base_record.copy()
+        record.update({
+            'articolo_codice': art.codice,
+            'articolo_descrizione': art.descrizione,
+            'articolo_quantita': art.quantita,
+            'articolo_prezzo': art.prezzo_unitario,
+            'articolo_importo': art.importo
+        })
+        yield record
+
+
+def create_writer(output_path: Union[str, Path], format: str = 'json',
+                  compress: bool = False):
+    """
+    Crea il writer in streaming per un formato
+    
+    Args:
+        output_path: Percorso file output
+        format: 'json', 'jsonl', 'csv' o 'parquet'
+        compress: Comprime l'output con gzip (implicito se il file termina in .gz;
+            per Parquet sceglie la compressione gzip interna ai file)
+    """
+    writers = {
+        'json': JsonArrayWriter,
+        'jsonl': JsonLinesWriter,
+        'csv': CsvWriter,
+        'parquet': ParquetWriter
+    }
+    if format not in writers:
+        raise ValueError(f"Formato di export non supportato: {format} (disponibili: {', '.join(FORMATS)})")
+    return writers[format](output_path, compress)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Scanner dei campi documento: cascate di pattern compilate una sola volta
+Sostituisce le chiamate re.search per pattern (stringa + IGNORECASE) ripetute per ogni campo
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Moduli interni di re, usati solo per decidere se togliere IGNORECASE: possono
+# cambiare tra versioni minori di CPython, quindi senza di essi i flag restano invariati
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    try:  # Python < 3.11
+        import sre_parse
+        import sre_constants
+    except ImportError:
+        sre_parse = sre_constants = None
+
+# Flag di default dei pattern di campo (come in DDTFattureParser._extract_field)
+DEFAULT_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Risultato per campo: (priorità del pattern che ha trovato il valore, match)
+FieldMatch = Optional[Tuple[int, re.Match]]
+
+# Caratteri minuscoli che IGNORECASE considera equivalenti a lettere ASCII (ı ~ i, ſ ~ s)
+_CASE_FOLD_EXCEPTIONS = re.compile('[ıſ]')
+
+
+def is_case_stable(text: str) -> bool:
+    """
+    True se il testo è già minuscolo e privo di caratteri con equivalenze speciali
+    
+    Su un testo così IGNORECASE non cambia i match dei pattern minuscoli:
+    è il caso del testo normalizzato del parser.
+    """
+    return text == text.lower() and not _CASE_FOLD_EXCEPTIONS.search(text)
+
+
+def _is_caseless_char(code: int) -> bool:
+    """Carattere che con IGNORECASE su testo minuscolo corrisponde solo a se stesso"""
+    if code < 128:
+        return not 'A' <= chr(code) <= 'Z'
+    char = chr(code)
+    return char.lower() == char == char.upper()
+
+
+def _is_case_insensitive_safe(parsed) -> bool:
+    """Verifica (ricorsiva) che un pattern parsificato non dipenda da IGNORECASE su testo minuscolo"""
+    for op, av in parsed:
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL):
+            if not _is_caseless_char(av):
+                return False
+        elif op is sre_constants.RANGE:
+            low, high = av
+            if high >= 128 or (low <= ord('Z') and high >= ord('A')):
+                return False
+        elif op is sre_constants.IN:
+            if not _is_case_insensitive_safe(av):
+                return False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if not _is_case_insensitive_safe(av[2]):
+                return False
+        elif op is sre_constants.SUBPATTERN:
+            if not _is_case_insensitive_safe(av[-1]):
+                return False
+        elif op is sre_constants.BRANCH:
+            if not all(_is_case_insensitive_safe(branch) for branch in av[1]):
+                return False
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if not _is_case_insensitive_safe(av[1]):
+                return False
+        elif op not in (sre_constants.ANY, sre_constants.AT, sre_constants.CATEGORY,
+                        sre_constants.NEGATE):
+            # Riferimenti a gruppi, gruppi condizionali, costrutti nuovi: nessuna ottimizzazione
+            return False
+    return True
+
+
+def compile_case_stable(pattern: str, flags: int) -> re.Pattern:
+    """
+    Compila la variante del pattern da usare su testo minuscolo
+    
+    Senza IGNORECASE il motore re usa la ricerca veloce sul prefisso letterale;
+    il flag viene tolto solo se i match restano identici. Se l'analisi del
+    pattern non è possibile (moduli interni di re assenti o cambiati) si
+    compila con i flag originali.
+    """
+    if flags & re.IGNORECASE and sre_parse is not None:
+        try:
+            if _is_case_insensitive_safe(sre_parse.parse(pattern, flags & ~re.IGNORECASE)):
+                flags &= ~re.IGNORECASE
+        except Exception:
+            # Struttura interna diversa da quella attesa: nessuna ottimizzazione
+            pass
+    return re.compile(pattern, flags)
+
+
+class FieldScanner:
+    """
+    Estrae più campi, ognuno con una lista di pattern in ordine di priorità
+    
+    Per ogni campo il risultato è identico alla cascata "primo pattern che
+    trova qualcosa, prima occorrenza nel testo". I pattern sono compilati una
+    volta per parser; sul testo normalizzato (già minuscolo) si usano le
+    varianti senza IGNORECASE, più rapide e con gli stessi match.
+    
+    Una regex combinata a gruppi nominati (una sola passata sul testo) è
+    stata misurata più lenta con il motore re di CPython: l'alternanza perde
+    la ricerca veloce sul prefisso letterale di ogni pattern.
+    """
+    
+    def __init__(self, fields: Dict[str, Tuple[List[str], int]]):
+        """
+        Args:
+            fields: Nome campo -> (pattern in ordine di priorità, flag re)
+        """
+        self._fields = {
+            name: [(re.compile(pattern, flags), compile_case_stable(pattern, flags))
+                   for pattern in patterns]
+            for name, (patterns, flags) in fields.items()
+        }
+    
+    @property
+    def field_names(self) -> List[str]:
+        """Nomi dei campi gestiti"""
+        return list(self._fields)
+    
+    def scan(self, text: str) -> Dict[str, FieldMatch]:
+        """
+        Cerca tutti i campi nel testo
+        
+        Returns:
+            Dizionario campo -> (priorità, match) o None se il campo non è presente
+        """
+        variant = 1 if is_case_stable(text) else 0
+        found = {}
+        
+        for name, compiled in self._fields.items():
+            found[name] = None
+            for rank, patterns in enumerate(compiled):
+                match = patterns[variant].search(text)
+                if match:
+                    found[name] = (rank, match)
+                    break
+        
+        return found
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Localizzazione delle parole chiave (ancore) di un documento in una sola passata
+Automa Aho-Corasick con pyahocorasick se installato, altrimenti regex a lookahead
+"""
+
+from functools import lru_cache
+import re
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import ahocorasick
+except ImportError:  # dipendenza opzionale
+    ahocorasick = None
+
+
+class KeywordLocator:
+    """
+    Trova tutte le occorrenze, anche sovrapposte, di un insieme di parole chiave
+    
+    Con pyahocorasick l'automa Aho-Corasick percorre il testo una volta in
+    tempo lineare. Senza, una regex a lookahead esamina ogni posizione in C:
+    stesso risultato, più lenta su testi lunghi (una passata in Python
+    carattere per carattere lo sarebbe ancora di più).
+    """
+    
+    def __init__(self, keywords: Iterable[str]):
+        """
+        Args:
+            keywords: Parole chiave da cercare (il confronto è esatto: passare testo minuscolo)
+        """
+        self.keywords = tuple(sorted(set(keywords), key=len, reverse=True))
+        
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            if self.keywords:
+                self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            alternatives = "|".join(re.escape(keyword) for keyword in self.keywords)
+            self._pattern = re.compile(f"(?=({alternatives}))") if self.keywords else None
+            # Parole chiave che sono prefisso di ciascuna (l'alternanza restituisce la più lunga)
+            self._prefixes = {
+                keyword: [other for other in self.keywords if keyword.startswith(other)]
+                for keyword in self.keywords
+            }
+    
+    def locate(self, text: str) -> Dict[str, List[int]]:
+        """
+        Posizioni iniziali di ogni parola chiave nel testo
+        
+        Returns:
+            Dizionario parola chiave -> posizioni in ordine crescente
+        """
+        positions = {keyword: [] for keyword in self.keywords}
+        if not self.keywords:
+            return positions
+        
+        if self._automaton is not None:
+            # L'automa restituisce la posizione dell'ultimo carattere di ogni occorrenza
+            for end, keyword in self._automaton.iter(text):
+                positions[keyword].append(end - len(keyword) + 1)
+            return positions
+        
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            for keyword in self._prefixes[match.group(1)]:
+                positions[keyword].append(start)
+        return positions
+
+
+@lru_cache(maxsize=32)
+def get_locator(keywords: Tuple[str, ...]) -> KeywordLocator:
+    """Locator condiviso per un insieme di parole chiave (l'automa si costruisce una volta)"""
+    return KeywordLocator(keywords)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Manifest append-only delle elaborazioni batch
+Un record JSON per file elaborato (o per documento, con --split): percorso, dimensione, mtime
+ed esito; un file per sessione
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Esiti registrati nel manifest
+ESITO_SUCCESSO = 'success'
+ESITO_ERRORE = 'error'
+
+
+def file_signature(file_path: Union[str, Path]) -> Tuple[Optional[int], Optional[float]]:
+    """Dimensione e mtime di un file (None se il file non esiste più)"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None, None
+    return stat.st_size, stat.st_mtime
+
+
+@dataclass
+class _Latest:
+    """Ultimo record di un file nella sessione: posizione nel file e campi usati da --resume"""
+    offset: int
+    size: Optional[int]
+    mtime: Optional[float]
+    esito: str
+    # Documenti del file diviso con --split (None = un record per file)
+    documenti: Optional[int] = None
+
+
+class BatchManifest:
+    """
+    Registro append-only dei file elaborati, un file per sessione
+    
+    Ogni run appartiene a una sessione: un run normale ne apre una nuova,
+    un run con --resume prosegue l'ultima. I report vengono ricostruiti
+    dall'ultimo record di ogni file nella sessione, non dalla memoria.
+    
+    Il file di una sessione viene letto al massimo una volta per run: l'indice
+    percorso -> ultimi record (posizione nel file) si aggiorna a ogni append e
+    iter_latest rilegge solo i record indicizzati. Le sessioni precedenti
+    restano nei loro file e non vengono più lette.
+    
+    Un file diviso in documenti (--split) ha un record per documento, con i
+    campi 'documento' (indice) e 'documenti' (totale): il record del primo
+    documento sostituisce tutti quelli di un'elaborazione precedente del file.
+    """
+    
+    def __init__(self, directory: Union[str, Path], legacy_path: Union[str, Path, None] = None):
+        """
+        Args:
+            directory: Cartella dei manifest di sessione (<sessione>.jsonl)
+            legacy_path: Manifest unico delle versioni precedenti, diviso per
+                sessione al primo utilizzo (None = nessuna migrazione)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.session = None
+        self._file = None
+        # Sessione -> percorso -> ultimi record (uno per documento), costruito alla prima lettura
+        self._indexes: Dict[str, Dict[str, List[_Latest]]] = {}
+        if legacy_path is not None and Path(legacy_path).exists():
+            self._split_legacy(Path(legacy_path))
+    
+    @property
+    def path(self) -> Optional[Path]:
+        """File della sessione corrente (None prima di open)"""
+        return self.session_path(self.session) if self.session else None
+    
+    def session_path(self, session: str) -> Path:
+        """File del manifest di una sessione"""
+        return self.directory / f"{session}.jsonl"
+    
+    def open(self, session: str) -> None:
+        """Apre in append il manifest della sessione, indicizzandone i record già presenti"""
+        self.session = session
+        # Gli indici di altre sessioni (es. run precedenti del demone) non servono più
+        self._indexes = {session: self._load_index(session)}
+        self._file = open(self.session_path(session), 'ab')
+        # Ultima riga troncata da un crash: i nuovi record partono da una riga nuova
+        if self._file.tell() and not self._ends_with_newline(session):
+            self._file.write(b"\n")
+    
+    def close(self) -> None:
+        """Chiude il manifest"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def append(self, record: Dict[str, Any]) -> None:
+        """Aggiunge un record alla sessione aperta e lo rende subito persistente"""
+        offset = self._file.tell()
+        self._file.write((json.dumps(record, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+        # Flush a ogni record: dopo un crash il manifest riflette il lavoro svolto
+        self._file.flush()
+        self._index_record(self._indexes[self.session], offset, record)
+    
+    def new_session(self, name: str) -> str:
+        """Identificativo di una nuova sessione: name, con un suffisso se il suo file esiste già"""
+        session, n = name, 1
+        while self.session_path(session).exists():
+            n += 1
+            session = f"{name}_{n:02d}"
+        return session
+    
+    def sessions(self) -> List[str]:
+        """Sessioni registrate, dalla più vecchia (gli identificativi sono data e ora)"""
+        return sorted(path.stem for path in self.directory.glob("*.jsonl"))
+    
+    def iter_records(self, session: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Legge i record uno alla volta, ignorando un'eventuale ultima riga troncata
+        
+        Args:
+            session: Sessione da leggere (None = tutte, dalla più vecchia)
+        """
+        for name in ([session] if session else self.sessions()):
+            for _, record in self._iter_lines(name):
+                yield record
+    
+    def last_session(self) -> Optional[str]:
+        """Sessione più recente, senza leggerne i record"""
+        sessions = self.sessions()
+        return sessions[-1] if sessions else None
+    
+    def completed(self, session: str) -> Dict[str, Tuple[Optional[int], Optional[float], str]]:
+        """
+        File già elaborati nella sessione
+        
+        I file divisi in documenti registrati solo in parte (run interrotto)
+        non sono considerati completati.
+        
+        Returns:
+            Dizionario percorso -> (dimensione, mtime, esito) dell'ultimo record
+        """
+        return {path: (records[-1].size, records[-1].mtime, records[-1].esito)
+                for path, records in self._load_index(session).items()
+                if len(records) >= (records[0].documenti or 1)}
+    
+    def iter_latest(self, session: str, esito: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        Itera sull'ultimo record di ogni file della sessione, nell'ordine di scrittura
+        
+        Args:
+            esito: Se indicato, restituisce solo i record con questo esito
+        """
+        offsets = sorted(latest.offset for records in self._load_index(session).values()
+                         for latest in records if esito is None or latest.esito == esito)
+        if not offsets:
+            return
+        if self._file is not None:
+            self._file.flush()
+        with open(self.session_path(session), 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+    
+    def _load_index(self, session: str) -> Dict[str, List[_Latest]]:
+        """Indice degli ultimi record per percorso: letto dal file una sola volta per sessione"""
+        if session not in self._indexes:
+            index = self._indexes[session] = {}
+            for offset, record in self._iter_lines(session):
+                self._index_record(index, offset, record)
+        return self._indexes[session]
+    
+    @staticmethod
+    def _index_record(index: Dict[str, List[_Latest]], offset: int, record: Dict[str, Any]) -> None:
+        """Aggiunge un record all'indice: un documento successivo al primo si somma ai precedenti del file"""
+        latest = _Latest(offset, record.get('size'), record.get('mtime'), record['esito'], record.get('documenti'))
+        if record.get('documento'):
+            index.setdefault(record['path'], []).append(latest)
+        else:
+            index[record['path']] = [latest]
+    
+    def _iter_lines(self, session: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Record di una sessione con la loro posizione in byte nel file"""
+        path = self.session_path(session)
+        if not path.exists():
+            return
+        with open(path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    yield offset, json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning(f"Riga manifest non valida ignorata: {line[:80]!r}")
+                offset += len(line)
+    
+    def _ends_with_newline(self, session: str) -> bool:
+        """True se il file della sessione termina con un a capo"""
+        with open(self.session_path(session), 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+    
+    def _split_legacy(self, legacy_path: Path) -> None:
+        """Divide il manifest unico delle versioni precedenti in un file per sessione"""
+        files = {}
+        try:
+            with open(legacy_path, 'rb') as f:
+                for line in f:
+                    try:
+                        session = json.loads(line).get('session') or 'legacy'
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        continue
+                    if session not in files:
+                        files[session] = open(self.session_path(session), 'ab')
+                    files[session].write(line if line.endswith(b"\n") else line + b"\n")
+        finally:
+            for f in files.values():
+                f.close()
+        legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+        logger.info(f"Manifest {legacy_path.name} diviso in {len(files)} sessioni in {self.directory}")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Memoria usata dal parsing di un file: picco tracemalloc e crescita dell'RSS del processo
+RSS con psutil se installato, altrimenti da /proc/self/statm (Linux)
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import tracemalloc
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # dipendenza opzionale
+    psutil = None
+
+# Secondi tra due campionamenti dell'RSS durante il parsing
+RSS_SAMPLE_INTERVAL = 0.01
+# File più pesanti elencati nei report
+DEFAULT_MEMORY_TOP = 10
+MEGABYTE = 1024 * 1024
+
+
+def current_rss() -> Optional[int]:
+    """RSS corrente del processo in byte, None se non misurabile su questa piattaforma"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryMeter:
+    """
+    Misura la memoria di un blocco di codice
+    
+    tracemalloc riporta il picco delle allocazioni Python (incluse quelle di
+    pdfplumber/pdfminer); l'RSS, campionato da un thread ogni
+    RSS_SAMPLE_INTERVAL secondi, include anche la memoria nativa. Il delta
+    RSS è il picco campionato meno l'RSS all'ingresso: la memoria che il
+    file ha richiesto oltre a quella già occupata dal processo.
+    """
+    
+    def __init__(self, trace: bool = True, interval: float = RSS_SAMPLE_INTERVAL):
+        """
+        Args:
+            trace: Misura anche il picco tracemalloc (rallenta le allocazioni)
+            interval: Secondi tra due campionamenti dell'RSS
+        """
+        self.trace = trace
+        self.interval = interval
+        self.tracemalloc_peak = None
+        self.rss_start = None
+        self.rss_peak = None
+        self._started_tracing = False
+        self._stop = threading.Event()
+        self._sampler = None
+    
+    def __enter__(self) -> 'MemoryMeter':
+        if self.trace:
+            # Se il tracing è già attivo (es. un test) si azzera solo il picco
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        
+        self.rss_start = self.rss_peak = current_rss()
+        if self.rss_start is not None:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        self._update_rss()
+        
+        if self.trace:
+            self.tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+            if self._started_tracing:
+                tracemalloc.stop()
+    
+    def _sample(self):
+        """Thread di campionamento dell'RSS fino all'uscita dal blocco"""
+        while not self._stop.wait(self.interval):
+            self._update_rss()
+    
+    def _update_rss(self):
+        rss = current_rss()
+        if rss is not None and (self.rss_peak is None or rss > self.rss_peak):
+            self.rss_peak = rss
+    
+    def as_dict(self) -> Dict[str, Optional[int]]:
+        """Misure in byte (None se non disponibili), serializzabili in JSON"""
+        rss_delta = None
+        if self.rss_start is not None and self.rss_peak is not None:
+            rss_delta = self.rss_peak - self.rss_start
+        return {
+            'tracemalloc_picco': self.tracemalloc_peak,
+            'rss_iniziale': self.rss_start,
+            'rss_picco': self.rss_peak,
+            'rss_delta': rss_delta
+        }
+
+
+def _weight(misura: Dict[str, Any]) -> Tuple[int, int]:
+    """Chiave di ordinamento: picco tracemalloc, poi delta RSS (le misure mancanti valgono 0)"""
+    return (misura.get('tracemalloc_picco') or 0, misura.get('rss_delta') or 0)
+
+
+class HeaviestFiles:
+    """
+    Le n misure con il picco più alto, aggiornate una alla volta
+    
+    Tiene un heap di al massimo n elementi: la memoria non cresce con il
+    numero di misure aggiunte (es. i file di una lunga sessione --memory).
+    A parità di peso resta la misura aggiunta prima.
+    """
+    
+    def __init__(self, n: int = DEFAULT_MEMORY_TOP):
+        self.n = n
+        self._heap: List[Tuple[Tuple[int, int], int, Dict[str, Any]]] = []
+        self._order = itertools.count()
+    
+    def add(self, misura: Dict[str, Any]) -> None:
+        """Considera una misura (prodotta da MemoryMeter.as_dict, eventualmente con altri campi)"""
+        if self.n <= 0:
+            return
+        # Ordine negativo: tra due misure di pari peso la più recente è la prima a uscire
+        entry = (_weight(misura), -next(self._order), misura)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+    
+    def items(self) -> List[Dict[str, Any]]:
+        """Misure dalla più pesante"""
+        return [misura for _, _, misura in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+def heaviest(misure: Iterable[Dict[str, Any]], n: int = DEFAULT_MEMORY_TOP) -> List[Dict[str, Any]]:
+    """
+    Le n misure (prodotte da MemoryMeter.as_dict) con il picco più alto
+    
+    Ordina per picco tracemalloc, poi per delta RSS: senza tracemalloc
+    (es. misure parziali) decide il solo delta RSS.
+    """
+    top = HeaviestFiles(n)
+    for misura in misure:
+        top.add(misura)
+    return top.items()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Metriche del batch in formato testo Prometheus, aggiornate a ogni file elaborato
+Servite su una porta HTTP locale (/metrics) o scritte in un file per il textfile collector di node_exporter
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Content-Type del formato di esposizione testuale
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limiti superiori dei bucket degli istogrammi del batch
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PAGES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+ARTICLES_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _format_value(value: float) -> str:
+    """Valore numerico nel formato Prometheus"""
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    """Etichette {nome="valore",...} con i caratteri speciali escapati"""
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """Contatore monotono, con etichette opzionali"""
+    
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {} if self.labels else {(): 0.0}
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Incrementa il contatore per la combinazione di etichette indicata"""
+        key = tuple(str(labels[name]) for name in self.labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        """Righe HELP/TYPE e campioni"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labels, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Istogramma a bucket cumulativi, con somma e numero di osservazioni"""
+    
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        """Registra un'osservazione nel primo bucket che la contiene"""
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+    
+    def render(self) -> List[str]:
+        """Righe HELP/TYPE, bucket cumulativi, _sum e _count"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels([('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Insieme di metriche esposte insieme
+    
+    Chi aggiorna le metriche da un thread diverso da quello che le espone
+    deve farlo sotto self.lock (render lo acquisisce).
+    """
+    
+    def __init__(self):
+        self.metrics: List[Union[Counter, Histogram]] = []
+        self.lock = threading.Lock()
+    
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        """Crea e registra un contatore"""
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, help: str, buckets: Sequence[float]) -> Histogram:
+        """Crea e registra un istogramma"""
+        metric = Histogram(name, help, buckets)
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """Tutte le metriche nel formato testo Prometheus"""
+        with self.lock:
+            return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+    
+    def write_textfile(self, path: Union[str, Path]) -> None:
+        """Scrive le metriche in un file .prom, in modo atomico (il collector non legge file parziali)"""
+        path = Path(path)
+        tmp_file = path.with_name(path.name + ".tmp")
+        tmp_file.write_text(self.render(), encoding='utf-8')
+        os.replace(tmp_file, path)
+
+
+class MetricsServer:
+    """Endpoint HTTP /metrics servito da un thread in background"""
+    
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "127.0.0.1"):
+        """
+        Args:
+            registry: Metriche da esporre
+            port: Porta TCP (0 = scelta dal sistema, vedi self.port dopo start)
+            host: Indirizzo di ascolto (default: solo locale)
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+    
+    def start(self) -> None:
+        """Avvia il server (se non è già attivo)"""
+        if self._server is not None:
+            return
+        registry = self.registry
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                # Gli scrape periodici non vanno nel log del batch
+                pass
+        
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Ferma il server e libera la porta"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+
+class BatchMetrics:
+    """Metriche di BatchProcessor: contatori di file ed esiti, istogrammi di latenza e dimensioni"""
+    
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.files = self.registry.counter("ddt_batch_files_total", "File PDF elaborati")
+        self.successes = self.registry.counter("ddt_batch_success_total", "File elaborati con successo")
+        self.errors = self.registry.counter("ddt_batch_errors_total", "File terminati in errore")
+        self.limits = self.registry.counter("ddt_batch_limit_errors_total",
+                                            "File interrotti per limite superato (timeout, memoria)",
+                                            labels=("limite",))
+        self.documents = self.registry.counter("ddt_batch_documents_total",
+                                               "Documenti estratti per tipo", labels=("tipo",))
+        self.duration = self.registry.histogram("ddt_batch_file_duration_seconds",
+                                                "Tempo di elaborazione per file", DURATION_BUCKETS)
+        self.pages = self.registry.histogram("ddt_batch_file_pages",
+                                             "Pagine lette per file (esclusi i documenti dalla cache)",
+                                             PAGES_BUCKETS)
+        self.articles = self.registry.histogram("ddt_batch_document_articles",
+                                                "Articoli per documento", ARTICLES_BUCKETS)
+    
+    def record(self, documento, error_info: Optional[Dict], elapsed: float) -> None:
+        """Aggiorna le metriche con l'esito di un file"""
+        with self.registry.lock:
+            self.files.inc()
+            self.duration.observe(elapsed)
+            if error_info is not None:
+                self.errors.inc()
+                if error_info.get('limite'):
+                    self.limits.inc(limite=error_info['limite'])
+                return
+            
+            self.successes.inc()
+            self.documents.inc(tipo=documento.tipo or "SCONOSCIUTO")
+            self.articles.observe(len(documento.articoli))
+            pagine = documento.metriche.get('conteggi', {}).get('pagine')
+            if pagine is not None:
+                self.pages.observe(pagine)
+    
+    def render(self) -> str:
+        """Metriche correnti nel formato testo Prometheus"""
+        return self.registry.render()
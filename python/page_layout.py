@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Analisi unica di una pagina PDF: parole calcolate una volta dai caratteri
+Da queste derivano sia il testo (come page.extract_text) sia le celle delle tabelle (come page.extract_tables)
+"""
+
+from bisect import bisect_right
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+from pdfplumber.utils import cluster_objects, extract_text, DEFAULT_Y_TOLERANCE
+from pdfplumber.utils.text import WordExtractor, WordMap
+
+# Cella di tabella: (x0, top, x1, bottom)
+Bbox = Tuple[float, float, float, float]
+
+
+def _center(char: Dict) -> Tuple[float, float]:
+    """Punto medio di un carattere (lo stesso criterio di pdfplumber per assegnarlo a una cella)"""
+    return (char['x0'] + char['x1']) / 2, (char['top'] + char['bottom']) / 2
+
+
+class _CellGrid:
+    """
+    Indice delle celle di una tabella sulla griglia dei loro bordi
+    
+    Un punto viene assegnato alla cella che lo contiene con due bisect invece
+    di confrontarlo con ogni riga e ogni cella.
+    """
+    
+    def __init__(self, cells: List[Bbox]):
+        self.xs = sorted({x for cell in cells for x in (cell[0], cell[2])})
+        self.ys = sorted({y for cell in cells for y in (cell[1], cell[3])})
+        self.slots: Dict[Tuple[int, int], Bbox] = {}
+        # False se due celle si sovrappongono: un carattere potrebbe finire in entrambe
+        self.disjoint = True
+        
+        for cell in cells:
+            x_start, x_end = self.xs.index(cell[0]), self.xs.index(cell[2])
+            y_start, y_end = self.ys.index(cell[1]), self.ys.index(cell[3])
+            for i in range(x_start, x_end):
+                for j in range(y_start, y_end):
+                    if (i, j) in self.slots:
+                        self.disjoint = False
+                    self.slots[(i, j)] = cell
+    
+    def cell_at(self, x: float, y: float) -> Optional[Bbox]:
+        """Cella che contiene il punto (bordo sinistro/superiore incluso), None se fuori"""
+        return self.slots.get((bisect_right(self.xs, x) - 1, bisect_right(self.ys, y) - 1))
+
+
+class PageLayout:
+    """
+    Parole di una pagina estratte una volta e condivise da testo e tabelle
+    
+    page.extract_text() raggruppa i caratteri in parole; page.extract_tables()
+    riparte dai caratteri grezzi, filtrandoli per ogni riga e ricostruendo le
+    parole di ogni cella. Qui le parole della pagina vengono assegnate alle
+    celle: solo le celle attraversate da una parola ripetono l'estrazione
+    dai caratteri, come pdfplumber. Testo e tabelle restano quelli di pdfplumber
+    con le impostazioni di default.
+    """
+    
+    def __init__(self, page):
+        """
+        Args:
+            page: Pagina pdfplumber
+        """
+        self.page = page
+        # (parola, caratteri) nello stesso ordine di page.extract_text()
+        self.words = list(WordExtractor().iter_extract_tuples(page.chars))
+        self._text = None
+    
+    def extract_text(self) -> str:
+        """Testo della pagina, identico a page.extract_text()"""
+        if self._text is None:
+            self._text = WordMap(self.words).to_textmap(
+                layout_bbox=self.page.bbox,
+                layout_width=self.page.width,
+                layout_height=self.page.height,
+                presorted=True
+            ).as_string
+        return self._text
+    
+    def extract_tables(self) -> List[List[List[Optional[str]]]]:
+        """Tabelle della pagina, identiche a page.extract_tables()"""
+        return [self._extract_table(table) for table in self.page.find_tables()]
+    
+    def _extract_table(self, table) -> List[List[Optional[str]]]:
+        """Testo delle celle di una tabella a partire dalle parole della pagina"""
+        grid = _CellGrid([cell for row in table.rows for cell in row.cells if cell is not None])
+        if not grid.disjoint:
+            return table.extract()
+        
+        # Caratteri per cella, nell'ordine della pagina (servono se una parola è divisa)
+        cell_chars: Dict[Bbox, List[Dict]] = {}
+        for char in self.page.chars:
+            cell = grid.cell_at(*_center(char))
+            if cell is not None:
+                cell_chars.setdefault(cell, []).append(char)
+        
+        cell_words: Dict[Bbox, List[Dict]] = {}
+        split_cells = set()
+        for word, chars in self.words:
+            cells = {grid.cell_at(*_center(char)) for char in chars}
+            if len(cells) == 1:
+                cell = cells.pop()
+                if cell is not None:
+                    cell_words.setdefault(cell, []).append(word)
+            else:
+                split_cells.update(cell for cell in cells if cell is not None)
+        
+        rows = []
+        for row in table.rows:
+            values = []
+            for cell in row.cells:
+                if cell is None:
+                    values.append(None)
+                elif cell not in cell_chars:
+                    values.append("")
+                elif cell in split_cells:
+                    values.append(extract_text(cell_chars[cell]))
+                else:
+                    values.append(self._join_words(cell_words.get(cell, [])))
+            rows.append(values)
+        return rows
+    
+    @staticmethod
+    def _join_words(words: List[Dict]) -> str:
+        """Parole raggruppate in righe come pdfplumber.utils.extract_text"""
+        lines = cluster_objects(words, itemgetter('top'), DEFAULT_Y_TOLERANCE)
+        return "\n".join(" ".join(word['text'] for word in line) for line in lines)
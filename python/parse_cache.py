@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Cache persistente dei risultati di parsing, su due livelli:
+- estrazioni: testo e tabelle grezzi per pagina (chiave: hash PDF + versione estrattore)
+- documenti: documento strutturato finale (chiave: hash PDF + versione parser)
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, Optional, Union, Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Dimensione massima di default della cache (byte di JSON memorizzato)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Letture dopo le quali gli ultimi accessi (LRU) vengono scritti in un'unica transazione
+ACCESS_FLUSH_HITS = 64
+
+# Tabelle dei due livelli di cache
+DOCUMENTI = 'documenti'
+ESTRAZIONI = 'estrazioni'
+
+
+def file_digest(file_path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    """Calcola l'hash SHA-256 del contenuto di un file"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Cache SQLite dei documenti parsificati, con eviction LRU per dimensione
+    
+    I valori sono dizionari JSON-serializzabili (es. asdict(documento)):
+    la cache non conosce le strutture dati del parser. L'eviction considera
+    la dimensione complessiva dei due livelli.
+    
+    Una lettura non scrive sul database: l'ultimo accesso viene accumulato e
+    scritto ogni ACCESS_FLUSH_HITS letture, alla prossima scrittura o in
+    close(), così una riscansione servita quasi tutta dalla cache resta in
+    sola lettura.
+    """
+    
+    def __init__(self, db_path: Union[str, Path], max_bytes: int = DEFAULT_MAX_BYTES):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        
+        # WAL + busy timeout: più processi worker possono condividere la cache
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for table in (DOCUMENTI, ESTRAZIONI):
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    digest TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    source TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (digest, version)
+                )
+            """)
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_access ON {table}(last_access)")
+            
+            # Cache create prima dell'introduzione della colonna source
+            columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+            if 'source' not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+        self.conn.commit()
+        
+        self._total_size = self._query_total_size()
+        # Ultimi accessi non ancora scritti: (tabella, digest, versione) -> timestamp
+        self._pending_access: Dict[Tuple[str, str, str], float] = {}
+    
+    def _query_total_size(self) -> int:
+        """Dimensione totale dei valori memorizzati nei due livelli"""
+        total = 0
+        for table in (DOCUMENTI, ESTRAZIONI):
+            total += self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+        return total
+    
+    def get(self, digest: str, version: str) -> Optional[Dict[str, Any]]:
+        """Restituisce il documento in cache o None, aggiornando l'ultimo accesso"""
+        return self._get(DOCUMENTI, digest, version)
+    
+    def put(self, digest: str, version: str, value: Dict[str, Any]) -> None:
+        """Memorizza un documento ed applica l'eviction se si supera max_bytes"""
+        self._put(DOCUMENTI, digest, version, value)
+        
+    def get_raw(self, digest: str, version: str) -> Optional[Dict[str, Any]]:
+        """Restituisce l'estrazione grezza (testo/tabelle per pagina) o None"""
+        return self._get(ESTRAZIONI, digest, version)
+    
+    def put_raw(self, digest: str, version: str, value: Dict[str, Any], source: str = "") -> None:
+        """
+        Memorizza l'estrazione grezza di un PDF
+        
+        Args:
+            source: Percorso del PDF, usato per riscrivere i risultati alla ri-estrazione
+        """
+        self._put(ESTRAZIONI, digest, version, value, source)
+        
+    def iter_raw(self, version: str) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Itera su tutte le estrazioni grezze di una versione, una alla volta
+        
+        Yields:
+            Tuple di (digest, percorso_origine, estrazione)
+        """
+        # Cursore separato: le scritture sulla connessione principale non lo interrompono
+        cursor = sqlite3.connect(str(self.db_path), timeout=30).execute(
+            f"SELECT digest, source, data FROM {ESTRAZIONI} WHERE version = ? ORDER BY source",
+            (version,)
+        )
+        try:
+            for digest, source, data in cursor:
+                yield digest, source, json.loads(data)
+        finally:
+            cursor.connection.close()
+    
+    def _get(self, table: str, digest: str, version: str) -> Optional[Dict[str, Any]]:
+        """Legge una voce registrando l'ultimo accesso (LRU), scritto a blocchi"""
+        row = self.conn.execute(
+            f"SELECT data FROM {table} WHERE digest = ? AND version = ?",
+            (digest, version)
+        ).fetchone()
+        
+        if row is None:
+            return None
+        
+        self._pending_access[(table, digest, version)] = time.time()
+        if len(self._pending_access) >= ACCESS_FLUSH_HITS:
+            self.flush()
+        return json.loads(row[0])
+    
+    def flush(self) -> None:
+        """Scrive gli ultimi accessi accumulati dalle letture"""
+        if self._pending_access:
+            self._write_access()
+            self.conn.commit()
+    
+    def _write_access(self) -> None:
+        """Aggiorna last_access delle voci lette, nella transazione corrente"""
+        pending, self._pending_access = self._pending_access, {}
+        for table in (DOCUMENTI, ESTRAZIONI):
+            self.conn.executemany(
+                f"UPDATE {table} SET last_access = ? WHERE digest = ? AND version = ?",
+                [(accessed, digest, version)
+                 for (entry_table, digest, version), accessed in pending.items() if entry_table == table]
+            )
+    
+    def _put(self, table: str, digest: str, version: str, value: Dict[str, Any],
+             source: str = "") -> None:
+        """Scrive una voce ed applica l'eviction se si supera max_bytes"""
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        size = len(data.encode('utf-8'))
+        
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {table} (digest, version, data, size, last_access, source) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (digest, version, data, size, time.time(), source)
+        )
+        # Stessa transazione della scrittura: gli accessi accumulati non costano un commit in più
+        self._write_access()
+        self.conn.commit()
+        
+        self._total_size += size
+        if self._total_size > self.max_bytes:
+            self._evict()
+    
+    def _evict(self) -> None:
+        """Rimuove le voci usate meno di recente fino a rientrare nel 90% di max_bytes"""
+        # Il totale locale è una stima se altri processi scrivono: si riallinea qui
+        self._total_size = self._query_total_size()
+        # L'ordine LRU deve includere le letture non ancora scritte
+        self.flush()
+        target = int(self.max_bytes * 0.9)
+        if self._total_size <= self.max_bytes:
+            return
+        
+        removed = 0
+        rows = self.conn.execute(
+            f"SELECT '{DOCUMENTI}', digest, version, size, last_access FROM {DOCUMENTI} "
+            f"UNION ALL SELECT '{ESTRAZIONI}', digest, version, size, last_access FROM {ESTRAZIONI} "
+            "ORDER BY last_access"
+        ).fetchall()
+        for table, digest, version, size, _ in rows:
+            if self._total_size <= target:
+                break
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE digest = ? AND version = ?", (digest, version)
+            )
+            self._total_size -= size
+            removed += 1
+        
+        self.conn.commit()
+        logger.info(f"Cache: rimosse {removed} voci (LRU), dimensione attuale {self._total_size} byte")
+    
+    def invalidate(self, digest: str = None, keep_version: str = None,
+                   level: str = DOCUMENTI) -> int:
+        """
+        Invalida voci della cache
+        
+        Args:
+            digest: Se indicato, rimuove solo le voci di questo contenuto PDF
+            keep_version: Se indicato, rimuove solo le voci di versioni diverse
+            level: Livello da invalidare (DOCUMENTI o ESTRAZIONI)
+        
+        Returns:
+            Numero di voci rimosse
+        """
+        query = f"DELETE FROM {level} WHERE 1 = 1"
+        params = []
+        if digest:
+            query += " AND digest = ?"
+            params.append(digest)
+        if keep_version:
+            query += " AND version != ?"
+            params.append(keep_version)
+        
+        removed = self.conn.execute(query, params).rowcount
+        self.conn.commit()
+        self._total_size = self._query_total_size()
+        
+        logger.info(f"Cache: invalidate {removed} voci")
+        return removed
+    
+    def stats(self, level: str = DOCUMENTI) -> Dict[str, Any]:
+        """Statistiche sul contenuto di un livello della cache"""
+        entries, total = self.conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {level}"
+        ).fetchone()
+        versions = dict(self.conn.execute(
+            f"SELECT version, COUNT(*) FROM {level} GROUP BY version"
+        ).fetchall())
+        return {
+            'entries': entries,
+            'size_bytes': total,
+            'max_bytes': self.max_bytes,
+            'versions': versions
+        }
+    
+    def close(self) -> None:
+        """Scrive gli accessi in sospeso e chiude la connessione al database"""
+        self.flush()
+        self.conn.close()
+
+
+def main():
+    """Comandi di gestione della cache"""
+    arg_parser = argparse.ArgumentParser(description="Gestione cache parsing DDT/Fatture")
+    arg_parser.add_argument('cache_path', help="File SQLite della cache (es. risultati/cache/parse_cache.sqlite)")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    
+    commands.add_parser('stats', help="Mostra statistiche della cache")
+    
+    invalidate = commands.add_parser('invalidate', help="Invalida voci della cache")
+    invalidate.add_argument('--file', help="Invalida solo le voci di questo PDF")
+    invalidate.add_argument('--stale', action='store_true',
+                            help="Invalida solo le voci di versioni del parser diverse dall'attuale")
+    invalidate.add_argument('--raw', action='store_true',
+                            help="Invalida anche le estrazioni grezze (testo/tabelle), non solo i documenti")
+    
+    args = arg_parser.parse_args()
+    
+    if not Path(args.cache_path).exists():
+        print(f"Errore: Cache '{args.cache_path}' non trovata!")
+        sys.exit(1)
+    
+    cache = ParseCache(args.cache_path)
+    try:
+        if args.command == 'stats':
+            for level in (DOCUMENTI, ESTRAZIONI):
+                stats = cache.stats(level)
+                print(f"[{level}]")
+                print(f"Voci:       {stats['entries']}")
+                print(f"Dimensione: {stats['size_bytes'] / 1024 / 1024:.1f} MB")
+                for version, count in stats['versions'].items():
+                    print(f"  versione {version}: {count}")
+        else:
+            from ddt_fatture_parser import parser_version, EXTRACTOR_VERSION
+            digest = file_digest(args.file) if args.file else None
+            
+            removed = cache.invalidate(digest=digest,
+                                       keep_version=parser_version() if args.stale else None)
+            if args.raw:
+                removed += cache.invalidate(digest=digest, level=ESTRAZIONI,
+                                            keep_version=EXTRACTOR_VERSION if args.stale else None)
+            print(f"Voci invalidate: {removed}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
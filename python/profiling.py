@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Profilo cProfile del batch: aggregato del run e profili completi dei file lenti
+I profili dei singoli file arrivano dai worker come dizionari pstats (picklable)
+"""
+
+import cProfile
+import io
+import pstats
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+# Soglia predefinita (secondi) oltre la quale il profilo di un file viene salvato
+DEFAULT_SLOW_THRESHOLD = 5.0
+# Funzioni elencate nel riepilogo testuale del profilo aggregato
+SUMMARY_LINES = 40
+
+
+class _ProfileData:
+    """Dizionario pstats presentato come un profiler, per costruire un pstats.Stats"""
+    
+    def __init__(self, stats: Dict):
+        self.stats = stats
+    
+    def create_stats(self) -> None:
+        pass
+
+
+def profile_call(func: Callable, *args) -> Tuple[Any, Dict]:
+    """
+    Esegue func(*args) sotto cProfile
+    
+    Returns:
+        Tuple di (risultato, dizionario pstats del profilo)
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+def as_stats(stats: Dict) -> pstats.Stats:
+    """pstats.Stats da un dizionario prodotto da profile_call"""
+    return pstats.Stats(_ProfileData(stats))
+
+
+class RunProfiler:
+    """
+    Profilo aggregato dei file di un run, con cattura dei file lenti
+    
+    Ogni file viene profilato per intero (non si sa in anticipo quale sarà
+    lento); il profilo di un file che supera la soglia viene salvato accanto
+    al suo risultato, quello di tutti i file viene sommato nell'aggregato.
+    """
+    
+    def __init__(self, slow_threshold: float = DEFAULT_SLOW_THRESHOLD):
+        """
+        Args:
+            slow_threshold: Secondi di elaborazione oltre i quali il profilo del file viene salvato
+        """
+        self.slow_threshold = slow_threshold
+        self.aggregate: Optional[pstats.Stats] = None
+        self.files = 0
+        self.captured = []
+    
+    def add(self, stats: Dict, elapsed: float, capture_path: Union[str, Path]) -> Optional[Path]:
+        """
+        Aggiunge il profilo di un file all'aggregato
+        
+        Args:
+            stats: Dizionario pstats del file
+            elapsed: Secondi di elaborazione del file
+            capture_path: Dove salvare il profilo se il file è lento
+        
+        Returns:
+            Percorso del profilo salvato, o None se il file non ha superato la soglia
+        """
+        file_stats = as_stats(stats)
+        if self.aggregate is None:
+            # Copia: i profili dei file successivi vengono sommati all'aggregato
+            self.aggregate = as_stats(dict(stats))
+        else:
+            self.aggregate.add(file_stats)
+        self.files += 1
+        
+        if elapsed < self.slow_threshold:
+            return None
+        capture_path = Path(capture_path)
+        file_stats.dump_stats(str(capture_path))
+        self.captured.append(capture_path)
+        return capture_path
+    
+    def save(self, path: Union[str, Path]) -> Optional[Path]:
+        """
+        Salva il profilo aggregato (.prof per pstats/snakeviz) e il riepilogo testuale (.txt)
+        
+        Returns:
+            Percorso del file .prof, o None se nessun file è stato profilato
+        """
+        if self.aggregate is None:
+            return None
+        path = Path(path)
+        self.aggregate.dump_stats(str(path))
+        
+        summary = io.StringIO()
+        stats = pstats.Stats(str(path), stream=summary)
+        summary.write(f"Profilo aggregato di {self.files} file "
+                      f"({len(self.captured)} oltre {self.slow_threshold}s)\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(SUMMARY_LINES)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(SUMMARY_LINES)
+        path.with_suffix('.txt').write_text(summary.getvalue(), encoding='utf-8')
+        return path
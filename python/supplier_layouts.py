@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Registro dei layout documentali dei fornitori
+Ogni layout ha un'impronta economica (P.IVA, parole dell'intestazione, formato pagina) e un estrattore dedicato
+Le regioni dichiarate dal layout (aree fisse della prima e dell'ultima pagina) si leggono con page.crop(bbox)
+"""
+
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Tolleranza (punti PDF) nel confronto del formato pagina
+PAGE_SIZE_TOLERANCE = 2.0
+
+# Formato A4 in punti PDF
+A4 = (595.28, 841.89)
+
+# Punti PDF per millimetro
+MM = 72 / 25.4
+
+# Pagina di una regione (indice in pdf.pages)
+FIRST_PAGE = 0
+LAST_PAGE = -1
+
+# Campi dell'intestazione restituiti da SupplierLayout.extract (formato DDTParser)
+HEADER_FIELDS = ('numero', 'data', 'pagina', 'codice_cliente', 'cliente', 'indirizzo_cliente', 'piva_cliente')
+
+_PIVA = re.compile(r'(?<!\d)\d{11}(?!\d)')
+_PIVA_LABEL = re.compile(r'P\.?\s*IVA\s*[:.]?\s*(\d{11})', re.IGNORECASE)
+_INDIRIZZO = re.compile(r'^(VIA|V\.LE|VIALE|CORSO|P\.ZA|PIAZZA)', re.IGNORECASE)
+# Apostrofi (anche tipografici) e accenti scritti come apostrofo, ignorati nel confronto dell'impronta
+_APOSTROFI = re.compile(r"['\u2018\u2019\u00b4`]")
+
+
+def normalize_date(date_str: str) -> str:
+    """Normalizza una data gg/mm/aa o g/m/aaaa in gg/mm/aaaa"""
+    date_str = date_str.strip()
+    
+    # Gestisci anno a 2 cifre
+    parts = date_str.split('/')
+    if len(parts) == 3:
+        day = parts[0].zfill(2)
+        month = parts[1].zfill(2)
+        year = parts[2]
+        
+        if len(year) == 2:
+            # Assumi 20xx per anni < 50, 19xx altrimenti
+            year = ('20' if int(year) < 50 else '19') + year
+        
+        return f"{day}/{month}/{year}"
+    
+    return date_str
+
+
+def fold_text(text: str) -> str:
+    """Testo minuscolo senza accenti né apostrofi (es. SPECIALITÀ e SPECIALITA' diventano specialita)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return _APOSTROFI.sub('', ''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def header_complete(data: Optional[Dict[str, Any]]) -> bool:
+    """True se i campi estratti (es. dalle regioni di un layout) contengono almeno numero e cliente"""
+    return bool(data and data.get('numero') and data.get('cliente'))
+
+
+def mm_bbox(x0: float, top: float, x1: float, bottom: float) -> Tuple[float, float, float, float]:
+    """Bbox pdfplumber (x0, top, x1, bottom) in punti da coordinate in millimetri dall'angolo in alto a sinistra"""
+    return (x0 * MM, top * MM, x1 * MM, bottom * MM)
+
+
+@dataclass(frozen=True)
+class Region:
+    """Area fissa di una pagina che contiene sempre gli stessi campi"""
+    name: str
+    # (x0, top, x1, bottom) in punti, come page.crop()
+    bbox: Tuple[float, float, float, float]
+    page: int = FIRST_PAGE
+
+
+@dataclass
+class DocumentFingerprint:
+    """Impronta della prima pagina, calcolata una volta e confrontata con i layout registrati"""
+    text: str = ""
+    pivas: Set[str] = field(default_factory=set)
+    page_size: Optional[Tuple[float, float]] = None
+    
+    @classmethod
+    def from_page(cls, text: str, width: float = 0.0, height: float = 0.0) -> 'DocumentFingerprint':
+        """
+        Args:
+            text: Testo della prima pagina (confrontato con fold_text)
+            width, height: Formato pagina in punti (0 = sconosciuto, non confrontato)
+        """
+        return cls(
+            text=fold_text(text),
+            pivas=set(_PIVA.findall(text)),
+            page_size=(width, height) if width and height else None
+        )
+
+
+class SupplierLayout(ABC):
+    """
+    Layout documentale di un fornitore
+    
+    Le sottoclassi dichiarano l'impronta (piva, header_tokens, page_size), i
+    dati fissi del fornitore e implementano extract: i documenti riconosciuti
+    non passano dalla cascata di pattern generica.
+    """
+    
+    # Nome del layout (riportato in Documento.layout)
+    name = ""
+    # P.IVA del fornitore: deve comparire nella prima pagina
+    piva = ""
+    # Parole che devono comparire tutte nella prima pagina (senza distinguere
+    # maiuscole, accenti e apostrofi, vedi fold_text)
+    header_tokens: Tuple[str, ...] = ()
+    # Formato pagina atteso in punti (None = qualsiasi)
+    page_size: Optional[Tuple[float, float]] = None
+    # Dati del fornitore (campi di Fornitore)
+    fornitore: Dict[str, str] = {}
+    # Aree con i campi dell'intestazione (prima pagina) e i totali (ultima pagina)
+    regions: Tuple[Region, ...] = ()
+    
+    def matches(self, fingerprint: DocumentFingerprint) -> bool:
+        """True se l'impronta corrisponde al layout"""
+        if self.piva and self.piva not in fingerprint.pivas:
+            return False
+        if not all(fold_text(token) in fingerprint.text for token in self.header_tokens):
+            return False
+        if self.page_size and fingerprint.page_size:
+            return all(abs(expected - actual) <= PAGE_SIZE_TOLERANCE
+                       for expected, actual in zip(self.page_size, fingerprint.page_size))
+        return True
+    
+    @abstractmethod
+    def extract(self, lines: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Estrae i campi del documento dalle righe del testo
+        
+        Returns:
+            Dizionario con i campi HEADER_FIELDS trovati più tipo, agente_codice,
+            agente_nome, vettore, totale e articoli (lista di dizionari con i
+            campi di Articolo come stringhe); None se l'intestazione attesa
+            non c'è (si usa il parser generico)
+        """
+    
+    def read_regions(self, pdf, pages: Optional[Iterable[int]] = None) -> Dict[str, str]:
+        """
+        Testo delle regioni del layout, estratto solo dalle aree ritagliate
+        
+        Args:
+            pdf: PDF pdfplumber aperto
+            pages: Pagine delle regioni da leggere (FIRST_PAGE, LAST_PAGE; None = tutte)
+            
+        Returns:
+            Dizionario nome regione -> testo
+        """
+        pages = set(pages) if pages is not None else None
+        texts = {}
+        for region in self.regions:
+            if pages is not None and region.page not in pages:
+                continue
+            page = pdf.pages[region.page]
+            # page.crop() rifiuta aree che escono dalla pagina
+            x0, top, x1, bottom = page.bbox
+            bbox = (max(region.bbox[0], x0), max(region.bbox[1], top),
+                    min(region.bbox[2], x1), min(region.bbox[3], bottom))
+            texts[region.name] = page.crop(bbox).extract_text() or ""
+        return texts
+    
+    def extract_regions(self, texts: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        Estrae i campi dal testo delle regioni
+        
+        Di default le righe delle regioni, nell'ordine in cui sono dichiarate,
+        passano a extract: il ritaglio separa le colonne affiancate (es. cliente
+        e luogo di consegna) che nel testo della pagina finiscono sulla stessa riga.
+        Se le aree non contengono l'intestazione (vedi header_complete) i
+        chiamanti ripiegano su extract con il testo completo.
+        """
+        lines = [line for region in self.regions for line in texts.get(region.name, "").split('\n')]
+        return self.extract(lines)
+    
+    def page_marker(self, lines: List[str]) -> Optional[Tuple[str, int]]:
+        """
+        Numero del documento e numero di pagina dall'intestazione di una pagina
+        
+        Returns:
+            (numero, pagina), oppure None se il layout non li riporta su ogni pagina
+            (i confini tra documenti si cercano allora con i pattern generici)
+        """
+        return None
+    
+    def find_customer_piva(self, lines: Iterable[str], supplier_pivas: Set[str]) -> Optional[str]:
+        """Prima P.IVA nelle righe che non appartiene a un fornitore registrato"""
+        for line in lines:
+            for piva in _PIVA_LABEL.findall(line):
+                if piva not in supplier_pivas:
+                    return piva
+        return None
+
+
+class AlfieriLayout(SupplierLayout):
+    """DDT Alfieri Specialità Alimentari: intestazione su una sola riga"""
+    
+    name = "alfieri"
+    piva = "03247720042"
+    # Basta la sede: la ragione sociale compare anche come "SPECIALITÀ" e su
+    # moduli non A4, quindi non fa parte dell'impronta
+    header_tokens = ("magliano alfieri",)
+    fornitore = {
+        'nome': "ALFIERI SPECIALITA' ALIMENTARI S.P.A.",
+        'piva': "03247720042",
+        'indirizzo': "C.so G. Marconi 10/E",
+        'cap': "12050",
+        'citta': "MAGLIANO ALFIERI",
+        'provincia': "CN"
+    }
+    # Nessuna regione finché le aree non sono misurate su DDT Alfieri reali:
+    # la modalità intestazione legge il testo della prima e dell'ultima pagina
+    
+    # numero(4) data(gg/mm/aa) pag(1-2) codcliente(5) nome cliente, es. "5023 3/06/25 1 20322 DONAC S.R.L."
+    HEADER = re.compile(r'^(\d{4})\s+(\d{1,2}/\d{2}/\d{2})\s+(\d+)\s+(\d{5})\s+(.+?)$')
+    AGENTE = re.compile(r'^Agente\s*[:.]?\s*(\d+)\s+(.+)$', re.IGNORECASE)
+    VETTORE = re.compile(r'^Vettore\s*[:.]?\s*(.+)$', re.IGNORECASE)
+    TOTALE = re.compile(r'^Totale\s+documento\s*€?\s*[:.]?\s*([\d.,]+)', re.IGNORECASE)
+    # codice(6) descrizione UM quantità prezzo sconto importo IVA
+    ARTICOLO = re.compile(
+        r'^(\d{6})\s+(.+?)\s+(PZ|KG|LT|CF|CT|NR)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+(\d+)$'
+    )
+    # Inizio della colonna "Luogo di consegna", che nel testo della pagina segue il
+    # cliente sulla stessa riga, anche senza spazio: "...TETTO GARETTOVIA SALUZZO, 65"
+    CONSEGNA_INDIRIZZO = re.compile(r'(?<=.)(?:VIA|V\.LE|VIALE|CORSO|P\.ZA|PIAZZA)\s')
+    CONSEGNA_CAP = re.compile(r'(?<=.)\s\d{5}\b')
+    
+    def page_marker(self, lines: List[str]) -> Optional[Tuple[str, int]]:
+        # La riga d'intestazione, ripetuta su ogni pagina, riporta numero e pagina
+        for line in lines:
+            match = self.HEADER.match(line.strip())
+            if match:
+                return match.group(1), int(match.group(3))
+        return None
+    
+    def extract(self, lines: List[str]) -> Optional[Dict[str, Any]]:
+        lines = [line.strip() for line in lines]
+        
+        for i, line in enumerate(lines):
+            match = self.HEADER.match(line)
+            if match:
+                break
+        else:
+            return None
+        
+        data = {
+            'tipo': 'FATTURA' if any('fattura' in l.lower() for l in lines[:i]) else 'DDT',
+            'numero': match.group(1),
+            'data': normalize_date(match.group(2)),
+            'pagina': match.group(3),
+            'codice_cliente': match.group(4),
+            'cliente': match.group(5).strip(),
+            'articoli': []
+        }
+        
+        # Indirizzo nelle righe successive, con CAP e città nella riga dopo
+        for j in range(i + 1, min(i + 10, len(lines))):
+            if _INDIRIZZO.match(lines[j]):
+                consegna = any('luogo di consegna' in line.lower() for line in lines[i:j])
+                data['indirizzo_cliente'] = self._client_column(lines[j], self.CONSEGNA_INDIRIZZO, consegna)
+                if j + 1 < len(lines) and re.match(r'^\d{5}', lines[j + 1]):
+                    data['indirizzo_cliente'] += ' ' + self._client_column(lines[j + 1], self.CONSEGNA_CAP,
+                                                                           consegna)
+                break
+        
+        piva = self.find_customer_piva(lines[i:i + 15], {self.piva})
+        if piva:
+            data['piva_cliente'] = piva
+        
+        # Piede: agente, vettore, totale e righe articolo, una per riga
+        for line in lines[i + 1:]:
+            articolo = self.ARTICOLO.match(line)
+            if articolo:
+                data['articoli'].append(dict(zip(
+                    ('codice', 'descrizione', 'unita_misura', 'quantita', 'prezzo_unitario',
+                     'sconto', 'importo', 'iva'),
+                    articolo.groups()
+                )))
+                continue
+            
+            agente = self.AGENTE.match(line)
+            if agente and 'agente_codice' not in data:
+                data['agente_codice'], data['agente_nome'] = agente.group(1), agente.group(2).strip()
+            for name, pattern in (('vettore', self.VETTORE), ('totale', self.TOTALE)):
+                found = pattern.match(line)
+                if found and name not in data:
+                    data[name] = found.group(1).strip()
+        
+        return data
+    
+    def _client_column(self, line: str, consegna_start: re.Pattern, consegna: bool) -> str:
+        """Parte della riga che appartiene al cliente, senza il luogo di consegna affiancato"""
+        found = consegna_start.search(line) if consegna else None
+        return line[:found.start()].strip() if found else line
+
+
+class LayoutRegistry:
+    """
+    Layout dei fornitori noti, riconosciuti dall'impronta della prima pagina
+    
+    Nuovi fornitori si aggiungono con register(); i documenti che non
+    corrispondono a nessun layout passano al parser generico.
+    """
+    
+    def __init__(self, layouts: Iterable[SupplierLayout] = ()):
+        self.layouts: List[SupplierLayout] = []
+        for layout in layouts:
+            self.register(layout)
+    
+    def register(self, layout: SupplierLayout) -> None:
+        """Aggiunge un layout (i layout registrati prima hanno la precedenza)"""
+        self.layouts.append(layout)
+    
+    @property
+    def supplier_pivas(self) -> Set[str]:
+        """P.IVA dei fornitori registrati, da escludere quando si cerca quella del cliente"""
+        return {layout.piva for layout in self.layouts if layout.piva}
+    
+    def match(self, fingerprint: DocumentFingerprint) -> Optional[SupplierLayout]:
+        """Primo layout che corrisponde all'impronta, None se il documento non è riconosciuto"""
+        for layout in self.layouts:
+            if layout.matches(fingerprint):
+                return layout
+        return None
+
+
+def default_registry() -> LayoutRegistry:
+    """Registro con i layout forniti con il parser"""
+    return LayoutRegistry([AlfieriLayout()])
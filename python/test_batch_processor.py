@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+Script di test per il processore batch
+"""
+
+import sys
+import gzip
+import shutil
+import tempfile
+from pathlib import Path
+from create_test_pdf import create_test_ddt_pdf
+from batch_processor import BatchProcessor, WatchDaemon
+
+
+def _prepare_input(base_dir: Path, n_ok: int = 4, n_bad: int = 1) -> Path:
+    """Crea una directory input con PDF validi e file corrotti"""
+    input_dir = base_dir / "input"
+    input_dir.mkdir()
+    
+    template = create_test_ddt_pdf(str(base_dir / "template.pdf"))
+    for i in range(n_ok):
+        shutil.copy(template, input_dir / f"ddt_{i}.pdf")
+    for i in range(n_bad):
+        (input_dir / f"corrotto_{i}.pdf").write_text("non è un PDF")
+    
+    return input_dir
+
+
+def test_parallel_batch():
+    """Test elaborazione batch parallela"""
+    print("=== TEST BATCH PARALLELO ===\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp)
+        
+        processor = BatchProcessor(input_dir, tmp / "output", workers=2, max_in_flight=2,
+                                   export_formats=['jsonl', 'csv'], export_compress=True)
+        stats = processor.process_batch()
+        
+        assert stats['total_files'] == 5, f"Attesi 5 file, trovati {stats['total_files']}"
+        assert stats['success'] == 4 and stats['errors'] == 1
+        assert stats['by_type']['DDT'] == 4
+        print("✓ Statistiche aggregate correttamente")
+        
+        assert len(list(processor.success_dir.glob("*_parsed.json"))) == 4
+        error_text = (processor.error_dir / "corrotto_0_error.txt").read_text(encoding='utf-8')
+        assert "Traceback" in error_text, "Traceback mancante nel file errore"
+        print("✓ File JSON ed errori scritti")
+        
+        assert len(list(processor.reports_dir.glob("report_*.html"))) == 1
+        records = list(processor.manifest.iter_records())
+        assert sorted(record['path'] for record in records) == sorted(
+            str(pdf.absolute()) for pdf in processor.find_pdf_files()), "Un record manifest per file atteso"
+        print("✓ Report generato")
+        
+        exports = sorted(p.name for p in processor.output_dir.glob("documenti_*"))
+        assert [name.split('.', 1)[1] for name in exports] == ["csv.gz", "jsonl.gz"], exports
+        with gzip.open(processor.output_dir / exports[1], 'rt', encoding='utf-8') as f:
+            assert sum(1 for _ in f) == 4, "Export JSON Lines incompleto"
+        print("✓ Export cumulativi scritti in streaming")
+    
+    print("\n✅ Test batch parallelo passati!\n")
+
+
+def test_max_files():
+    """Test limite sul numero di file"""
+    print("=== TEST MAX FILES ===\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=3, n_bad=0)
+        
+        processor = BatchProcessor(input_dir, tmp / "output")
+        stats = processor.process_batch(max_files=2)
+        assert stats['total_files'] == 2, f"Attesi 2 file, trovati {stats['total_files']}"
+        print("✓ Limite max_files rispettato")
+    
+    print("\n✅ Test max files passati!\n")
+
+
+def test_resume():
+    """Test ripresa di un'elaborazione interrotta tramite manifest"""
+    print("=== TEST RIPRESA DA MANIFEST ===\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=3, n_bad=1)
+        
+        # Primo run interrotto dopo 2 file
+        BatchProcessor(input_dir, tmp / "output", use_cache=False).process_batch(max_files=2)
+        
+        processor = BatchProcessor(input_dir, tmp / "output", use_cache=False)
+        stats = processor.process_batch(resume=True)
+        assert processor.manifest.path.exists(), "Manifest non creato"
+        assert len(list(processor.manifest.iter_records())) == 4, "File rielaborati inutilmente"
+        assert stats['total_files'] == 4 and stats['success'] == 3 and stats['errors'] == 1
+        print("✓ Solo i file mancanti elaborati, statistiche dall'intera sessione")
+        
+        # Un file modificato viene rielaborato
+        (input_dir / "corrotto_0.pdf").write_text("contenuto diverso")
+        stats = BatchProcessor(input_dir, tmp / "output", use_cache=False).process_batch(resume=True)
+        assert len(list(processor.manifest.iter_records())) == 5
+        assert stats['total_files'] == 4, "Il report deve contare ogni file una sola volta"
+        print("✓ File modificati rielaborati")
+        
+        # Una nuova sessione ha il suo file; la ripresa legge solo quello, una volta
+        BatchProcessor(input_dir, tmp / "output", use_cache=False).process_batch(max_files=1)
+        processor = BatchProcessor(input_dir, tmp / "output", use_cache=False)
+        assert len(processor.manifest.sessions()) == 2
+        letture = []
+        iter_lines = processor.manifest._iter_lines
+        processor.manifest._iter_lines = lambda session: letture.append(session) or iter_lines(session)
+        stats = processor.process_batch(resume=True)
+        assert stats['total_files'] == 4 and letture == [processor.session], letture
+        print("✓ Un manifest per sessione, letto una sola volta per run")
+        
+        # Manifest unico delle versioni precedenti: diviso per sessione al primo avvio
+        legacy = tmp / "legacy"
+        legacy.mkdir()
+        (legacy / "manifest.jsonl").write_text("".join(
+            line for session in processor.manifest.sessions()
+            for line in processor.manifest.session_path(session).open(encoding='utf-8')
+        ), encoding='utf-8')
+        migrato = BatchProcessor(input_dir, legacy, use_cache=False)
+        assert migrato.manifest.sessions() == processor.manifest.sessions()
+        assert (legacy / "manifest.jsonl.migrated").exists()
+        assert migrato.manifest.completed(processor.session) == processor.manifest.completed(processor.session)
+        print("✓ Manifest unico precedente diviso per sessione")
+    
+    print("\n✅ Test ripresa passati!\n")
+
+
+def test_re_extract():
+    """Test ri-estrazione dei campi dalla cache grezza"""
+    print("=== TEST RI-ESTRAZIONE ===\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=1, n_bad=0)
+        
+        BatchProcessor(input_dir, tmp / "output").process_batch()
+        
+        # I PDF non servono più: la ri-estrazione lavora solo sulla cache
+        shutil.rmtree(input_dir)
+        input_dir.mkdir()
+        
+        processor = BatchProcessor(input_dir, tmp / "output")
+        stats = processor.re_extract()
+        assert stats['success'] == 1, f"Atteso 1 documento, trovati {stats['success']}"
+        assert stats['by_type']['DDT'] == 1
+        assert (processor.success_dir / "ddt_0_parsed.json").exists()
+        print("✓ Campi ri-estratti senza rileggere i PDF")
+    
+    print("\n✅ Test ri-estrazione passati!\n")
+
+
+def test_header_only():
+    """Test batch in modalità sola intestazione"""
+    print("=== TEST BATCH SOLA INTESTAZIONE ===\n")
+    
+    import json
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=3, n_bad=1)
+        
+        processor = BatchProcessor(input_dir, tmp / "output", workers=2, header_only=True)
+        stats = processor.process_batch()
+        assert stats['success'] == 3 and stats['errors'] == 1
+        assert stats['mode'] == "header" and stats['run_files'] == 4
+        assert processor.throughput() > 0
+        print("✓ Intestazioni estratte nei worker, throughput calcolato")
+        
+        documento = json.loads((processor.success_dir / "ddt_0_parsed.json").read_text(encoding='utf-8'))
+        assert documento['numero'] == "5023" and documento['articoli'] == []
+        report = next(processor.reports_dir.glob("report_*.html")).read_text(encoding='utf-8')
+        assert "solo intestazione" in report and "file/s" in report
+        print("✓ Modalità e throughput riportati nel report")
+        
+        try:
+            processor.re_extract()
+            assert False, "Ri-estrazione accettata in modalità intestazione"
+        except ValueError:
+            pass
+    
+    print("\n✅ Test batch sola intestazione passati!\n")
+
+
+def test_split_documents():
+    """Test batch --split: un risultato e un record nel manifest per documento del PDF"""
+    print("=== TEST BATCH DOCUMENTI MULTIPLI ===\n")
+    
+    import json
+    
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=0, n_bad=1)
+        # Stampa giornaliera: tre DDT, il 101 su due pagine
+        c = canvas.Canvas(str(input_dir / "giornaliera.pdf"), pagesize=A4)
+        for numero, pagine in [("101", 2), ("102", 1), ("103", 1)]:
+            for page in range(pagine):
+                c.drawString(50, 800, "DOCUMENTO DI TRASPORTO")
+                c.drawString(50, 785, f"DDT N. {numero} del 05/03/2024")
+                c.drawString(50, 770, f"Pag. {page + 1}")
+                c.showPage()
+        c.save()
+        
+        processor = BatchProcessor(input_dir, tmp / "output", workers=2, split_documents=True)
+        stats = processor.process_batch()
+        assert stats['success'] == 3 and stats['errors'] == 1 and stats['total_files'] == 4, stats
+        documento = json.loads((processor.success_dir / "giornaliera_pag1-2_parsed.json").read_text(encoding='utf-8'))
+        assert documento['numero'] == "101" and documento['pagine'] == "1-2"
+        assert {p.name for p in processor.success_dir.glob("giornaliera_*")} == {
+            "giornaliera_pag1-2_parsed.json", "giornaliera_pag3-3_parsed.json", "giornaliera_pag4-4_parsed.json"}
+        print("✓ Un risultato per documento, nominato con le sue pagine")
+        
+        records = [r for r in processor.manifest.iter_records() if r['path'].endswith("giornaliera.pdf")]
+        assert [(r['documento'], r['documenti'], r['riga']['pagine']) for r in records] == [
+            (0, 3, "1-2"), (1, 3, "3-3"), (2, 3, "4-4")], records
+        print("✓ Un record nel manifest per documento")
+        
+        # Ripresa: il file completo viene saltato; registrato solo in parte, viene rielaborato
+        stats = BatchProcessor(input_dir, tmp / "output", split_documents=True).process_batch(resume=True)
+        assert stats['run_files'] == 0 and stats['total_files'] == 4
+        manifest = processor.manifest.path
+        manifest.write_text("".join(line for line in manifest.read_text(encoding='utf-8').splitlines(True)
+                                    if '"documento": 2' not in line), encoding='utf-8')
+        stats = BatchProcessor(input_dir, tmp / "output", split_documents=True).process_batch(resume=True)
+        assert stats['run_files'] == 3 and stats['total_files'] == 4 and stats['success'] == 3, stats
+        print("✓ Ripresa: file diviso registrato solo in parte rielaborato")
+        
+        try:
+            BatchProcessor(input_dir, tmp / "output", header_only=True, split_documents=True)
+            assert False, "--split accettato in modalità intestazione"
+        except ValueError:
+            pass
+    
+    print("\n✅ Test batch documenti multipli passati!\n")
+
+
+def test_stage_report():
+    """Test percentili delle fasi di parsing nei report del batch"""
+    print("=== TEST REPORT FASI ===\n")
+    
+    import pandas as pd
+    from manifest import BatchManifest
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=3, n_bad=1)
+        
+        processor = BatchProcessor(input_dir, tmp / "output", workers=2, use_cache=False)
+        stats = processor.process_batch()
+        testo = stats['fasi']['tempi']['testo']
+        assert testo['file'] == 3 and 0 < testo['p50'] <= testo['p95'] <= testo['max']
+        assert stats['fasi']['conteggi']['pagine']['totale'] == 3
+        print("✓ Fasi misurate nei worker e aggregate per la sessione")
+        
+        records = list(BatchManifest(tmp / "output" / "manifest").iter_latest(processor.session))
+        assert sum('metriche' in record for record in records) == 3
+        print("✓ Metriche per documento registrate nel manifest")
+        
+        report = next(processor.reports_dir.glob("report_*.html")).read_text(encoding='utf-8')
+        assert "Tempi per Fase" in report and "<td>testo</td>" in report and "Dimensioni Documenti" in report
+        excel = next(processor.reports_dir.glob("riepilogo_*.xlsx"))
+        fasi = pd.read_excel(excel, sheet_name='Fasi')
+        assert "testo" in list(fasi['Fase']) and list(fasi.columns)[2:4] == ['p50 (ms)', 'p95 (ms)']
+        assert set(pd.read_excel(excel, sheet_name='Dimensioni')['Misura']) == {"pagine", "caratteri"}
+        print("✓ Tabelle p50/p95/max nel report HTML e nel riepilogo Excel")
+    
+    print("\n✅ Test report fasi passati!\n")
+
+
+def test_metrics():
+    """Test metriche Prometheus servite durante il run e scritte su file"""
+    print("=== TEST METRICHE PROMETHEUS ===\n")
+    
+    from datetime import datetime
+    from urllib.request import urlopen
+    from metrics import Histogram
+    
+    histogram = Histogram("latenza_seconds", "Latenza", buckets=(1, 5))
+    for value in (0.5, 3, 10):
+        histogram.observe(value)
+    assert histogram.render()[2:] == ['latenza_seconds_bucket{le="1.0"} 1', 'latenza_seconds_bucket{le="5.0"} 2',
+                                      'latenza_seconds_bucket{le="+Inf"} 3', 'latenza_seconds_sum 13.5',
+                                      'latenza_seconds_count 3']
+    print("✓ Istogramma con bucket cumulativi, somma e conteggio")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=3, n_bad=1)
+        metrics_file = tmp / "batch.prom"
+        
+        processor = BatchProcessor(input_dir, tmp / "output", use_cache=False,
+                                   metrics_port=0, metrics_file=metrics_file)
+        files = sorted(processor.iter_pdf_files())
+        scraped = []
+        
+        def outcomes():
+            # Scrape a metà run: le metriche sono già aggiornate
+            yield from processor._iter_outcomes(files[:2])
+            url = f"http://127.0.0.1:{processor.metrics_server.port}/metrics"
+            scraped.append(urlopen(url, timeout=10).read().decode('utf-8'))
+            yield from processor._iter_outcomes(files[2:])
+        
+        processor.stats['start_time'] = datetime.now()
+        processor._run(outcomes())
+        assert "ddt_batch_files_total 2.0" in scraped[0]
+        print("✓ Endpoint /metrics aggiornato durante il run")
+        
+        metrics = metrics_file.read_text(encoding='utf-8')
+        assert "ddt_batch_files_total 4.0" in metrics and "ddt_batch_errors_total 1.0" in metrics
+        assert "ddt_batch_success_total 3.0" in metrics
+        assert 'ddt_batch_documents_total{tipo="DDT"} 3.0' in metrics
+        assert "ddt_batch_file_duration_seconds_count 4" in metrics
+        assert 'ddt_batch_file_pages_bucket{le="1.0"} 3' in metrics
+        assert 'ddt_batch_document_articles_bucket{le="5.0"} 3' in metrics
+        print("✓ Contatori e istogrammi nel file per il textfile collector")
+        
+        # A fine run l'endpoint viene chiuso
+        assert processor.metrics_server._server is None
+    
+    print("\n✅ Test metriche Prometheus passati!\n")
+
+
+def test_profile():
+    """Test profilo cProfile del run e cattura dei file lenti"""
+    print("=== TEST PROFILING ===\n")
+    
+    import pstats
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=2, n_bad=1)
+        
+        # Soglia 0: ogni file è "lento" e il suo profilo viene salvato
+        processor = BatchProcessor(input_dir, tmp / "output", workers=2, use_cache=False,
+                                   profile=True, profile_threshold=0)
+        stats = processor.process_batch()
+        assert stats['success'] == 2 and stats['errors'] == 1
+        
+        profile_file = next(processor.reports_dir.glob("profile_*.prof"))
+        functions = {func[2] for func in pstats.Stats(str(profile_file)).stats}
+        assert "parse_single_file" in functions
+        assert "Profilo aggregato di 3 file" in profile_file.with_suffix('.txt').read_text(encoding='utf-8')
+        print("✓ Profilo aggregato dei worker con riepilogo testuale")
+        
+        assert (processor.success_dir / "ddt_0_profile.prof").exists()
+        assert (processor.success_dir / "ddt_0_parsed.json").exists()
+        assert (processor.error_dir / "corrotto_0_profile.prof").exists()
+        print("✓ Profilo dei file oltre la soglia accanto al loro risultato")
+        
+        # Soglia alta, parsing seriale: solo l'aggregato
+        processor = BatchProcessor(input_dir, tmp / "seriale", use_cache=False, profile=True)
+        processor.process_batch()
+        assert not list(processor.success_dir.glob("*_profile.prof"))
+        assert list(processor.reports_dir.glob("profile_*.prof"))
+        print("✓ Sotto la soglia nessun profilo per file")
+    
+    print("\n✅ Test profiling passati!\n")
+
+
+def test_memory():
+    """Test misura della memoria per file e file più pesanti nei report"""
+    print("=== TEST MEMORIA PER FILE ===\n")
+    
+    import pandas as pd
+    from manifest import BatchManifest
+    from memory_usage import HeaviestFiles, MemoryMeter, heaviest
+    
+    with MemoryMeter() as meter:
+        blocco = bytearray(8 * 1024 * 1024)
+    misura = meter.as_dict()
+    assert misura['tracemalloc_picco'] >= len(blocco)
+    assert misura['rss_delta'] is None or misura['rss_delta'] >= 0
+    misure = [{'tracemalloc_picco': 1}, {'tracemalloc_picco': None, 'rss_delta': 5}, {'tracemalloc_picco': 3}]
+    assert [m['tracemalloc_picco'] for m in heaviest(misure, 2)] == [3, 1]
+    top = HeaviestFiles(3)
+    for picco in [5, 1, 9, 2, 7, 9, 3]:
+        top.add({'tracemalloc_picco': picco})
+        assert len(top._heap) <= 3
+    assert [m['tracemalloc_picco'] for m in top.items()] == [9, 9, 7]
+    print("✓ Picco tracemalloc di un blocco e ordinamento dei più pesanti")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=3, n_bad=1)
+        
+        processor = BatchProcessor(input_dir, tmp / "output", workers=2, use_cache=False,
+                                   memory=True, memory_top=2)
+        stats = processor.process_batch()
+        assert len(stats['memoria']) == 2
+        assert stats['memoria'][0]['tracemalloc_picco'] >= stats['memoria'][1]['tracemalloc_picco'] > 0
+        
+        records = list(BatchManifest(tmp / "output" / "manifest").iter_latest(processor.session))
+        assert len(records) == 4 and all(record['memoria']['tracemalloc_picco'] > 0 for record in records)
+        print("✓ Memoria misurata nei worker e registrata nel manifest, anche per gli errori")
+        
+        report = next(processor.reports_dir.glob("report_*.html")).read_text(encoding='utf-8')
+        assert "File con Più Memoria" in report and stats['memoria'][0]['file'] in report
+        excel = next(processor.reports_dir.glob("riepilogo_*.xlsx"))
+        assert len(pd.read_excel(excel, sheet_name='Memoria')) == 2
+        print("✓ File più pesanti nel report HTML e nel riepilogo Excel")
+        
+        # Senza misura: nessuna sezione e nessun campo nel manifest
+        processor = BatchProcessor(input_dir, tmp / "senza", use_cache=False)
+        stats = processor.process_batch()
+        assert stats['memoria'] == []
+        records = list(BatchManifest(tmp / "senza" / "manifest").iter_latest(processor.session))
+        assert not any('memoria' in record for record in records)
+        print("✓ Senza --memory nessuna misura")
+    
+    print("\n✅ Test memoria passati!\n")
+
+
+def _sleep_and_pid(seconds):
+    """Task di test: attende e restituisce il pid del worker"""
+    import os
+    import time
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _allocate(size):
+    """Task di test: alloca size byte"""
+    return len(bytearray(size))
+
+
+def _kill_self(signum):
+    """Task di test: il worker si invia il segnale signum"""
+    import os
+    import faulthandler
+    # Nessun dump dello stack sul terminale (faulthandler è attivo sotto pytest)
+    faulthandler.disable()
+    os.kill(os.getpid(), signum)
+
+
+def test_supervised_pool():
+    """Test pool supervisionato: timeout, limite di memoria e riciclo dei worker"""
+    print("=== TEST POOL SUPERVISIONATO ===\n")
+    
+    import time
+    from worker_pool import (SupervisedPool, WorkerFailure, FAILURE_CRASH, FAILURE_MEMORY, FAILURE_TIMEOUT,
+                             iter_supervised_results, resource)
+    
+    start = time.time()
+    outcomes = dict(iter_supervised_results(_sleep_and_pid, [0.05, 30, 0.1], 2, timeout=1))
+    assert time.time() - start < 10, "Il task bloccato non è stato interrotto"
+    assert isinstance(outcomes[30], WorkerFailure) and outcomes[30].kind == FAILURE_TIMEOUT
+    assert outcomes[30].elapsed >= 1
+    assert all(isinstance(outcomes[s], int) for s in (0.05, 0.1))
+    print("✓ Task oltre il timeout interrotto, gli altri completati")
+    
+    with SupervisedPool(_sleep_and_pid, 1, max_tasks=2) as pool:
+        pids = []
+        for _ in range(4):
+            pool.submit(0)
+            pids.extend(result for _, result in pool.collect())
+        assert pids[0] == pids[1] and pids[1] != pids[2] and pids[2] == pids[3]
+        assert pool.replaced == 2
+    print("✓ Worker sostituito dopo max_tasks task")
+    
+    # Con un limite di memoria un crash nel codice nativo resta un crash
+    import signal
+    outcomes = dict(iter_supervised_results(_kill_self, [signal.SIGSEGV, signal.SIGABRT], 1,
+                                            memory_limit=1024 ** 4))
+    assert outcomes[signal.SIGSEGV].kind == FAILURE_CRASH, outcomes[signal.SIGSEGV]
+    assert "SIGSEGV" in outcomes[signal.SIGSEGV].message
+    assert outcomes[signal.SIGABRT].kind == FAILURE_MEMORY, outcomes[signal.SIGABRT]
+    print("✓ Worker morto per SIGSEGV registrato come crash, per SIGABRT come memoria")
+    
+    if resource is None or not Path("/proc/self/status").exists():
+        print("⚠️  RLIMIT_AS non verificabile su questa piattaforma, test saltato\n")
+    else:
+        with open("/proc/self/status") as f:
+            vm_size = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmSize"))
+        limit = vm_size + 256 * 1024 * 1024
+        outcomes = dict(iter_supervised_results(_allocate, [1024, 2 * 1024 ** 3], 1, memory_limit=limit))
+        assert outcomes[1024] == 1024
+        assert isinstance(outcomes[2 * 1024 ** 3], WorkerFailure)
+        assert outcomes[2 * 1024 ** 3].kind == FAILURE_MEMORY
+        print("✓ Allocazione oltre RLIMIT_AS registrata come errore di memoria")
+    
+    print("\n✅ Test pool supervisionato passati!\n")
+
+
+def test_file_limits():
+    """Test timeout per file e riciclo dei worker"""
+    print("=== TEST LIMITI PER FILE ===\n")
+    
+    from manifest import BatchManifest
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = _prepare_input(tmp, n_ok=2, n_bad=0)
+        
+        # Timeout irraggiungibile, anche con un solo worker: ogni file viene interrotto
+        processor = BatchProcessor(input_dir, tmp / "output", use_cache=False, file_timeout=0.001)
+        stats = processor.process_batch()
+        assert stats['errors'] == 2 and stats['by_limite'] == {'timeout': 2}
+        error_text = (processor.error_dir / "ddt_0_error.txt").read_text(encoding='utf-8')
+        assert "Limite superato: timeout" in error_text
+        records = list(BatchManifest(tmp / "output" / "manifest").iter_latest(processor.session))
+        assert all(record['riga']['limite'] == 'timeout' for record in records)
+        assert 'ddt_batch_limit_errors_total{limite="timeout"} 2.0' in processor.metrics.render()
+        print("✓ File oltre il timeout registrati come errore di timeout")
+        
+        # Riciclo dopo ogni file: stessi risultati del pool normale
+        processor = BatchProcessor(input_dir, tmp / "riciclo", workers=2, use_cache=False,
+                                   max_files_per_worker=1)
+        stats = processor.process_batch()
+        assert stats['success'] == 2 and stats['by_limite'] == {}
+        print("✓ Worker riciclati dopo ogni file senza perdere risultati")
+    
+    print("\n✅ Test limiti per file passati!\n")
+
+
+def test_watch_daemon():
+    """Test modalità demone su cartella sorvegliata"""
+    print("=== TEST DEMONE WATCH-FOLDER ===\n")
+    
+    import time
+    import threading
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        template = create_test_ddt_pdf(str(tmp / "template.pdf"))
+        input_dir = tmp / "input"
+        input_dir.mkdir()
+        
+        processor = BatchProcessor(input_dir, tmp / "output", workers=2, use_cache=False)
+        daemon = WatchDaemon(processor, poll_interval=0.1, debounce=0.2, stats_interval=0.5)
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        
+        try:
+            shutil.copy(template, input_dir / "arrivato_1.pdf")
+            (input_dir / "corrotto.pdf").write_text("non è un PDF")
+            
+            deadline = time.time() + 30
+            while processor.stats['total_files'] < 2 and time.time() < deadline:
+                time.sleep(0.1)
+        finally:
+            daemon.stop()
+            thread.join(timeout=30)
+            
+        assert not thread.is_alive(), "Il demone non si è arrestato"
+        assert processor.stats['success'] == 1 and processor.stats['errors'] == 1
+        assert (processor.success_dir / "arrivato_1_parsed.json").exists()
+        assert daemon.stats_file.exists(), "Statistiche mobili non scritte"
+        assert daemon.rolling.summary()['file'] == 2
+        print("✓ Nuovi file elaborati e statistiche mobili aggiornate")
+    
+    print("\n✅ Test demone passati!\n")
+
+
+def run_all_tests():
+    """Esegue tutti i test"""
+    print("🧪 ESECUZIONE TEST BATCH PROCESSOR\n")
+    
+    try:
+        test_parallel_batch()
+        test_max_files()
+        test_resume()
+        test_re_extract()
+        test_header_only()
+        test_split_documents()
+        test_stage_report()
+        test_metrics()
+        test_profile()
+        test_memory()
+        test_supervised_pool()
+        test_file_limits()
+        test_watch_daemon()
+        
+        print("\n✅ ✅ ✅ TUTTI I TEST PASSATI! ✅ ✅ ✅\n")
+        return 0
+    
+    except AssertionError as e:
+        print(f"\n❌ TEST FALLITO: {e}\n")
+        return 1
+    except Exception as e:
+        print(f"\n❌ ERRORE INATTESO: {e}\n")
+        import traceback
+        traceback.print_exc()
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -6,7 +6,7 @@ Script di test per il parser DDT/Fatture
 import sys
 import json
 from pathlib import Path
-from ddt_fatture_parser import DDTFattureParser, Documento
+from ddt_fatture_parser import DDTFattureParser, Documento, Articolo
 
 def test_single_document():
     """Test parsing singolo documento"""
@@ -100,6 +100,859 @@ def test_error_handling():
     print("\n✅ Test gestione errori passati!\n")
 
 
+def test_parallel_processing():
+    """Test elaborazione parallela con pool di processi"""
+    print("=== TEST ELABORAZIONE PARALLELA ===\n")
+    
+    parser = DDTFattureParser()
+    
+    # File non esistenti: gli errori devono mantenere l'ordine di input
+    file_paths = [f"mancante_{i}.pdf" for i in range(6)]
+    results, errors = parser.process_multiple_files(file_paths, workers=3)
+    assert len(results) == 0, "Non dovrebbero esserci risultati"
+    assert [e['file'] for e in errors] == file_paths, "Ordine errori non rispettato"
+    assert all('Traceback' in e['traceback'] for e in errors), "Traceback mancante"
+    print("✓ Ordine e traceback degli errori preservati")
+    
+    # Stesso contratto della modalità seriale
+    serial_results, serial_errors = parser.process_multiple_files(file_paths)
+    assert [e['error'] for e in serial_errors] == [e['error'] for e in errors]
+    print("✓ Risultati identici alla modalità seriale")
+    
+    # Generatore: risultati in streaming, anche fuori ordine
+    streamed = parser.iter_parse((p for p in file_paths), workers=2, ordered=False, max_in_flight=2)
+    outcomes = dict(streamed)
+    assert sorted(str(p) for p in outcomes) == sorted(file_paths)
+    assert all(isinstance(o, dict) and o['file'] == str(p) for p, o in outcomes.items())
+    print("✓ iter_parse restituisce (percorso, errore) per ogni file")
+    
+    print("\n✅ Test elaborazione parallela passati!\n")
+
+
+def test_parse_cache():
+    """Test cache persistente dei risultati"""
+    print("=== TEST CACHE PARSING ===\n")
+    
+    import tempfile
+    from dataclasses import asdict
+    from parse_cache import ParseCache, file_digest
+    from ddt_fatture_parser import parser_version
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ParseCache(Path(tmp) / "cache.sqlite", max_bytes=2000)
+        
+        # Un contenuto in cache viene restituito senza aprire il PDF
+        fake_pdf = Path(tmp) / "non_un_pdf.pdf"
+        fake_pdf.write_text("contenuto non PDF")
+        doc = Documento(tipo="DDT", numero="42")
+        doc.articoli.append(Articolo(codice="A1", importo=10.0))
+        cache.put(file_digest(fake_pdf), parser_version(), asdict(doc))
+        
+        parser = DDTFattureParser(cache=cache)
+        cached = parser.parse_single_file(fake_pdf)
+        assert cached.numero == "42", "Documento non recuperato dalla cache"
+        assert isinstance(cached.articoli[0], Articolo), "Articoli non ricostruiti"
+        assert cached.file_origine == str(fake_pdf)
+        print("✓ Documento recuperato dalla cache")
+        
+        # Le letture non scrivono: l'ultimo accesso si registra con flush (o close)
+        changes = cache.conn.total_changes
+        for _ in range(5):
+            assert cache.get(file_digest(fake_pdf), parser_version()) is not None
+        assert cache.conn.total_changes == changes, "Scrittura sul database a ogni lettura"
+        cache.flush()
+        assert cache.conn.total_changes == changes + 1
+        print("✓ Ultimi accessi scritti a blocchi, non a ogni lettura")
+        
+        # Eviction LRU: la voce meno usata di recente viene rimossa
+        for i in range(20):
+            cache.put(f"digest_{i}", "v", {'payload': 'x' * 100})
+        assert cache.get("digest_0", "v") is None, "Eviction LRU non applicata"
+        assert cache.get("digest_19", "v") is not None
+        assert cache.stats()['size_bytes'] <= 2000
+        print("✓ Eviction LRU rispetta la dimensione massima")
+        
+        # Invalidazione delle versioni obsolete
+        removed = cache.invalidate(keep_version=parser_version())
+        assert removed > 0 and set(cache.stats()['versions']) <= {parser_version()}
+        print("✓ Invalidazione versioni obsolete OK")
+        cache.close()
+    
+    print("\n✅ Test cache passati!\n")
+
+
+def test_lazy_tables():
+    """Test estrazione tabelle solo quando gli articoli dal testo non tornano"""
+    print("=== TEST TABELLE SU RICHIESTA ===\n")
+    
+    from ddt_fatture_parser import RawPage, ESTRAZIONE_TESTO, ESTRAZIONE_TABELLE
+    
+    parser = DDTFattureParser()
+    intestazione = "DOCUMENTO DI TRASPORTO N. 1\nCodice Descrizione UM Qta Prezzo Sconto Importo IVA\n"
+    righe = "001 PASTA FRESCA PZ 10 1,00 0,00 10,00 10\n002 GNOCCHI PZ 5 2,00 0,00 10,00 10\n"
+    richieste = []
+    
+    def load_tables(page_numbers):
+        richieste.append(list(page_numbers))
+        tabella = [["Codice", "Descrizione", "Quantità", "Importo"],
+                   ["001", "PASTA FRESCA", "10", "10,00"],
+                   ["002", "GNOCCHI", "5", "10,00"],
+                   ["003", "RAVIOLI", "2", "5,00"]]
+        return {page_num: [tabella] for page_num in page_numbers}
+    
+    # Somma degli importi uguale al totale: nessuna tabella estratta
+    pages = [RawPage(text="Intestazione"), RawPage(text=intestazione + righe + "Totale documento: 20,00")]
+    doc = parser.parse_raw_pages(pages, "testo.pdf", load_tables)
+    assert doc.estrazione_articoli == ESTRAZIONE_TESTO and len(doc.articoli) == 2
+    assert not richieste and all(page.tables is None for page in pages)
+    print("✓ Articoli dal testo verificati con il totale")
+    
+    # Totale diverso: tabelle estratte solo per la pagina con intestazione articoli
+    pages = [RawPage(text="Intestazione"), RawPage(text=intestazione + righe + "Totale documento: 25,00")]
+    doc = parser.parse_raw_pages(pages, "tabelle.pdf", load_tables)
+    assert richieste == [[1]], f"Pagine estratte: {richieste}"
+    assert doc.estrazione_articoli == ESTRAZIONE_TABELLE and len(doc.articoli) == 3
+    assert pages[0].tables is None and pages[1].tables
+    print("✓ Tabelle estratte solo per le pagine con intestazione articoli")
+    
+    # Tabelle già presenti (es. cache grezza): nessuna nuova estrazione
+    doc = parser.parse_raw_pages(pages, "tabelle.pdf", load_tables)
+    assert richieste == [[1]] and doc.estrazione_articoli == ESTRAZIONE_TABELLE
+    print("✓ Tabelle in cache riusate")
+    
+    print("\n✅ Test tabelle su richiesta passati!\n")
+
+
+def test_streaming_export():
+    """Test export in streaming (JSON, JSON Lines, CSV, gzip)"""
+    print("=== TEST EXPORT IN STREAMING ===\n")
+    
+    import csv
+    import gzip
+    import tempfile
+    from dataclasses import asdict
+    
+    parser = DDTFattureParser()
+    doc_articoli = Documento(tipo="DDT", numero="1", totale=30.0)
+    doc_articoli.articoli.append(Articolo(codice="A1", quantita=2.0, importo=10.0))
+    doc_articoli.articoli.append(Articolo(codice="A2", quantita=1.0, importo=20.0))
+    documenti = [doc_articoli, Documento(tipo="FATTURA", numero="2")]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        
+        # JSON: stesso contenuto del json.dump precedente, anche da un generatore
+        count = parser.save_results((doc for doc in documenti), tmp / "out.json", 'json')
+        assert count == 2
+        expected = json.dumps([asdict(doc) for doc in documenti], ensure_ascii=False, indent=2)
+        assert (tmp / "out.json").read_text(encoding='utf-8') == expected, "JSON diverso da json.dump"
+        parser.save_results([], tmp / "vuoto.json", 'json')
+        assert json.loads((tmp / "vuoto.json").read_text(encoding='utf-8')) == []
+        print("✓ JSON scritto un documento alla volta")
+        
+        # JSON Lines compresso: un documento per riga
+        parser.save_results(documenti, tmp / "out.jsonl.gz", 'jsonl')
+        with gzip.open(tmp / "out.jsonl.gz", 'rt', encoding='utf-8') as f:
+            righe = [json.loads(line) for line in f]
+        assert [r['numero'] for r in righe] == ["1", "2"]
+        print("✓ JSON Lines gzip OK")
+        
+        # CSV: una riga per articolo, una per documento senza articoli
+        parser.save_results(documenti, tmp / "out.csv", 'csv', compress=True)
+        with gzip.open(tmp / "out.csv", 'rt', encoding='utf-8-sig') as f:
+            righe = list(csv.DictReader(f))
+        assert [r['articolo_codice'] for r in righe] == ["A1", "A2", ""]
+        assert righe[0]['numero'] == "1" and righe[2]['tipo'] == "FATTURA"
+        print("✓ CSV per articolo OK")
+        
+        try:
+            parser.save_results(documenti, tmp / "out.xml", 'xml')
+            assert False, "Formato non supportato accettato"
+        except ValueError:
+            print("✓ Formato non supportato rifiutato")
+        
+        # Un writer senza _write non si può istanziare (prima di creare il file)
+        from export_writers import DocumentWriter
+        
+        class SenzaFormato(DocumentWriter):
+            pass
+        
+        try:
+            SenzaFormato(tmp / "out.txt")
+            assert False, "Writer senza _write istanziato"
+        except TypeError:
+            assert not (tmp / "out.txt").exists()
+            print("✓ Writer incompleto rifiutato alla creazione")
+    
+    print("\n✅ Test export passati!\n")
+
+
+def test_parquet_export():
+    """Test export Parquet su tabelle documenti/articoli"""
+    print("=== TEST EXPORT PARQUET ===\n")
+    
+    import tempfile
+    from datetime import date
+    
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("⚠️  pyarrow non installato, test saltato\n")
+        return
+        
+    from export_writers import ParquetWriter
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "out.parquet"
+        with ParquetWriter(output, row_group_size=2) as writer:
+            for i in range(5):
+                doc = Documento(tipo="DDT", numero=str(i), data="15/03/2024", totale=10.0 * i)
+                doc.fornitore.nome = "Fornitore"
+                doc.articoli.append(Articolo(codice=f"A{i}", quantita=1.0, importo=10.0 * i))
+                writer.write(doc)
+            writer.write(Documento(tipo="FATTURA", numero="99", data="non valida"))
+            
+        documenti = pq.read_table(writer.documenti_path)
+        articoli = pq.read_table(writer.articoli_path)
+        assert documenti.num_rows == 6 and articoli.num_rows == 5
+        assert pq.ParquetFile(writer.documenti_path).num_row_groups == 3, "Row group non a blocchi"
+        print("✓ Tabelle scritte a row group")
+        
+        assert documenti.column('data')[0].as_py() == date(2024, 3, 15)
+        assert documenti.column('data')[5].as_py() is None
+        assert str(documenti.schema.field('totale').type) == 'double'
+        print("✓ Colonne tipizzate (date, importi)")
+        
+        righe = articoli.column('documento_id').to_pylist()
+        assert righe == [0, 1, 2, 3, 4], "Chiave documento errata"
+        assert articoli.column('codice').to_pylist()[3] == "A3"
+        
+        metadata = pq.ParquetFile(writer.documenti_path).metadata.row_group(0)
+        encodings = {metadata.column(i).path_in_schema: metadata.column(i).encodings
+                     for i in range(metadata.num_columns)}
+        assert any('DICTIONARY' in e for e in encodings['fornitore_nome'])
+        assert not any('DICTIONARY' in e for e in encodings['numero'])
+        print("✓ Articoli collegati e fornitore/cliente a dizionario")
+    
+    print("\n✅ Test export Parquet passati!\n")
+
+
+def test_field_scanner():
+    """Test scanner dei campi: stessi risultati delle cascate di pattern"""
+    print("=== TEST SCANNER CAMPI ===\n")
+    
+    from field_scanner import compile_case_stable
+    
+    parser = DDTFattureParser()
+    testi = [
+        "ddt n. 1234 del 15/03/2024 p.iva 01234567890 agente: 12 mario rossi "
+        "vettore: brt spa totale documento € 1.234,56",
+        "fattura n° 77 data 01-02-24 partita iva 09876543210 rappresentante 3 bianchi "
+        "trasportatore: dhl importo totale 99,90 totale 10",
+        "Fattura N. 5 Del 3/6/2025 P.IVA 11111111111 Totale € 12,00",  # non normalizzato
+        "nessun campo riconoscibile ſ ı"
+    ]
+    
+    for testo in testi:
+        fields = parser.scanner.scan(testo)
+        tipo = parser._identify_document_type(testo.lower(), parser.scanner.scan(testo.lower()))
+        assert tipo == parser._identify_document_type(testo)
+        for name, patterns in [('numero', parser.patterns.NUMERO_DOCUMENTO),
+                               ('data', parser.patterns.DATA),
+                               ('piva', parser.patterns.PARTITA_IVA),
+                               ('vettore', parser.patterns.VETTORE),
+                               ('totale', parser.patterns.TOTALE)]:
+            atteso = parser._extract_field(testo, patterns, name)
+            assert parser._field_value(fields, name, name) == atteso, f"{name}: {testo}"
+        assert parser._extract_agente(testo, fields) == parser._extract_agente(testo)
+        
+    print("✓ Risultati identici alla cascata, anche su testo non normalizzato")
+    
+    # Senza i moduli interni di re (o con una struttura diversa) i flag restano invariati
+    import re
+    import field_scanner
+    assert not compile_case_stable(r'ddt\s*n', re.IGNORECASE).flags & re.IGNORECASE
+    original = field_scanner.sre_parse
+    try:
+        field_scanner.sre_parse = None
+        assert compile_case_stable(r'ddt\s*n', re.IGNORECASE).flags & re.IGNORECASE
+        field_scanner.sre_parse = type('Parser', (), {'parse': staticmethod(lambda *args: [(object(),)])})
+        assert compile_case_stable(r'ddt\s*n', re.IGNORECASE).flags & re.IGNORECASE
+    finally:
+        field_scanner.sre_parse = original
+    print("✓ IGNORECASE mantenuto se l'analisi del pattern non è disponibile")
+    print("\n✅ Test scanner passati!\n")
+
+
+def test_text_view():
+    """Test vista condivisa del testo"""
+    print("=== TEST TEXT VIEW ===\n")
+    
+    from text_view import TextView
+    
+    testo = "ACME S.R.L.\nVia Roma 1\n\nCliente: Rossi Mario\nP.IVA 01234567890\n  \nTotale 10,00"
+    view = TextView(testo)
+    
+    assert view.lines == testo.split('\n') and view.line_count == len(view.lines)
+    for start, end in [(0, len(testo)), (5, 30), (12, 12), (25, 500)]:
+        assert view.lines_between(start, end) == testo[start:end].split('\n'), (start, end)
+    print("✓ Righe e intervalli come split('\\n')")
+    
+    pos = testo.find("P.IVA")
+    atteso = testo[:pos].strip().split('\n')[-3:]
+    assert view.lines_before(pos, 3) == atteso
+    assert view.lines_before(len(testo) - 13, 2) == testo[:len(testo) - 13].strip().split('\n')[-2:]
+    print("✓ Righe precedenti una posizione")
+    
+    assert view.first('cliente') == testo.lower().find('cliente')
+    assert view.first('iva') == pos + 2 and view.has('p.iva') and not view.has('agente')
+    assert view.first('totale', view.first('cliente')) == testo.lower().find('totale')
+    assert view.find('rossi mario') == testo.lower().find('rossi mario')
+    assert not view.case_stable and TextView(testo.lower()).case_stable
+    print("✓ Parole chiave indicizzate")
+    
+    parser = DDTFattureParser()
+    normalizzato = parser._normalize_text(testo)
+    assert parser._extract_cliente(TextView(normalizzato)) == parser._extract_cliente(normalizzato)
+    assert parser._extract_fornitore(TextView(testo)) == parser._extract_fornitore(testo)
+    print("✓ Estrattori identici con stringa o vista")
+    
+    print("\n✅ Test text view passati!\n")
+
+
+def test_keyword_locator():
+    """Test localizzazione parole chiave e ricerca delle sezioni a finestra"""
+    print("=== TEST KEYWORD LOCATOR ===\n")
+    
+    import re
+    import keyword_locator
+    from keyword_locator import KeywordLocator
+    from text_view import TextView
+    from ddt_fatture_parser import CLIENTE_SECTION, CLIENTE_TERMINATORS, ARTICOLI_SECTION
+    
+    testo = "p.iva 1 iva viavia codice descrizione totale note"
+    parole = ['iva', 'p.iva', 'via', 'codice', 'totale', 'note']
+    attese = {k: [m.start() for m in re.finditer(f"(?={re.escape(k)})", testo)] for k in parole}
+    assert KeywordLocator(parole).locate(testo) == attese
+    
+    # Stesso risultato anche senza pyahocorasick (ripiego su regex)
+    ahocorasick = keyword_locator.ahocorasick
+    keyword_locator.ahocorasick = None
+    try:
+        assert KeywordLocator(parole).locate(testo) == attese
+    finally:
+        keyword_locator.ahocorasick = ahocorasick
+    print("✓ Occorrenze sovrapposte trovate in una passata")
+    
+    parser = DDTFattureParser()
+    casi = [
+        "cliente: rossi srl\nvia roma 1\np.iva 01234567890",
+        "cliente via x via y",
+        "cliente:via",
+        "cliente rossi senza terminatore",
+        "codice articolo\ncodice descrizione\n001 pasta pz 1 1,00 0 1,00 10\ntotale 1,00",
+        "codice descrizione senza fine",
+        "codice  descrizione\nnote",
+        ""
+    ]
+    for caso in casi:
+        view = TextView(caso)
+        atteso = ARTICOLI_SECTION.search(caso)
+        trovato = parser._find_articoli_section(view)
+        assert (trovato and trovato.span()) == (atteso and atteso.span()), caso
+        
+        atteso = CLIENTE_SECTION.search(caso)
+        trovato = None
+        start = view.first('cliente')
+        if start >= 0:
+            end = view.section_window(start + len('cliente'), CLIENTE_TERMINATORS)
+            if end is not None:
+                trovato = CLIENTE_SECTION.match(caso, start, end)
+        assert (trovato and trovato.groups()) == (atteso and atteso.groups()), caso
+    print("✓ Sezioni cliente e articoli identiche alla ricerca su tutto il testo")
+    
+    print("\n✅ Test keyword locator passati!\n")
+
+
+def test_page_layout():
+    """Test testo e tabelle derivati da un'unica analisi della pagina"""
+    print("=== TEST PAGE LAYOUT ===\n")
+    
+    import tempfile
+    import pdfplumber
+    from page_layout import PageLayout
+    
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = Path(tmp) / "tabella.pdf"
+        c = canvas.Canvas(str(pdf_path), pagesize=A4)
+        c.setFont("Helvetica", 9)
+        c.drawString(50, 800, "DOCUMENTO DI TRASPORTO N. 1234")
+        xs, ys = [50, 120, 330, 400, 480], [760 - 20 * i for i in range(6)]
+        c.grid(xs, ys)
+        righe = [["Codice", "Descrizione", "Q.tà", "Importo"],
+                 ["001", "PASTA FRESCA", "10", "10,00"],
+                 ["002", "GNOCCHI DI PATATE", "5", "7,50"],
+                 ["003", "", "2", "3,00"]]
+        for r, riga in enumerate(righe):
+            for col, valore in enumerate(riga):
+                c.drawString(xs[col] + 3, ys[r] - 14, valore)
+        # Parola che attraversa il bordo tra due celle
+        c.drawString(xs[2] - 20, ys[4] - 14, "ATTRAVERSA")
+        c.drawString(50, 600, "Totale documento: 20,50")
+        c.save()
+        
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                layout = PageLayout(page)
+                assert layout.extract_text() == page.extract_text()
+                tabelle = layout.extract_tables()
+                assert tabelle == page.extract_tables(), tabelle
+                assert tabelle and tabelle[0][2][1] == "GNOCCHI DI PATATE"
+    print("✓ Testo e tabelle identici a pdfplumber")
+    
+    print("\n✅ Test page layout passati!\n")
+
+
+def test_supplier_layouts():
+    """Test registro dei layout fornitore e instradamento sull'estrattore dedicato"""
+    print("=== TEST LAYOUT FORNITORI ===\n")
+    
+    from ddt_fatture_parser import RawPage, ESTRAZIONE_TESTO
+    from supplier_layouts import A4, AlfieriLayout, DocumentFingerprint, LayoutRegistry, SupplierLayout, fold_text
+    
+    testo = """ALFIERI SPECIALITA' ALIMENTARI S.P.A.
+C.so G. Marconi 10/E - 12050 MAGLIANO ALFIERI (CN)
+P.IVA E C.F. 03247720042
+Documento di trasporto
+5023 3/06/25 1 20322 DONAC S.R.L.
+VIA MARGARITA, 8 LOC. TETTO GARETTO
+12100 - CUNEO CN
+P.IVA: 04064060041
+Agente: 507 SAFFIRIO FLAVIO
+Vettore: S.A.F.I.M. S.P.A
+060041 AGNOLOTTI BRASATO CARNE LC 250 G PZ 120 1,9000 15,00 193,80 10
+070017 PASTA SFOGLIA ROTONDA 230 GR PZ 48 2,1000 10,00 90,72 10
+Totale documento €: 284,52"""
+    
+    registry = LayoutRegistry([AlfieriLayout()])
+    assert registry.match(DocumentFingerprint.from_page(testo, *A4)).name == "alfieri"
+    assert registry.match(DocumentFingerprint.from_page(testo)).name == "alfieri"
+    assert registry.match(DocumentFingerprint.from_page(testo, 612, 792)).name == "alfieri"
+    assert registry.match(DocumentFingerprint.from_page("Fattura n. 1\nP.IVA 01234567890")) is None
+    print("✓ Impronta: P.IVA e intestazione, con qualsiasi formato pagina")
+    
+    # Ragione sociale con la lettera accentata invece dell'apostrofo
+    accentato = testo.replace("SPECIALITA'", "SPECIALITÀ")
+    assert fold_text("SPECIALITÀ D\u2019ALBA") == fold_text("specialita' d'alba") == "specialita dalba"
+    assert registry.match(DocumentFingerprint.from_page(accentato, 612, 792)).name == "alfieri"
+    
+    class AlfieriA4(AlfieriLayout):
+        header_tokens = ("alfieri specialita' alimentari",)
+        page_size = A4
+    
+    formato = LayoutRegistry([AlfieriA4()])
+    assert formato.match(DocumentFingerprint.from_page(accentato, *A4)).name == "alfieri"
+    assert formato.match(DocumentFingerprint.from_page(testo, 612, 792)) is None
+    print("✓ Impronta senza distinzione di accenti e apostrofi, formato pagina se dichiarato")
+    
+    parser = DDTFattureParser()
+    doc = parser.parse_raw_pages([RawPage(text=testo, width=A4[0], height=A4[1])], "alfieri.pdf")
+    assert doc.layout == "alfieri"
+    assert (doc.numero, doc.data, doc.tipo) == ("5023", "03/06/2025", "DDT")
+    assert (doc.cliente.nome, doc.cliente.codice, doc.cliente.piva) == ("DONAC S.R.L.", "20322", "04064060041")
+    assert (doc.cliente.cap, doc.cliente.citta, doc.cliente.provincia) == ("12100", "CUNEO", "CN")
+    assert doc.fornitore.piva == "03247720042" and doc.agente.codice == "507"
+    assert [a.codice for a in doc.articoli] == ["060041", "070017"] and doc.totale == 284.52
+    assert doc.estrazione_articoli == ESTRAZIONE_TESTO
+    print("✓ Layout riconosciuto: estrattore dedicato")
+    
+    # Formato pagina diverso da quello del layout: parser generico, con la P.IVA del fornitore esclusa
+    doc = DDTFattureParser(layouts=formato).parse_raw_pages([RawPage(text=testo, width=612, height=792)],
+                                                            "altro.pdf")
+    assert doc.layout == "" and doc.cliente.piva != "03247720042"
+    print("✓ Layout sconosciuto: parser generico")
+    
+    # Un nuovo fornitore si aggiunge registrando il suo layout
+    class RossiLayout(SupplierLayout):
+        name = "rossi"
+        piva = "01234567890"
+        header_tokens = ("rossi",)
+        fornitore = {'nome': "ROSSI SRL", 'piva': "01234567890"}
+        
+        def extract(self, lines):
+            return {'tipo': 'FATTURA', 'numero': lines[1].split()[-1]}
+    
+    registry.register(RossiLayout())
+    
+    class SenzaEstrattore(SupplierLayout):
+        name = "incompleto"
+    
+    try:
+        SenzaEstrattore()
+        assert False, "Un layout senza extract non deve essere istanziabile"
+    except TypeError:
+        pass
+    assert registry.supplier_pivas == {"03247720042", "01234567890"}
+    doc = DDTFattureParser(layouts=registry).parse_raw_pages(
+        [RawPage(text="ROSSI SRL P.IVA 01234567890\nFattura n. 77")], "rossi.pdf"
+    )
+    assert (doc.layout, doc.numero, doc.fornitore.nome) == ("rossi", "77", "ROSSI SRL")
+    print("✓ Registrazione di un nuovo layout")
+    
+    print("\n✅ Test layout fornitori passati!\n")
+
+
+def test_layout_regions():
+    """Test intestazione estratta dalle sole regioni ritagliate del layout"""
+    print("=== TEST REGIONI LAYOUT ===\n")
+    
+    import io
+    import tempfile
+    from contextlib import redirect_stdout
+    from ddt_parser_enhanced import DDTParser
+    from supplier_layouts import AlfieriLayout, LAST_PAGE, LayoutRegistry, Region, mm_bbox
+    
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        from create_test_pdf import create_test_ddt_pdf
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    # Aree misurate sul DDT di create_test_pdf.py: il cliente a sinistra del luogo di consegna (da 100mm)
+    class AlfieriRegioni(AlfieriLayout):
+        regions = (
+            Region('intestazione', mm_bbox(0, 50, 210, 88)),
+            Region('cliente', mm_bbox(0, 88, 100, 120)),
+            Region('trasporto', mm_bbox(0, 120, 210, 140)),
+            Region('totali', mm_bbox(0, 165, 210, 297), LAST_PAGE)
+        )
+    layouts = LayoutRegistry([AlfieriRegioni()])
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = str(Path(tmp) / "alfieri.pdf")
+        with redirect_stdout(io.StringIO()):
+            create_test_ddt_pdf(pdf_path)
+        
+        # Layout senza regioni (Alfieri predefinito): nessuna estrazione per regioni
+        assert DDTFattureParser().parse_header(pdf_path) is None
+        
+        doc = DDTFattureParser(layouts=layouts).parse_header(pdf_path)
+        assert doc.layout == "alfieri" and (doc.numero, doc.data) == ("5023", "03/06/2025")
+        # Il ritaglio separa il cliente dal luogo di consegna sulla stessa riga
+        assert doc.cliente.indirizzo == "VIA MARGARITA, 8 LOC. TETTO GARETTO", doc.cliente.indirizzo
+        assert (doc.cliente.cap, doc.cliente.citta, doc.cliente.piva) == ("12100", "CUNEO", "04064060041")
+        assert doc.totale == 325.37 and doc.articoli == []
+        print("✓ Intestazione e totale dalle regioni della prima e dell'ultima pagina")
+        
+        # Parsing completo: l'intestazione viene dal testo già estratto, senza ritagli
+        for parser in (DDTFattureParser(), DDTFattureParser(layouts=layouts)):
+            doc = parser.parse_single_file(pdf_path)
+            assert doc.layout == "alfieri" and len(doc.articoli) == 3
+            assert doc.cliente.indirizzo == "VIA MARGARITA, 8 LOC. TETTO GARETTO", doc.cliente.indirizzo
+            assert (doc.cliente.cap, doc.cliente.citta) == ("12100", "CUNEO")
+            assert 'regioni' not in doc.metriche['tempi']
+        print("✓ Parsing completo: indirizzo del cliente senza il luogo di consegna, regioni non lette")
+        
+        for parser in (DDTParser(debug=False), DDTParser(debug=False, layouts=layouts)):
+            result = parser.parse_pdf(pdf_path)
+            assert result['data']['indirizzo_cliente'] == "VIA MARGARITA, 8 LOC. TETTO GARETTO 12100 - CUNEO CN"
+        print("✓ DDTParser legge l'intestazione dalle regioni o dal testo della pagina")
+        
+        # Regioni che non contengono l'intestazione (es. intestazione più alta): testo completo
+        class AlfieriSpostato(AlfieriLayout):
+            regions = (Region('cliente', mm_bbox(0, 250, 100, 260)),)
+        parser = DDTFattureParser(layouts=LayoutRegistry([AlfieriSpostato()]))
+        assert parser.parse_header(pdf_path) is None
+        doc = parser.parse_single_file(pdf_path, mode="header")
+        assert (doc.layout, doc.numero) == ("alfieri", "5023")
+        print("✓ Regioni senza numero o cliente: intestazione dal testo completo")
+        
+        # Layout sconosciuto: nessuna regione da leggere
+        altro_path = str(Path(tmp) / "altro.pdf")
+        c = canvas.Canvas(altro_path, pagesize=A4)
+        c.drawString(50, 800, "Fattura n. 77 - P.IVA 01234567890")
+        c.save()
+        assert DDTFattureParser().parse_header(altro_path) is None
+        print("✓ Layout sconosciuto: nessuna estrazione per regioni")
+    
+    print("\n✅ Test regioni layout passati!\n")
+
+
+def test_header_mode():
+    """Test modalità sola intestazione: prima e ultima pagina, senza tabelle né articoli"""
+    print("=== TEST MODALITÀ INTESTAZIONE ===\n")
+    
+    import io
+    import tempfile
+    from contextlib import redirect_stdout
+    from ddt_fatture_parser import MODE_FULL, MODE_HEADER
+    
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        from create_test_pdf import create_test_ddt_pdf
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = str(Path(tmp) / "alfieri.pdf")
+        with redirect_stdout(io.StringIO()):
+            create_test_ddt_pdf(pdf_path)
+        
+        parser = DDTFattureParser()
+        completo = parser.parse_single_file(pdf_path)
+        intestazione = parser.parse_single_file(pdf_path, mode=MODE_HEADER)
+        assert len(completo.articoli) == 3 and intestazione.articoli == []
+        for campo in ('tipo', 'numero', 'data', 'totale'):
+            assert getattr(intestazione, campo) == getattr(completo, campo), campo
+        assert intestazione.cliente.nome == completo.cliente.nome == "DONAC S.R.L."
+        print("✓ Stessi campi d'intestazione della modalità completa, senza articoli")
+        
+        # Layout sconosciuto su più pagine: parser generico su prima e ultima pagina
+        altro_path = str(Path(tmp) / "altro.pdf")
+        c = canvas.Canvas(altro_path, pagesize=A4)
+        c.drawString(50, 800, "DDT N. 1234 Del 05/03/2024")
+        c.showPage()
+        c.drawString(50, 800, "001 PAGINA INTERMEDIA")
+        c.showPage()
+        c.drawString(50, 800, "Totale documento: 20,50")
+        c.save()
+        doc = DDTFattureParser(mode=MODE_HEADER).parse_single_file(altro_path)
+        assert (doc.numero, doc.totale, doc.layout) == ("1234", 20.5, ""), (doc.numero, doc.totale)
+        assert doc.articoli == [] and doc.estrazione_articoli == ""
+        print("✓ Layout sconosciuto: parser generico su prima e ultima pagina")
+    
+    try:
+        DDTFattureParser(mode="veloce")
+        assert False, "Modalità non valida accettata"
+    except ValueError:
+        pass
+    assert DDTFattureParser().mode == MODE_FULL
+    print("✓ Modalità non valide rifiutate")
+    
+    print("\n✅ Test modalità intestazione passati!\n")
+
+
+def test_document_splitter():
+    """Test PDF con più documenti: un Documento per documento logico"""
+    print("=== TEST DOCUMENTI MULTIPLI ===\n")
+    
+    import tempfile
+    from document_splitter import DocumentSplitter, PageMarker
+    
+    # Confini: pagina 1, numero diverso in un'intestazione, pagine senza indizi
+    markers = [PageMarker("1", 1, True), PageMarker(pagina=2), PageMarker("2", None, True),
+               PageMarker("2", None, True), PageMarker(), PageMarker("3", 1, True)]
+    split = list(DocumentSplitter(lambda marker: marker).split(iter(markers)))
+    assert [(start, len(pages)) for start, pages in split] == [(0, 2), (2, 3), (5, 1)], split
+    print("✓ Confini da pagina 1 e da numero diverso, in streaming")
+    
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = str(Path(tmp) / "giornaliera.pdf")
+        c = canvas.Canvas(pdf_path, pagesize=A4)
+        # (numero, pagine, "Pag. n" stampato): il 103 ripete l'intestazione senza numero di pagina
+        for numero, pagine, marcata in [("101", 2, True), ("102", 1, True), ("103", 2, False)]:
+            for page in range(pagine):
+                lines = []
+                if page == 0 or not marcata:
+                    lines += ["DOCUMENTO DI TRASPORTO", f"DDT N. {numero} del 05/03/2024"]
+                if marcata:
+                    lines.append(f"Pag. {page + 1}")
+                if page == pagine - 1:
+                    lines.append(f"Totale documento: {pagine * 10},00")
+                for i, line in enumerate(lines):
+                    c.drawString(50, 800 - i * 15, line)
+                c.showPage()
+        c.save()
+        
+        parser = DDTFattureParser()
+        documenti = parser.parse_documents(pdf_path)
+        assert [(d.numero, d.pagine, d.totale) for d in documenti] == [
+            ("101", "1-2", 20.0), ("102", "3-3", 10.0), ("103", "4-5", 20.0)
+        ], [(d.numero, d.pagine, d.totale) for d in documenti]
+        print("✓ Un documento per numero, con le pagine di origine")
+        
+        # Blocchi [1-2] [3-4] [5]: solo il 103, a cavallo di due blocchi, si parsifica qui
+        riparsificati = []
+        parse_raw_pages = parser.parse_raw_pages
+        parser.parse_raw_pages = lambda pages, *args: riparsificati.append(len(pages)) or \
+            parse_raw_pages(pages, *args)
+        paralleli = parser.parse_documents(pdf_path, workers=2, chunk_pages=2)
+        assert paralleli == documenti
+        assert riparsificati == [2], riparsificati
+        print("✓ Blocchi parsificati dai worker, identici al parsing seriale")
+        
+        risultati, errori = DDTFattureParser(split_documents=True).process_multiple_files(
+            [pdf_path, pdf_path], workers=2)
+        assert not errori and [d.numero for d in risultati] == ["101", "102", "103"] * 2
+        print("✓ process_multiple_files con split_documents: un risultato per documento")
+    
+    print("\n✅ Test documenti multipli passati!\n")
+
+
+def test_page_chunks():
+    """Test documento lungo estratto a blocchi di pagine in parallelo"""
+    print("=== TEST BLOCCHI DI PAGINE ===\n")
+    
+    import io
+    import tempfile
+    from contextlib import redirect_stdout
+    
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        from create_test_pdf import create_test_ddt_pdf
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = str(Path(tmp) / "lungo.pdf")
+        c = canvas.Canvas(pdf_path, pagesize=A4)
+        c.drawString(50, 800, "DDT N. 1234 Del 05/03/2024")
+        for page in range(5):
+            c.drawString(50, 780, f"PAGINA INTERMEDIA {page + 1}")
+            c.showPage()
+        c.drawString(50, 800, "Totale documento: 20,50")
+        c.save()
+        
+        seriale = DDTFattureParser().parse_single_file(pdf_path)
+        parser = DDTFattureParser(page_workers=2, parallel_min_pages=4, chunk_pages=2)
+        assert parser._parallel_pages(6) and not parser._parallel_pages(3)
+        parallelo = parser.parse_single_file(pdf_path)
+        assert parallelo == seriale and (parallelo.numero, parallelo.totale) == ("1234", 20.5)
+        print("✓ Blocchi estratti in parallelo e ricomposti in ordine: stesso documento")
+        
+        ddt_path = str(Path(tmp) / "ddt.pdf")
+        with redirect_stdout(io.StringIO()):
+            create_test_ddt_pdf(ddt_path)
+        assert parser.chunked_table_loader(ddt_path)([0]) == DDTFattureParser().table_loader(ddt_path)([0])
+        print("✓ Tabelle delle pagine richieste estratte dai worker")
+    
+    print("\n✅ Test blocchi di pagine passati!\n")
+
+
+def test_memory_bounded():
+    """Test memoria di picco indipendente dal numero di pagine"""
+    print("=== TEST MEMORIA PER PAGINA ===\n")
+    
+    import tempfile
+    import tracemalloc
+    
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    def build(path, page_count):
+        c = canvas.Canvas(path, pagesize=A4)
+        c.drawString(50, 810, "DDT N. 1234 Del 05/03/2024")
+        for page in range(page_count):
+            # Righe articolo fitte: ogni pagina può contenere una tabella
+            for row in range(25):
+                c.drawString(50, 790 - row * 15, f"{page:03d}{row:03d} ARTICOLO {page} {row} PZ 10 1,00 10,00")
+            c.showPage()
+        c.save()
+    
+    def peak(path):
+        tracemalloc.start()
+        try:
+            DDTFattureParser().parse_single_file(path)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        short_path, long_path = str(Path(tmp) / "corto.pdf"), str(Path(tmp) / "lungo.pdf")
+        build(short_path, 4)
+        build(long_path, 12)
+        short_peak, long_peak = peak(short_path), peak(long_path)
+        # Crescono solo testo e articoli; con le pagine tenute fino alla chiusura
+        # del PDF il picco triplicava insieme alle pagine
+        assert long_peak < short_peak * 2, (short_peak, long_peak)
+        print(f"✓ Picco di memoria: {short_peak // 1024} KB con 4 pagine, {long_peak // 1024} KB con 12")
+    
+    print("\n✅ Test memoria per pagina passati!\n")
+
+
+def test_stage_timer():
+    """Test misura delle fasi di parsing e aggregazione in percentili"""
+    print("=== TEST FASI DI PARSING ===\n")
+    
+    import io
+    import tempfile
+    from contextlib import redirect_stdout
+    from parse_cache import ParseCache
+    from stage_timer import StageTimer, percentile, summarize
+    
+    # Orologio finto: ogni lettura avanza di un secondo
+    ticks = iter(range(100))
+    timer = StageTimer(clock=lambda: float(next(ticks)))
+    with timer.stage("articoli"):
+        with timer.stage("tabelle"):
+            pass
+    with timer.stage("articoli"):
+        pass
+    timer.count("pagine", 2)
+    # articoli: 3s di cui 1s di tabelle, più 1s della seconda volta
+    assert timer.as_dict() == {'tempi': {'tabelle': 1.0, 'articoli': 3.0}, 'conteggi': {'pagine': 2}}
+    print("✓ Durate esclusive delle fasi annidate, accumulate se ripetute")
+    
+    assert percentile([1, 2, 3, 4], 50) == 2 and percentile(list(range(1, 101)), 95) == 95
+    summary = summarize([{'tempi': {'testo': 0.2, 'cache': 0.01}, 'conteggi': {'pagine': 1}},
+                         {'tempi': {'testo': 0.4}, 'conteggi': {'pagine': 3}}, {}])
+    assert list(summary['tempi']) == ["cache", "testo"]
+    testo = summary['tempi']['testo']
+    assert (testo['file'], testo['p50'], testo['p95'], testo['max']) == (2, 0.2, 0.4, 0.4)
+    assert abs(testo['totale'] - 0.6) < 1e-9
+    assert summary['conteggi']['pagine']['max'] == 3
+    print("✓ Percentili p50/p95/max per fase")
+    
+    try:
+        from create_test_pdf import create_test_ddt_pdf
+    except ImportError:
+        print("⚠️  reportlab non installato, test saltato\n")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = str(Path(tmp) / "ddt.pdf")
+        with redirect_stdout(io.StringIO()):
+            create_test_ddt_pdf(pdf_path)
+        
+        cache = ParseCache(Path(tmp) / "cache.sqlite")
+        documento = DDTFattureParser(cache=cache).parse_single_file(pdf_path)
+        assert {"apertura", "testo", "campi", "cache"} <= set(documento.metriche['tempi'])
+        assert documento.metriche['conteggi']['pagine'] == 1
+        assert documento.metriche['conteggi']['caratteri'] > 0
+        print(f"✓ Metriche sul documento: {sorted(documento.metriche['tempi'])}")
+        
+        # Dalla cache: solo la lettura, senza i tempi del parsing originale
+        cached = DDTFattureParser(cache=cache).parse_single_file(pdf_path)
+        assert list(cached.metriche['tempi']) == ["cache"] and cached == documento
+        print("✓ Documento dalla cache con le sole metriche della lettura")
+    
+    print("\n✅ Test fasi di parsing passati!\n")
+
+
 def test_multiple_formats():
     """Test formati multipli"""
     print("=== TEST FORMATI MULTIPLI ===\n")
@@ -174,6 +1027,22 @@ def run_all_tests():
     try:
         test_single_document()
         test_error_handling()
+        test_parallel_processing()
+        test_parse_cache()
+        test_lazy_tables()
+        test_streaming_export()
+        test_parquet_export()
+        test_field_scanner()
+        test_text_view()
+        test_keyword_locator()
+        test_page_layout()
+        test_supplier_layouts()
+        test_layout_regions()
+        test_header_mode()
+        test_document_splitter()
+        test_page_chunks()
+        test_memory_bounded()
+        test_stage_timer()
         test_multiple_formats()
         test_data_structures()
         
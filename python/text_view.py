@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Vista condivisa del testo di un documento
+Testo originale, minuscolo, offset delle righe e posizioni delle parole chiave calcolati una volta
+"""
+
+import re
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from field_scanner import is_case_stable
+from keyword_locator import get_locator
+
+# Parole chiave di cui si indicizzano le posizioni (nel testo minuscolo)
+# Includono i terminatori delle sezioni cliente e articoli
+ANCHOR_KEYWORDS = (
+    'cliente', 'p.iva', 'iva', 'totale', 'agente', 'vettore',
+    'luogo', 'indirizzo', 'via', 'codice', 'trasporto', 'note'
+)
+
+
+class TextView:
+    """
+    Testo di un documento con le strutture derivate usate dagli estrattori
+    
+    Gli estrattori leggono da qui invece di ripetere text.lower(), find() e
+    split('\\n') sullo stesso testo. Le posizioni nel testo minuscolo valgono
+    anche per l'originale solo se `aligned` (lower() non ha cambiato lunghezza);
+    se `case_stable` le parole chiave indicizzate coincidono con i match
+    IGNORECASE dei pattern che iniziano con esse.
+    """
+    
+    def __init__(self, text: str, anchors: Iterable[str] = ANCHOR_KEYWORDS):
+        """
+        Args:
+            text: Testo del documento
+            anchors: Parole chiave (minuscole) da indicizzare
+        """
+        self.text = text
+        lower = text.lower()
+        # Testo già minuscolo (es. normalizzato): nessuna copia
+        self.lower = text if lower == text else lower
+        self.aligned = len(self.lower) == len(text)
+        self.case_stable = self.lower is text and is_case_stable(text)
+        
+        # Inizio di ogni riga; la riga i va da _line_starts[i] al '\n' successivo
+        self._line_starts = [0] + [match.end() for match in re.finditer('\n', text)]
+        self._lines = None
+        
+        self.anchors = self._index_anchors(anchors)
+    
+    def _index_anchors(self, keywords: Iterable[str]) -> Dict[str, List[int]]:
+        """Posizioni di tutte le occorrenze (anche sovrapposte) delle parole chiave, in una passata"""
+        return get_locator(tuple(sorted(set(keywords)))).locate(self.lower)
+    
+    @property
+    def lines(self) -> List[str]:
+        """Righe del testo (come text.split('\\n')), calcolate alla prima richiesta"""
+        if self._lines is None:
+            self._lines = self.text.split('\n')
+        return self._lines
+    
+    @property
+    def line_count(self) -> int:
+        """Numero di righe"""
+        return len(self._line_starts)
+    
+    def line_index(self, pos: int) -> int:
+        """Indice della riga che contiene la posizione pos"""
+        return bisect_right(self._line_starts, pos) - 1
+    
+    def line_span(self, index: int) -> Tuple[int, int]:
+        """Inizio e fine (escluso il '\\n') della riga index"""
+        start = self._line_starts[index]
+        if index + 1 < len(self._line_starts):
+            return start, self._line_starts[index + 1] - 1
+        return start, len(self.text)
+    
+    def lines_between(self, start: int, end: int) -> List[str]:
+        """Righe di text[start:end], come text[start:end].split('\\n') ma senza ricopiare il testo"""
+        end = min(end, len(self.text))
+        start = min(start, end)
+        result = []
+        for index in range(self.line_index(start), self.line_index(end) + 1):
+            line_start, line_end = self.line_span(index)
+            result.append(self.text[max(line_start, start):min(line_end, end)])
+        return result
+    
+    def lines_before(self, pos: int, count: int) -> List[str]:
+        """
+        Ultime count righe prima di pos, ignorando le righe vuote finali
+        
+        Equivale (a meno delle righe vuote iniziali) a text[:pos].strip().split('\\n')[-count:].
+        """
+        result = []
+        index = self.line_index(pos)
+        while index >= 0 and len(result) < count:
+            line_start, line_end = self.line_span(index)
+            line = self.text[line_start:min(line_end, pos)]
+            if result or line.strip():
+                result.append(line)
+            index -= 1
+        result.reverse()
+        return result
+    
+    def find(self, needle: str, start: int = 0) -> int:
+        """Posizione di needle nel testo minuscolo (ricerca case-insensitive), -1 se assente"""
+        return self.lower.find(needle.lower(), start)
+    
+    def first(self, keyword: str, start: int = 0) -> int:
+        """Prima occorrenza indicizzata di keyword da start in poi, -1 se assente"""
+        positions = self.anchors[keyword]
+        index = bisect_right(positions, start - 1)
+        return positions[index] if index < len(positions) else -1
+    
+    def has(self, keyword: str, start: int = 0) -> bool:
+        """True se la parola chiave indicizzata compare da start in poi"""
+        return self.first(keyword, start) >= 0
+    
+    def first_of(self, keywords: Iterable[str], start: int = 0) -> Tuple[int, Optional[str]]:
+        """
+        Prima occorrenza, da start in poi, di una qualsiasi delle parole chiave
+        
+        Returns:
+            (posizione, parola chiave) oppure (-1, None) se nessuna compare
+        """
+        best, best_keyword = -1, None
+        for keyword in keywords:
+            pos = self.first(keyword, start)
+            if pos >= 0 and (best < 0 or pos < best):
+                best, best_keyword = pos, keyword
+        return best, best_keyword
+    
+    def section_window(self, content_start: int, terminators: Iterable[str]) -> Optional[int]:
+        """
+        Fine della finestra che contiene una sezione "ancora ... (.+?) terminatore"
+        
+        Il contenuto lazy inizia a content_start e non può essere vuoto, quindi
+        il terminatore che chiude la sezione è il primo da content_start + 1.
+        La finestra arriva fino al terminatore seguente: copre anche i pattern
+        i cui separatori iniziali raggiungono il primo terminatore.
+        
+        Returns:
+            Posizione di fine (esclusa) da passare come endpos alla regex, None se
+            nessun terminatore segue: la regex non troverebbe la sezione
+        """
+        terminators = tuple(terminators)
+        pos, keyword = self.first_of(terminators, content_start + 1)
+        if pos < 0:
+            return None
+        next_pos, next_keyword = self.first_of(terminators, pos + 1)
+        if next_pos >= 0:
+            return next_pos + len(next_keyword)
+        return pos + len(keyword)
+
+
+def as_view(text: Union[str, TextView]) -> TextView:
+    """Restituisce la vista del testo, creandola se si riceve una stringa"""
+    return text if isinstance(text, TextView) else TextView(text)
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Esecuzione su pool di processi con finestra limitata di task in volo
+Pool supervisionato con timeout e limite di memoria per task e riciclo dei worker
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # non disponibile su Windows: nessun limite di memoria
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Motivi per cui un task del pool supervisionato non ha prodotto un risultato
+FAILURE_TIMEOUT = "timeout"
+FAILURE_MEMORY = "memoria"
+FAILURE_CRASH = "crash"
+FAILURE_EXCEPTION = "eccezione"
+# Secondi concessi a un worker per uscire da solo prima di essere terminato
+RETIRE_GRACE = 5.0
+# Exit code di un worker uscito per un MemoryError fuori da func (es. inviando il risultato)
+EXIT_MEMORY_ERROR = 99
+# Segnali di un worker morto per memoria esaurita: SIGKILL (OOM killer del sistema),
+# SIGABRT (allocazione fallita nel codice nativo); SIGKILL non esiste su Windows
+MEMORY_SIGNALS = frozenset(getattr(signal, name) for name in ('SIGKILL', 'SIGABRT') if hasattr(signal, name))
+
+
+def iter_pool_results(func: Callable[[Any], Any], items: Iterable[Any], workers: int,
+                      initializer: Callable = None, initargs: Tuple = (),
+                      ordered: bool = True,
+                      max_in_flight: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+    """
+    Applica func agli elementi su un pool di processi, restituendo i risultati in streaming
+    
+    Gli elementi vengono letti dall'iterabile solo quando si libera un posto
+    nella finestra, quindi al massimo max_in_flight task (e relativi risultati)
+    sono in memoria contemporaneamente.
+    
+    Args:
+        func: Funzione eseguita nel worker (deve essere picklable)
+        items: Elementi da elaborare, anche un generatore
+        workers: Numero di processi
+        initializer: Inizializzazione eseguita una volta per processo
+        initargs: Argomenti di initializer
+        ordered: True = risultati nell'ordine di input; False = appena pronti
+        max_in_flight: Task in volo contemporaneamente (default: 2 per worker)
+    
+    Yields:
+        Tuple di (elemento, risultato)
+    """
+    max_in_flight = max_in_flight or workers * 2
+    items = iter(items)
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                             initargs=initargs) as executor:
+        # Coda FIFO dei task: in modalità ordinata si restituisce sempre la testa
+        window = deque()
+        exhausted = False
+        
+        while window or not exhausted:
+            # Riempie la finestra fino al limite di task in volo
+            while not exhausted and len(window) < max_in_flight:
+                item = next(items, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    exhausted = True
+                    break
+                window.append((executor.submit(func, item), item))
+            
+            if not window:
+                break
+            
+            if ordered:
+                future, item = window.popleft()
+                yield item, future.result()
+                continue
+            
+            done, _ = wait([future for future, _ in window], return_when=FIRST_COMPLETED)
+            for entry in [entry for entry in window if entry[0] in done]:
+                window.remove(entry)
+                yield entry[1], entry[0].result()
+
+
+# Sentinella di fine iterazione (None può essere un elemento valido)
+_EXHAUSTED = object()
+
+
+@dataclass
+class WorkerFailure:
+    """Task del pool supervisionato terminato senza risultato"""
+    kind: str
+    message: str
+    traceback: str = ""
+    elapsed: float = 0.0
+
+
+def _supervised_worker(conn, func: Callable, initializer: Optional[Callable], initargs: Tuple,
+                       memory_limit: Optional[int]) -> None:
+    """Ciclo di un processo del pool supervisionato: un task alla volta fino a None"""
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    if initializer is not None:
+        initializer(*initargs)
+    
+    try:
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                return
+            if task is None:
+                return
+            try:
+                message = (True, func(task[0]))
+            except Exception:
+                message = (False, traceback.format_exc())
+            conn.send(message)
+    except MemoryError:
+        # Senza memoria nemmeno per riportare l'errore: il supervisore lo riconosce dall'exit code
+        os._exit(EXIT_MEMORY_ERROR)
+
+
+class _Worker:
+    """Processo del pool supervisionato e task che sta eseguendo"""
+    
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.busy = False
+        self.item = None
+        self.started = 0.0
+        self.tasks = 0
+
+
+class SupervisedPool:
+    """
+    Pool di processi che controlla ogni task singolarmente
+    
+    A differenza di ProcessPoolExecutor, un task che supera il timeout fa
+    terminare solo il suo worker, che viene sostituito; un worker che muore
+    (es. oltre il limite di memoria) non compromette gli altri task. Ogni
+    worker viene inoltre riciclato dopo max_tasks task, per contenere le
+    perdite di memoria. Al posto del risultato di un task fallito si ottiene
+    un WorkerFailure.
+    """
+    
+    def __init__(self, func: Callable[[Any], Any], workers: int,
+                 initializer: Callable = None, initargs: Tuple = (),
+                 timeout: Optional[float] = None, memory_limit: Optional[int] = None,
+                 max_tasks: Optional[int] = None,
+                 retire_if: Optional[Callable[[Any], bool]] = None):
+        """
+        Args:
+            func: Funzione eseguita nel worker su ogni elemento
+            workers: Numero di processi
+            initializer: Inizializzazione eseguita una volta per processo
+            initargs: Argomenti di initializer
+            timeout: Secondi massimi per task (None = nessun limite)
+            memory_limit: Spazio di indirizzamento massimo per worker in byte
+                (RLIMIT_AS, solo Unix; None = nessun limite)
+            max_tasks: Task dopo i quali un worker viene sostituito (None = mai)
+            retire_if: Predicato sul risultato di un task: True = il worker
+                viene sostituito (es. dopo un MemoryError intercettato)
+        """
+        if memory_limit is not None and resource is None:
+            logger.warning("Limite di memoria non supportato su questa piattaforma: ignorato")
+        self.func = func
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_tasks = max_tasks
+        self.retire_if = retire_if
+        self.replaced = 0
+        self._context = multiprocessing.get_context()
+        self._queue = deque()
+        self._workers = [self._start_worker() for _ in range(max(1, workers))]
+    
+    def __enter__(self) -> 'SupervisedPool':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    @property
+    def pending(self) -> int:
+        """Task in coda o in esecuzione"""
+        return len(self._queue) + sum(1 for worker in self._workers if worker.busy)
+    
+    def submit(self, item: Any) -> None:
+        """Accoda un elemento: parte appena un worker è libero"""
+        self._queue.append(item)
+        self._dispatch()
+    
+    def collect(self, timeout: Optional[float] = None) -> List[Tuple[Any, Any]]:
+        """
+        Attende i task completati, al massimo `timeout` secondi (None = almeno uno)
+        
+        Returns:
+            Lista di (elemento, risultato o WorkerFailure); vuota se nessun
+            task si è concluso entro il tempo
+        """
+        self._dispatch()
+        busy = [worker for worker in self._workers if worker.busy]
+        if not busy:
+            return []
+        
+        # Il primo task a scadere limita l'attesa
+        if self.timeout is not None:
+            remaining = max(0.0, min(worker.started for worker in busy) + self.timeout - time.time())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        handles = [worker.conn for worker in busy] + [worker.process.sentinel for worker in busy]
+        ready = set(multiprocessing.connection.wait(handles, timeout))
+        
+        results = []
+        now = time.time()
+        for worker in busy:
+            elapsed = now - worker.started
+            if worker.conn in ready:
+                try:
+                    ok, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    result = self._replace(worker, self._death_failure(worker, elapsed))
+                else:
+                    result = payload if ok else self._exception_failure(worker, payload, elapsed)
+            elif worker.process.sentinel in ready:
+                result = self._replace(worker, self._death_failure(worker, elapsed))
+            elif self.timeout is not None and elapsed >= self.timeout:
+                logger.warning(f"Task oltre {self.timeout:g}s: worker {worker.process.pid} terminato")
+                result = self._replace(worker, WorkerFailure(
+                    FAILURE_TIMEOUT, f"Timeout: elaborazione oltre {self.timeout:g}s, worker terminato",
+                    elapsed=elapsed))
+            else:
+                continue
+            
+            results.append((worker.item, result))
+            worker.busy = False
+            worker.item = None
+            worker.tasks += 1
+            if worker in self._workers and self._should_retire(worker, result):
+                self._replace(worker, result, graceful=True)
+        
+        self._dispatch()
+        return results
+    
+    def close(self) -> None:
+        """Ferma tutti i worker; quelli con un task in corso vengono terminati"""
+        for worker in self._workers:
+            self._stop_worker(worker, graceful=not worker.busy)
+        self._workers = []
+        self._queue.clear()
+    
+    def _start_worker(self) -> _Worker:
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_supervised_worker,
+                                        args=(child_conn, self.func, self.initializer,
+                                              self.initargs, self.memory_limit))
+        process.start()
+        child_conn.close()
+        return _Worker(process, conn)
+    
+    def _dispatch(self) -> None:
+        """Assegna i task in coda ai worker liberi"""
+        for worker in self._workers:
+            if not self._queue:
+                return
+            if worker.busy:
+                continue
+            worker.item = self._queue.popleft()
+            worker.busy = True
+            worker.started = time.time()
+            try:
+                worker.conn.send((worker.item,))
+            except OSError:
+                # Worker già terminato: la sua fine viene rilevata da collect
+                pass
+    
+    def _should_retire(self, worker: _Worker, result: Any) -> bool:
+        if isinstance(result, WorkerFailure):
+            return False
+        if self.max_tasks is not None and worker.tasks >= self.max_tasks:
+            return True
+        return self.retire_if is not None and self.retire_if(result)
+    
+    def _replace(self, worker: _Worker, result: Any, graceful: bool = False) -> Any:
+        """Sostituisce il worker con un processo nuovo e restituisce result"""
+        self._stop_worker(worker, graceful)
+        self._workers[self._workers.index(worker)] = self._start_worker()
+        self.replaced += 1
+        return result
+    
+    def _stop_worker(self, worker: _Worker, graceful: bool) -> None:
+        if graceful:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.process.join(RETIRE_GRACE)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+    
+    def _death_failure(self, worker: _Worker, elapsed: float) -> WorkerFailure:
+        """
+        Worker morto durante un task, classificato dall'exit code
+        
+        Un MemoryError registrato dal worker, SIGKILL o SIGABRT contano come
+        memoria esaurita; ogni altro segnale (es. SIGSEGV nel codice nativo) o
+        exit code è un crash.
+        """
+        worker.process.join()
+        exitcode = worker.process.exitcode
+        if exitcode == EXIT_MEMORY_ERROR:
+            return WorkerFailure(FAILURE_MEMORY, "Worker terminato per MemoryError", elapsed=elapsed)
+        if exitcode is not None and -exitcode in MEMORY_SIGNALS:
+            return WorkerFailure(FAILURE_MEMORY, f"Worker terminato dal segnale {_signal_name(-exitcode)}, "
+                                 f"probabile memoria esaurita", elapsed=elapsed)
+        if exitcode is not None and exitcode < 0:
+            return WorkerFailure(FAILURE_CRASH, f"Worker terminato dal segnale {_signal_name(-exitcode)}",
+                                 elapsed=elapsed)
+        return WorkerFailure(FAILURE_CRASH, f"Worker terminato inaspettatamente (exit code {exitcode})",
+                             elapsed=elapsed)
+    
+    def _exception_failure(self, worker: _Worker, formatted: str, elapsed: float) -> WorkerFailure:
+        """Eccezione propagata da func; dopo un MemoryError il worker viene sostituito"""
+        message = formatted.strip().splitlines()[-1]
+        if message.startswith("MemoryError"):
+            return self._replace(worker, WorkerFailure(FAILURE_MEMORY, message, formatted, elapsed))
+        return WorkerFailure(FAILURE_EXCEPTION, message, formatted, elapsed)
+
+
+def _signal_name(signum: int) -> str:
+    """Nome di un segnale (es. SIGSEGV), o il suo numero se sconosciuto"""
+    try:
+        return signal.Signals(signum).name
+    except ValueError:
+        return str(signum)
+
+
+def iter_supervised_results(func: Callable[[Any], Any], items: Iterable[Any], workers: int,
+                            initializer: Callable = None, initargs: Tuple = (),
+                            max_in_flight: Optional[int] = None,
+                            timeout: Optional[float] = None, memory_limit: Optional[int] = None,
+                            max_tasks: Optional[int] = None,
+                            retire_if: Optional[Callable[[Any], bool]] = None) -> Iterator[Tuple[Any, Any]]:
+    """
+    Come iter_pool_results con ordered=False, su un SupervisedPool
+    
+    Yields:
+        Tuple di (elemento, risultato o WorkerFailure)
+    """
+    max_in_flight = max_in_flight or workers * 2
+    items = iter(items)
+    exhausted = False
+    
+    with SupervisedPool(func, workers, initializer=initializer, initargs=initargs, timeout=timeout,
+                        memory_limit=memory_limit, max_tasks=max_tasks, retire_if=retire_if) as pool:
+        while True:
+            while not exhausted and pool.pending < max_in_flight:
+                item = next(items, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    exhausted = True
+                    break
+                pool.submit(item)
+            
+            if not pool.pending:
+                break
+            
+            yield from pool.collect()